@@ -1,9 +1,12 @@
 import frappe
-from frappe.utils import today
+from frappe.utils import cint, flt, getdate, today
 from datetime import datetime
 from frappe.exceptions import ValidationError
-from erpnext.accounts.utils import get_balance_on
 from erpnext.setup.utils import get_exchange_rate
+from casino_navy.casino_navy.doctype.transaction_ledger import idempotency
+from casino_navy.casino_navy.doctype.transaction_ledger_queue.transaction_ledger_queue import enqueue_transaction
+from casino_navy.exchange_rates import get_exchange_rate_index
+from casino_navy.balance_cache import get_balance as get_cached_balance
 import json
 
 def parse_date(date_str):
@@ -11,7 +14,7 @@ def parse_date(date_str):
         if date_str:
             return datetime.strptime(date_str, "%Y-%m-%d").date()
         return today()
-    except ValueError:
+    except (TypeError, ValueError):
         raise ValidationError("Invalid date format. Please provide a valid date (YYYY-MM-DD).")
 
 @frappe.whitelist()
@@ -43,13 +46,12 @@ def get_balance(company, bank, date=None, cost_center=None, in_account_currency=
                 "for_selling"
             )
 
-        balance = get_balance_on(
-            account=bank_data.bank_account,
-            date=date,
-            company=company_doc.name,
-            in_account_currency=in_account_currency,
+        balance = get_cached_balance(
+            company_doc.name,
+            bank_data.bank_account,
+            date,
             cost_center=cost_center,
-            ignore_account_permission=True
+            in_account_currency=in_account_currency,
         )
         return balance
 
@@ -57,10 +59,123 @@ def get_balance(company, bank, date=None, cost_center=None, in_account_currency=
         frappe.log_error(title="Error in get_balance API", message=f"{str(e)}\n{frappe.get_traceback()}")
         raise
 
+MAX_BALANCE_DATES = 366
+
 @frappe.whitelist()
-def add_transaction(data):
+def get_balances(banks, dates=None, cost_center=None):
+    """
+    Balances of several bank accounts on several dates in one GL Entry query.
+
+    `banks` and `dates` are JSON lists (or comma separated). Returns one row per
+    (bank, date) with the balance in the account currency and in the company
+    currency, the way `get_balance` computes them one at a time.
+    """
+    banks = parse_list(banks)
+    dates = sorted({getdate(parse_date(date)) for date in parse_list(dates)} or {getdate()})
+
+    if not banks:
+        raise ValidationError("The 'banks' parameter is required.")
+    if len(dates) > MAX_BALANCE_DATES:
+        raise ValidationError(f"At most {MAX_BALANCE_DATES} dates can be requested at once.")
+
+    try:
+        BA = frappe.qb.DocType("Bank Account")
+        A = frappe.qb.DocType("Account")
+        C = frappe.qb.DocType("Company")
+        bank_rows = (
+            frappe.qb.from_(BA)
+            .join(A).on(BA.account == A.name)
+            .join(C).on(A.company == C.name)
+            .select(
+                BA.name.as_("bank"),
+                A.company,
+                A.name.as_("account"),
+                A.account_currency,
+                C.default_currency.as_("company_currency"),
+            )
+            .where(BA.name.isin(banks))
+            .run(as_dict=True)
+        )
+
+        missing = set(banks) - {row.bank for row in bank_rows}
+        if missing:
+            raise frappe.DoesNotExistError(f"Bank Account(s) {', '.join(sorted(missing))} do not exist or have no Account.")
+
+        conditions = ["gle.account IN %(accounts)s", "gle.is_cancelled = 0", "gle.posting_date <= %(to_date)s"]
+        values = {"accounts": tuple({row.account for row in bank_rows}), "to_date": dates[-1]}
+
+        if cost_center:
+            lft, rgt = frappe.db.get_value("Cost Center", cost_center, ["lft", "rgt"]) or (None, None)
+            if lft is None:
+                raise frappe.DoesNotExistError(f"Cost Center '{cost_center}' does not exist.")
+            conditions.append("""gle.cost_center IN (
+                SELECT name FROM `tabCost Center` WHERE lft >= %(lft)s AND rgt <= %(rgt)s
+            )""")
+            values.update({"lft": lft, "rgt": rgt})
+
+        # One conditional SUM pair per requested date
+        columns = []
+        for idx, date in enumerate(dates):
+            values[f"date_{idx}"] = date
+            columns.append(f"""
+                SUM(CASE WHEN gle.posting_date <= %(date_{idx})s
+                    THEN gle.debit_in_account_currency - gle.credit_in_account_currency ELSE 0 END) AS balance_{idx},
+                SUM(CASE WHEN gle.posting_date <= %(date_{idx})s
+                    THEN gle.debit - gle.credit ELSE 0 END) AS base_balance_{idx}""")
+
+        totals = {
+            row.account: row
+            for row in frappe.db.sql(f"""
+                SELECT gle.account, {",".join(columns)}
+                FROM `tabGL Entry` gle
+                WHERE {" AND ".join(conditions)}
+                GROUP BY gle.account
+            """, values, as_dict=True)
+        }
+
+        balances = []
+        for bank in bank_rows:
+            account_totals = totals.get(bank.account) or {}
+            for idx, date in enumerate(dates):
+                balances.append({
+                    "bank": bank.bank,
+                    "date": str(date),
+                    "company": bank.company,
+                    "account": bank.account,
+                    "account_currency": bank.account_currency,
+                    "company_currency": bank.company_currency,
+                    "balance": flt(account_totals.get(f"balance_{idx}")),
+                    "balance_in_company_currency": flt(account_totals.get(f"base_balance_{idx}")),
+                })
+        return balances
+
+    except Exception as e:
+        frappe.log_error(title="Error in get_balances API", message=f"{str(e)}\n{frappe.get_traceback()}")
+        raise
+
+def parse_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = value.split(",")
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    return [str(v).strip() for v in value if v and str(v).strip()]
+
+TRANSACTION_REQUIRED_FIELDS = ["company", "transaction_type", "bank", "date", "amount", "charge_type"]
+DEFAULT_COMMIT_SIZE = 500
+
+@frappe.whitelist()
+def add_transaction(data, async_mode=False):
     """
     Add a new transaction to the Transaction Ledger.
+
+    With `async_mode` the payload shape is validated, the payload is staged in the
+    Transaction Ledger Queue and an accepted ticket is returned right away; use
+    `get_transaction_status` to follow it.
     """
     try:
         try:
@@ -68,36 +183,34 @@ def add_transaction(data):
         except Exception:
             raise ValidationError("Invalid JSON provided in data.")
 
-        required_fields = ["company", "transaction_type", "bank", "date", "amount", "charge_type"]
-        missing_fields = [field for field in required_fields if not transaction_data.get(field)]
-        
-        if missing_fields:
-            frappe.throw(f"Missing required fields: {', '.join(missing_fields)}")
-
-        if transaction_data.get("fee") and not transaction_data.get("fee_type"):
-            frappe.throw("Field 'fee_type' is required when 'fee' is provided.")
-
-        date = parse_date(transaction_data.get("date"))
-
-        transaction = frappe.get_doc({
-            "doctype": "Transaction Ledger",
-            "company": transaction_data.get("company"),
-            "transaction_type": transaction_data.get("transaction_type"),
-            "bank": transaction_data.get("bank"),
-            "date": date,
-            "amount": transaction_data.get("amount"),
-            "fee": transaction_data.get("fee"),
-            "fee_type": transaction_data.get("fee_type"),
-            "charge_type": transaction_data.get("charge_type"),
-            "exchange_rate": transaction_data.get("exchange_rate") or 1.0,
-            "transaction_id": transaction_data.get("transaction_id"),
-            "third_party_reference": transaction_data.get("third_party_reference"),
-            "username": transaction_data.get("username"),
-            "description": transaction_data.get("description")
-        })
-
-        transaction.save()
-        transaction.submit()
+        errors = validate_transaction_payload(transaction_data)
+        if errors:
+            frappe.throw(errors[0])
+
+        key = idempotency.get_idempotency_key_for(transaction_data)
+        if existing := idempotency.find_existing(key):
+            return get_replayed_response(existing)
+
+        if cint(async_mode):
+            ticket = enqueue_transaction(transaction_data)
+            return {"status": "accepted", "message": "Transaction queued", "ticket": ticket}
+
+        transaction = build_transaction(transaction_data)
+        frappe.db.savepoint("add_transaction")
+        try:
+            transaction.save()
+            transaction.submit()
+        except frappe.UniqueValidationError:
+            # A concurrent retry won the race for the same reference
+            frappe.db.rollback(save_point="add_transaction")
+            frappe.clear_messages()
+            if existing := idempotency.find_existing(key, use_bloom=False):
+                return get_replayed_response(existing)
+            raise
+        except Exception:
+            # Never leave a half-written draft behind for a retry to trip over
+            frappe.db.rollback(save_point="add_transaction")
+            raise
 
         return {"status": "success", "message": "Transaction added successfully", "transaction": transaction.as_dict()}
 
@@ -105,6 +218,223 @@ def add_transaction(data):
         frappe.log_error(title="Error in add_transaction API", message=f"{str(e)}\n{frappe.get_traceback()}")
         return {"status": "error", "message": str(e)}
 
+@frappe.whitelist()
+def add_transactions(data=None, commit_size=DEFAULT_COMMIT_SIZE):
+    """
+    Add a batch of transactions to the Transaction Ledger.
+
+    `data` is either a JSON array or an NDJSON body (one object per line) with
+    the same shape accepted by `add_transaction`. The whole batch is validated
+    up front, then inserted and submitted committing every `commit_size` rows.
+    A failing row is rolled back on its own and does not abort the batch.
+
+    Returns one status per input row, in input order:
+        {"index": 0, "status": "created" | "duplicate" | "error", "name": ..., "message": ...}
+    """
+    rows = parse_transactions(data)
+    commit_size = max(cint(commit_size) or DEFAULT_COMMIT_SIZE, 1)
+
+    results = [{"index": idx, "status": None, "name": None, "message": None} for idx in range(len(rows))]
+
+    pending = []
+    for idx, transaction_data in enumerate(rows):
+        errors = validate_transaction_payload(transaction_data)
+        if errors:
+            results[idx].update({"status": "error", "message": "; ".join(errors)})
+        else:
+            pending.append(idx)
+
+    for idx, name in find_duplicate_transactions([rows[idx] for idx in pending], pending).items():
+        results[idx].update({"status": "duplicate", "name": name, "message": "Transaction already exists"})
+
+    # Warm the exchange rate index once for every date in the batch
+    dates = [parse_date(rows[idx].get("date")) for idx in pending if not results[idx]["status"]]
+    if dates:
+        get_exchange_rate_index(min(dates), max(dates))
+
+    processed = 0
+    for idx in pending:
+        if results[idx]["status"]:
+            continue
+
+        frappe.db.savepoint("add_transactions")
+        try:
+            transaction = build_transaction(rows[idx])
+            transaction.save()
+            transaction.submit()
+            results[idx].update({"status": "created", "name": transaction.name})
+        except frappe.UniqueValidationError:
+            frappe.db.rollback(save_point="add_transactions")
+            frappe.clear_messages()
+            key = idempotency.get_idempotency_key_for(rows[idx])
+            results[idx].update({
+                "status": "duplicate",
+                "name": idempotency.find_existing(key, use_bloom=False),
+                "message": "Transaction already exists",
+            })
+        except Exception as e:
+            frappe.db.rollback(save_point="add_transactions")
+            frappe.clear_messages()
+            frappe.log_error(title="Error in add_transactions API", message=f"{str(e)}\n{frappe.get_traceback()}")
+            results[idx].update({"status": "error", "message": str(e)})
+
+        processed += 1
+        if processed % commit_size == 0:
+            frappe.db.commit()
+
+    frappe.db.commit()
+
+    return results
+
+@frappe.whitelist()
+def get_transaction_status(ticket):
+    """
+    Status of a transaction queued with `add_transaction(..., async_mode=1)`.
+    """
+    frappe.has_permission("Transaction Ledger Queue", "read", throw=True)
+
+    entry = frappe.db.get_value(
+        "Transaction Ledger Queue",
+        ticket,
+        ["name", "status", "transaction_ledger", "attempts", "error", "processed_on"],
+        as_dict=True,
+    )
+    if not entry:
+        raise frappe.DoesNotExistError(f"Ticket '{ticket}' does not exist.")
+
+    return {
+        "ticket": entry.name,
+        "status": entry.status,
+        "transaction": entry.transaction_ledger,
+        "attempts": entry.attempts,
+        "processed_on": entry.processed_on,
+        "error": (entry.error or "").split("\n", 1)[0] or None,
+    }
+
+def parse_transactions(data=None):
+    """
+    Return a list of transaction dicts from a JSON array, a single JSON object
+    or an NDJSON string. Falls back to the raw request body when `data` is empty.
+    """
+    if data is None and getattr(frappe.local, "request", None):
+        data = frappe.request.get_data(as_text=True)
+
+    if isinstance(data, dict):
+        data = data.get("transactions", [data])
+
+    if isinstance(data, (list, tuple)):
+        return [frappe._dict(row) if isinstance(row, dict) else row for row in data]
+
+    text = (data or "").strip()
+    if not text:
+        frappe.throw("No transactions provided.")
+
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        parsed = None
+
+    if parsed is None:
+        parsed = []
+        for lineno, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                parsed.append(json.loads(line))
+            except ValueError:
+                frappe.throw(f"Invalid JSON on line {lineno}.")
+
+    if isinstance(parsed, dict):
+        parsed = parsed.get("transactions", [parsed])
+
+    return [frappe._dict(row) if isinstance(row, dict) else row for row in parsed]
+
+def validate_transaction_payload(transaction_data):
+    """
+    Validate the shape of a single transaction payload without touching the database.
+    Returns a list of error messages (empty when the payload is valid).
+    """
+    if not isinstance(transaction_data, dict):
+        return ["Transaction must be a JSON object."]
+
+    errors = []
+    missing_fields = [field for field in TRANSACTION_REQUIRED_FIELDS if not transaction_data.get(field)]
+    if missing_fields:
+        errors.append(f"Missing required fields: {', '.join(missing_fields)}")
+
+    if transaction_data.get("fee") and not transaction_data.get("fee_type"):
+        errors.append("Field 'fee_type' is required when 'fee' is provided.")
+
+    if transaction_data.get("transaction_type") not in (None, "", "Deposit", "Withdraw"):
+        errors.append(f"Invalid transaction_type '{transaction_data.get('transaction_type')}'.")
+
+    for field in ("amount", "fee", "exchange_rate"):
+        value = transaction_data.get(field)
+        if value in (None, ""):
+            continue
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            errors.append(f"Field '{field}' must be numeric.")
+
+    if transaction_data.get("date"):
+        try:
+            parse_date(transaction_data.get("date"))
+        except ValidationError as e:
+            errors.append(str(e))
+
+    return errors
+
+def find_duplicate_transactions(rows, indexes):
+    """
+    Return {index: existing_name_or_None} for rows whose idempotency key
+    (company, bank, transaction_id or third_party_reference) is already taken
+    in the Transaction Ledger or repeats earlier in the same batch.
+    """
+    keys = [idempotency.get_idempotency_key_for(row) for row in rows]
+    existing = idempotency.find_existing_many(keys)
+    duplicates = {}
+
+    seen = set()
+    for idx, key in zip(indexes, keys):
+        if not key:
+            continue
+        if key in existing:
+            duplicates[idx] = existing[key]
+        elif key in seen:
+            duplicates[idx] = None
+        seen.add(key)
+
+    return duplicates
+
+def get_replayed_response(name):
+    """Response for a replayed request: the originally created ledger, nothing written."""
+    transaction = frappe.get_doc("Transaction Ledger", name)
+    return {
+        "status": "success",
+        "message": "Transaction already exists",
+        "duplicate": True,
+        "transaction": transaction.as_dict(),
+    }
+
+def build_transaction(transaction_data):
+    return frappe.get_doc({
+        "doctype": "Transaction Ledger",
+        "company": transaction_data.get("company"),
+        "transaction_type": transaction_data.get("transaction_type"),
+        "bank": transaction_data.get("bank"),
+        "date": parse_date(transaction_data.get("date")),
+        "amount": transaction_data.get("amount"),
+        "fee": transaction_data.get("fee"),
+        "fee_type": transaction_data.get("fee_type"),
+        "charge_type": transaction_data.get("charge_type"),
+        "exchange_rate": transaction_data.get("exchange_rate") or 1.0,
+        "transaction_id": transaction_data.get("transaction_id"),
+        "third_party_reference": transaction_data.get("third_party_reference"),
+        "username": transaction_data.get("username"),
+        "description": transaction_data.get("description")
+    })
+
 def get_bank_account_details(bank):
     BA = frappe.qb.DocType("Bank Account")
     A = frappe.qb.DocType("Account")
@@ -0,0 +1,94 @@
+import frappe
+from frappe.utils import cint, getdate, sbool
+from erpnext.accounts.utils import get_balance_on
+from casino_navy.casino_navy.doctype.bank_daily_balance.bank_daily_balance import get_balance_as_of
+
+WATERMARK_KEY = "casino_navy:gl_watermark:{}"
+ENTRY_KEY = "casino_navy:balance:{}"
+HITS_KEY = "casino_navy:balance_cache:hits"
+MISSES_KEY = "casino_navy:balance_cache:misses"
+ENTRY_TTL = 60 * 60 * 24
+
+def get_balance(company, account, date=None, cost_center=None, in_account_currency=True):
+    """
+    Balance of `account` as of `date`, shared through Redis by every worker.
+
+    Each cached balance carries the account's GL watermark from the moment it
+    was computed. Posting to the account bumps the watermark, so an entry is
+    only served while no GL Entry has touched the account since.
+    """
+    date = getdate(date)
+    # Query strings arrive as "true"/"false"; sbool maps those before cint
+    in_account_currency = 1 if cint(sbool(in_account_currency)) else 0
+    cache = frappe.cache()
+    key = ENTRY_KEY.format("|".join([company, account, str(date), cost_center or "", str(in_account_currency)]))
+
+    # Read the watermark before computing, so a posting that lands meanwhile
+    # makes this entry stale instead of hiding behind it
+    watermark = get_watermark(account)
+    entry = cache.get_value(key)
+    if entry and entry["watermark"] == watermark:
+        cache.incr(cache.make_key(HITS_KEY))
+        return entry["balance"]
+
+    cache.incr(cache.make_key(MISSES_KEY))
+
+    balance = None
+    if not cost_center:
+        balance = get_balance_as_of(company, account, date, in_account_currency)
+    if balance is None:
+        balance = get_balance_on(
+            account=account,
+            date=date,
+            company=company,
+            in_account_currency=in_account_currency,
+            cost_center=cost_center,
+            ignore_account_permission=True,
+        )
+
+    cache.set_value(key, {"watermark": watermark, "balance": balance}, expires_in_sec=ENTRY_TTL)
+    return balance
+
+def get_watermark(account):
+    return cint(frappe.cache().get(frappe.cache().make_key(WATERMARK_KEY.format(account))))
+
+def bump_watermarks(accounts):
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for account in set(accounts):
+        pipe.incr(cache.make_key(WATERMARK_KEY.format(account)))
+    pipe.execute()
+
+def invalidate_accounts(accounts):
+    """
+    Make every cached balance of `accounts` stale. Bumps now and again after
+    commit, so a balance computed from the pre-commit state cannot be cached
+    under the new watermark.
+    """
+    accounts = list(set(accounts))
+    if not accounts:
+        return
+    bump_watermarks(accounts)
+    frappe.db.after_commit.add(lambda: bump_watermarks(accounts))
+
+def invalidate_gl_entry(doc, method=None):
+    """GL Entry on_submit hook; cancellations arrive as reversing GL Entries."""
+    invalidate_accounts([doc.account])
+
+@frappe.whitelist()
+def get_balance_cache_stats():
+    cache = frappe.cache()
+    hits = cint(cache.get(cache.make_key(HITS_KEY)))
+    misses = cint(cache.get(cache.make_key(MISSES_KEY)))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+@frappe.whitelist()
+def reset_balance_cache_stats():
+    frappe.only_for("System Manager")
+    cache = frappe.cache()
+    cache.delete(cache.make_key(HITS_KEY))
+    cache.delete(cache.make_key(MISSES_KEY))
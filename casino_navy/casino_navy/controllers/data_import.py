@@ -1,55 +1,174 @@
 import frappe
 from frappe import qb
 from frappe.query_builder import Query
+from frappe.query_builder.functions import Count, Sum
+from frappe.core.doctype.data_import.data_import import DataImport as FrappeDataImport
+from casino_navy.casino_navy.doctype.bank_daily_balance.bank_daily_balance import apply_deltas
+from casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup import apply_deltas as apply_rollup_deltas
+from casino_navy.balance_cache import invalidate_accounts
+from casino_navy.reporting.result_cache import invalidate_companies
+from casino_navy.casino_navy.controllers.import_preflight import SIDES as PREFLIGHT_DOCTYPES, ensure_preflight_passes, run_preflight
 
 DI = qb.DocType('Data Import')
 IL = qb.DocType('Data Import Log')
+JE = qb.DocType('Journal Entry')
+JA = qb.DocType('Journal Entry Account')
+GL = qb.DocType('GL Entry')
+PLE = qb.DocType('Payment Ledger Entry')
+
+DELETABLE_DOCTYPES = ("Transaction Ledger", "Balance Transfer")
+DELETE_CHUNK_SIZE = 1000
+
+class DataImport(FrappeDataImport):
+    def start_import(self):
+        # Check the whole file before any row is inserted
+        if self.reference_doctype in PREFLIGHT_DOCTYPES and self.import_type == "Insert New Records":
+            ensure_preflight_passes(self)
+        return super().start_import()
 
 @frappe.whitelist()
 def delete_all_data_imports(name):
-    # We will delete in three steps
-    # 1. Delete related documents
-    # 2. Delete related logs
-    # 3. Delete the data import itself
-
+    # The deletion runs in the background, chunk by chunk, driven by the
+    # remaining Data Import Log rows so that a rerun resumes where it stopped.
     doc = frappe.get_doc("Data Import", name)
+    doc.check_permission("delete")
 
-    if doc.reference_doctype not in ("Transaction Ledger", "Balance Transfer"):
+    if doc.reference_doctype not in DELETABLE_DOCTYPES:
         frappe.throw("This option is only available for Transaction Ledger and Balance Transfer")
 
+    # A rolled-up ledger shares its Journal Entry with other ledgers. Once it is
+    # cancelled its legs are reversed by a Journal Entry of its own; neither
+    # entry references the ledger, so the delete job leaves both in place and
+    # they net out. Only ledgers still counted in a roll-up block the delete.
+    if doc.reference_doctype == "Transaction Ledger" and frappe.db.sql("""
+        SELECT 1
+        FROM `tabTransaction Ledger` tl
+        JOIN `tabData Import Log` il ON il.docname = tl.name
+        WHERE il.data_import = %s
+            AND tl.docstatus = 1
+            AND IFNULL(tl.rollup_entry, '') != ''
+            AND IFNULL(tl.rollup_reversal_entry, '') = ''
+        LIMIT 1
+    """, name):
+        frappe.throw(
+            "Some ledgers of this import were posted in a daily roll-up. "
+            "Cancel them first so the roll-up is reversed, then delete the import."
+        )
+
+    frappe.enqueue(
+        "casino_navy.casino_navy.controllers.data_import.run_delete_data_import",
+        queue="long",
+        timeout=60 * 60 * 4,
+        job_id=f"delete_data_import::{name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        name=name,
+    )
+
+    return f"Deletion of {name} has been queued. Progress is shown on the form."
+
+@frappe.whitelist()
+def preflight_data_import(name):
+    # Set-based check of the whole file against banks, charge types, companies
+    # and exchange rates, so bad rows are reported before the import starts.
+    doc = frappe.get_doc("Data Import", name)
+    doc.check_permission("read")
+
+    return run_preflight(doc)
+
+def run_delete_data_import(name):
+    doc = frappe.get_doc("Data Import", name)
+    doctype = doc.reference_doctype
+    total = qb.from_(IL).select(Count("*")).where(IL.data_import == name).run()[0][0]
+    current = 0
+
+    publish_progress(doc, current, total)
+
+    while True:
+        logs = qb.from_(IL).select(IL.name, IL.docname).where(
+            IL.data_import == name
+        ).orderby(IL.name).limit(DELETE_CHUNK_SIZE).run(as_dict=True)
+
+        if not logs:
+            break
+
+        docnames = [log.docname for log in logs if log.docname]
+        if docnames:
+            delete_linked_journal_entries(doctype, docnames)
+            DT = qb.DocType(doctype)
+            qb.from_(DT).delete().where(DT.name.isin(docnames)).run()
+
+        qb.from_(IL).delete().where(IL.name.isin([log.name for log in logs])).run()
+
+        # Commit every chunk so locks are released and a restart resumes from here
+        frappe.db.commit()
+
+        current += len(logs)
+        publish_progress(doc, current, total)
+
+    frappe.publish_realtime("delete_data_import_refresh", {"mapping": doc.name})
+
+    doc.delete()
+    frappe.db.commit()
+
+    frappe.publish_realtime("delete_data_import_complete", {"mapping": doc.name})
+
+def delete_linked_journal_entries(doctype, docnames):
+    # Journal Entries (and their ledger rows) booked by the deleted documents,
+    # removed in bulk instead of one on_trash / cancel per document.
+    journal_entries = qb.from_(JE).select(JE.name).where(
+        (JE.reference_type == doctype)&
+        (JE.reference_name.isin(docnames))
+    ).run(pluck=True)
+
+    if not journal_entries:
+        return
+
+    # Take the deleted movements out of the daily bank balances and the
+    # monthly roll-up first
+    movements = qb.from_(GL).select(
+        GL.company,
+        GL.account,
+        GL.posting_date,
+        GL.account_currency,
+        (-Sum(GL.debit)).as_("debit"),
+        (-Sum(GL.credit)).as_("credit"),
+        (-Sum(GL.debit_in_account_currency)).as_("debit_in_account_currency"),
+        (-Sum(GL.credit_in_account_currency)).as_("credit_in_account_currency"),
+    ).where(
+        (GL.voucher_type == "Journal Entry")&
+        (GL.voucher_no.isin(journal_entries))
+    ).groupby(
+        GL.company, GL.account, GL.posting_date, GL.account_currency
+    ).run(as_dict=True)
+    apply_deltas(movements)
+    apply_rollup_deltas(movements)
+    invalidate_accounts([row.account for row in movements])
+    invalidate_companies([row.company for row in movements])
+
+    qb.from_(GL).delete().where(
+        (GL.voucher_type == "Journal Entry")&
+        (GL.voucher_no.isin(journal_entries))
+    ).run()
+    qb.from_(PLE).delete().where(
+        (PLE.voucher_type == "Journal Entry")&
+        (PLE.voucher_no.isin(journal_entries))
+    ).run()
+    qb.from_(JA).delete().where(
+        (JA.parenttype == "Journal Entry")&
+        (JA.parent.isin(journal_entries))
+    ).run()
+    qb.from_(JE).delete().where(JE.name.isin(journal_entries)).run()
+
+def publish_progress(doc, current, total):
     frappe.publish_realtime(
         "delete_data_import",
         {
-            "current": 1,
-            "total": 3,
+            "current": current,
+            "total": total,
             "success": True,
             "mapping_name": doc.name,
         },
         doctype=doc.doctype,
         docname=doc.name
     )
-
-    # Step 1
-    frappe.db.sql("""
-        DELETE  
-            `tab{0}`
-        FROM  
-            `tab{0}`
-        JOIN 
-            `tabData Import Log` 
-        ON 
-            `tab{0}`.`name`=`tabData Import Log`.`docname` 
-        WHERE 
-            `tabData Import Log`.`data_import`='{1}'
-    """.format(doc.reference_doctype, name))
-    
-    
-    frappe.publish_realtime("delete_data_import_refresh", {"mapping": doc.name})
-
-    # Step 2
-    qb.from_(IL).delete().where(IL.data_import == doc.name).run(debug=True)
-    
-    frappe.publish_realtime("delete_data_import_complete", {"mapping": doc.name})
-
-    # Step 3
-    doc.delete()
@@ -0,0 +1,238 @@
+import frappe
+from frappe import qb
+from frappe.utils import flt, getdate
+from casino_navy.exchange_rates import ExchangeRateIndex
+
+BA = qb.DocType('Bank Account')
+A = qb.DocType('Account')
+CT = qb.DocType('Charge Type')
+MOPA = qb.DocType('Mode of Payment Account')
+
+# Each side of a row: (company, bank, charge type, fee type, fee) fields.
+# A Transaction Ledger has one side, a Balance Transfer has two.
+SIDES = {
+    "Transaction Ledger": [("company", "bank", "charge_type", "fee_type", "fee")],
+    "Balance Transfer": [
+        ("from_company", "from_bank", "from_charge_type", "from_fee_type", "from_fee"),
+        ("to_company", "to_bank", "to_charge_type", "to_fee_type", "to_fee"),
+    ],
+}
+
+# Charge Type `type` required per Transaction Ledger transaction_type (see TransactionLedger.validate_types)
+CHARGE_TYPE_RULES = {
+    "Deposit": "Income",
+    "Withdraw": "Expense",
+}
+
+# Errors listed when an import is refused; the Pre-flight Check button shows them all
+MAX_REPORTED_ERRORS = 20
+
+def run_preflight(data_import):
+    """
+    Check every row of a Transaction Ledger / Balance Transfer import against
+    the masters it references, with one query per master instead of one
+    validate() chain per row. Returns {"rows": n, "errors": [...], "warnings": [...]}.
+    """
+    from frappe.core.doctype.data_import.importer import Importer
+
+    doctype = data_import.reference_doctype
+    if doctype not in SIDES:
+        frappe.throw("Pre-flight checks are only available for Transaction Ledger and Balance Transfer")
+
+    payloads = Importer(doctype, data_import=data_import).import_file.get_payloads_for_import()
+    rows = [(payload.rows[0].row_number, frappe._dict(payload.doc)) for payload in payloads]
+
+    report = Report()
+    sides = SIDES[doctype]
+
+    companies = {row.get(side[0]) for _, row in rows for side in sides} - {None, ""}
+    banks = {row.get(side[1]) for _, row in rows for side in sides} - {None, ""}
+    charge_types = {row.get(f) for _, row in rows for side in sides for f in side[2:4]} - {None, ""}
+
+    company_currencies = get_company_currencies(companies)
+    bank_details = get_bank_details(banks)
+    charge_details, charge_accounts = get_charge_details(charge_types, companies)
+    index = get_rate_index([row.date for _, row in rows])
+
+    rates_needed = set()
+    for row_number, row in rows:
+        if not row.date:
+            report.error(row_number, "date", None, "Date is required")
+        if not flt(row.amount):
+            report.error(row_number, "amount", row.amount, "Amount is required")
+
+        if doctype == "Transaction Ledger":
+            check_transaction_type(report, row_number, row, charge_details)
+
+        for company_field, bank_field, charge_field, fee_field, fee_amount_field in sides:
+            company, bank = row.get(company_field), row.get(bank_field)
+            charge_type, fee_type = row.get(charge_field), row.get(fee_field)
+
+            if not company:
+                report.error(row_number, company_field, company, "Company is required")
+            elif company not in company_currencies:
+                report.error(row_number, company_field, company, f"Company '{company}' does not exist")
+
+            bank_currency = None
+            if not bank:
+                report.error(row_number, bank_field, bank, "Bank is required")
+            elif bank not in bank_details:
+                report.error(row_number, bank_field, bank, f"Bank Account '{bank}' does not exist")
+            elif not bank_details[bank].account:
+                report.error(row_number, bank_field, bank, f"Bank Account '{bank}' does not have an account")
+            else:
+                bank_currency = bank_details[bank].account_currency
+                if doctype == "Transaction Ledger" and company and bank_details[bank].company != company:
+                    report.error(row_number, bank_field, bank, f"Bank Account '{bank}' does not belong to Company '{company}'")
+
+            charge_currency = check_charge(report, row_number, charge_field, charge_type, company, charge_details, charge_accounts, required=True)
+            fee_currency = check_charge(report, row_number, fee_field, fee_type, company, charge_details, charge_accounts)
+
+            if flt(row.get(fee_amount_field)) > 0 and fee_currency and bank_currency and fee_currency != bank_currency:
+                report.error(
+                    row_number, fee_field, fee_type,
+                    f"Fee currency '{fee_currency}' does not match bank account currency '{bank_currency}'"
+                )
+
+            company_currency = company_currencies.get(company)
+            if row.date and company_currency:
+                for currency in (bank_currency, charge_currency, fee_currency):
+                    if currency and currency != company_currency:
+                        rates_needed.add((currency, company_currency, getdate(row.date), row_number))
+
+    missing = {}
+    for from_currency, to_currency, date, row_number in rates_needed:
+        if index.get_indexed_rate(from_currency, to_currency, date) is None:
+            missing.setdefault((from_currency, to_currency, date), []).append(row_number)
+    for (from_currency, to_currency, date), row_numbers in sorted(missing.items()):
+        report.warning(
+            min(row_numbers), "date", str(date),
+            f"No Currency Exchange {from_currency} → {to_currency} on or before {date} "
+            f"({len(row_numbers)} row(s)); the rate will be fetched at import time"
+        )
+
+    return {"rows": len(rows), "errors": report.errors, "warnings": report.warnings}
+
+def ensure_preflight_passes(data_import):
+    """Run the pre-flight check and refuse to start the import when it finds errors."""
+    errors = run_preflight(data_import)["errors"]
+    if not errors:
+        return
+
+    lines = [f"Row {e['row']}: {e['message']}" for e in errors[:MAX_REPORTED_ERRORS]]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        lines.append(f"... and {len(errors) - MAX_REPORTED_ERRORS} more")
+    frappe.throw(
+        "The import was not started, the pre-flight check found errors:<br>" + "<br>".join(lines),
+        title="Pre-flight Check Failed",
+    )
+
+def check_transaction_type(report, row_number, row, charge_details):
+    transaction_type = row.transaction_type
+    if transaction_type not in CHARGE_TYPE_RULES:
+        report.error(row_number, "transaction_type", transaction_type, "Transaction Type must be Deposit or Withdraw")
+        return
+
+    charge = charge_details.get(row.charge_type)
+    if charge and charge.type != CHARGE_TYPE_RULES[transaction_type]:
+        report.error(
+            row_number, "charge_type", row.charge_type,
+            f"Charge Type '{row.charge_type}' is not an {CHARGE_TYPE_RULES[transaction_type].lower()} type"
+        )
+
+    fee = charge_details.get(row.fee_type)
+    if fee and fee.type != "Fee":
+        report.error(row_number, "fee_type", row.fee_type, f"Charge Type '{row.fee_type}' is not a fee type")
+
+def check_charge(report, row_number, field, charge_type, company, charge_details, charge_accounts, required=False):
+    """Validate a charge/fee type reference and return its account currency for `company`."""
+    if not charge_type:
+        if required:
+            report.error(row_number, field, charge_type, "Charge Type is required")
+        return None
+
+    if charge_type not in charge_details:
+        report.error(row_number, field, charge_type, f"Charge Type '{charge_type}' does not exist")
+        return None
+
+    account = charge_accounts.get((charge_type, company))
+    if company and not account:
+        report.error(
+            row_number, field, charge_type,
+            f"Charge Type '{charge_type}' does not have a default account for company '{company}'"
+        )
+        return None
+
+    return account.account_currency if account else None
+
+def get_company_currencies(companies):
+    if not companies:
+        return {}
+    return dict(frappe.get_all(
+        "Company",
+        filters={"name": ["in", list(companies)]},
+        fields=["name", "default_currency"],
+        as_list=True,
+    ))
+
+def get_bank_details(banks):
+    if not banks:
+        return {}
+    rows = qb.from_(BA).left_join(A).on(
+        BA.account == A.name
+    ).select(
+        BA.name,
+        BA.company,
+        A.name.as_("account"),
+        A.account_currency
+    ).where(
+        BA.name.isin(list(banks))
+    ).run(as_dict=True)
+    return {row.name: row for row in rows}
+
+def get_charge_details(charge_types, companies):
+    if not charge_types:
+        return {}, {}
+
+    charges = {
+        row.name: row
+        for row in qb.from_(CT).select(CT.name, CT.type).where(
+            CT.name.isin(list(charge_types))
+        ).run(as_dict=True)
+    }
+
+    accounts = {}
+    if companies:
+        for row in qb.from_(MOPA).join(A).on(
+            MOPA.default_account == A.name
+        ).select(
+            MOPA.parent,
+            MOPA.company,
+            MOPA.default_account,
+            A.account_currency
+        ).where(
+            (MOPA.parenttype == "Charge Type")&
+            (MOPA.parent.isin(list(charge_types)))&
+            (MOPA.company.isin(list(companies)))
+        ).run(as_dict=True):
+            accounts.setdefault((row.parent, row.company), row)
+
+    return charges, accounts
+
+def get_rate_index(dates):
+    dates = [getdate(date) for date in dates if date]
+    index = ExchangeRateIndex()
+    if dates:
+        index.preload(min(dates), max(dates))
+    return index
+
+class Report:
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+
+    def error(self, row, field, value, message):
+        self.errors.append({"row": row, "field": field, "value": value, "message": message})
+
+    def warning(self, row, field, value, message):
+        self.warnings.append({"row": row, "field": field, "value": value, "message": message})
@@ -0,0 +1,212 @@
+import json
+
+import frappe
+from frappe.utils import cint
+from casino_navy.casino_navy.controllers.import_preflight import ensure_preflight_passes
+
+# Rows are partitioned by the (company, bank) pairs they post to. A Balance
+# Transfer posts to two banks, so partitions sharing any bank are merged and
+# partitions never touch the same bank balance; they can run side by side.
+# Rows inside a partition always run in file order so running balances and
+# names are stable.
+PARTITION_FIELDS = {
+    "Transaction Ledger": [("company", "bank")],
+    "Balance Transfer": [("from_company", "from_bank"), ("to_company", "to_bank")],
+}
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_SIZE = 200
+SAVEPOINT = "parallel_import_row"
+
+@frappe.whitelist()
+def start_parallel_import(name, workers=None, chunk_size=None):
+    doc = frappe.get_doc("Data Import", name)
+    doc.check_permission("write")
+
+    if doc.reference_doctype not in PARTITION_FIELDS:
+        frappe.throw("Parallel import is only available for Transaction Ledger and Balance Transfer")
+    if doc.import_type != "Insert New Records":
+        frappe.throw("Parallel import only supports inserting new records")
+
+    ensure_preflight_passes(doc)
+
+    workers = cint(workers) or cint(frappe.conf.get("casino_navy_import_workers")) or DEFAULT_WORKERS
+    chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+
+    payloads = get_payloads(doc)
+    partitions = get_partitions(doc.reference_doctype, payloads)
+    assignments = assign_partitions(partitions, workers)
+
+    # Failed rows are retried, so their old logs would be counted twice
+    frappe.db.delete("Data Import Log", {"data_import": name, "success": 0})
+
+    cache = frappe.cache()
+    cache.set(get_key(name, "total"), len(payloads))
+    cache.set(get_key(name, "done"), get_imported_count(name))
+    cache.set(get_key(name, "workers"), len(assignments))
+
+    doc.db_set("status", "Pending")
+    for slot, partition_keys in enumerate(assignments):
+        frappe.enqueue(
+            "casino_navy.casino_navy.controllers.import_runner.run_partitions",
+            queue="long",
+            timeout=60 * 60 * 4,
+            job_id=f"parallel_import::{name}::{slot}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            name=name,
+            partition_keys=partition_keys,
+            chunk_size=chunk_size,
+        )
+
+    return {"rows": len(payloads), "partitions": len(partitions), "workers": len(assignments)}
+
+def run_partitions(name, partition_keys, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Every worker parses the file itself instead of receiving the rows in the
+    # job payload, and skips the rows already logged as imported, so a job can
+    # simply be enqueued again if its worker dies.
+    doc = frappe.get_doc("Data Import", name)
+    partitions = get_partitions(doc.reference_doctype, get_payloads(doc))
+    imported = get_imported_rows(name)
+
+    try:
+        for key in partition_keys:
+            rows = [p for p in partitions.get(tuple(key), []) if row_number(p) not in imported]
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                for payload in chunk:
+                    import_row(doc, payload)
+                frappe.db.commit()
+                publish_progress(doc, frappe.cache().incrby(get_key(name, "done"), len(chunk)))
+    finally:
+        if frappe.cache().decr(get_key(name, "workers")) <= 0:
+            finish_import(doc)
+
+def import_row(doc, payload):
+    frappe.db.savepoint(SAVEPOINT)
+    log = {
+        "doctype": "Data Import Log",
+        "data_import": doc.name,
+        "row_indexes": json.dumps([row_number(payload)]),
+    }
+    try:
+        record = frappe.get_doc({**payload.doc, "doctype": doc.reference_doctype})
+        record.insert()
+        if doc.submit_after_import:
+            record.submit()
+        log.update({"success": 1, "docname": record.name})
+    except Exception as e:
+        frappe.db.rollback(save_point=SAVEPOINT)
+        log.update({
+            "success": 0,
+            "exception": frappe.get_traceback(),
+            "messages": json.dumps([str(e)]),
+        })
+
+    frappe.clear_messages()
+    frappe.get_doc(log).db_insert()
+
+def finish_import(doc):
+    failed, succeeded = 0, 0
+    for success, count in frappe.db.sql("""
+        SELECT success, COUNT(*)
+        FROM `tabData Import Log`
+        WHERE data_import = %s
+        GROUP BY success
+    """, doc.name):
+        if cint(success):
+            succeeded = count
+        else:
+            failed = count
+
+    if not failed:
+        status = "Success"
+    elif succeeded:
+        status = "Partial Success"
+    else:
+        status = "Error"
+
+    doc.db_set("status", status)
+    frappe.db.commit()
+    frappe.publish_realtime("data_import_refresh", {"data_import": doc.name})
+
+def get_payloads(doc):
+    from frappe.core.doctype.data_import.importer import Importer
+
+    importer = Importer(doc.reference_doctype, data_import=doc)
+    return importer.import_file.get_payloads_for_import()
+
+def get_partitions(doctype, payloads):
+    # Union-find over the (company, bank) pairs of each row; every partition is
+    # keyed by its smallest pair so the same file always yields the same keys.
+    parent = {}
+
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            a, b = sorted((a, b), key=sort_key)
+            parent[b] = a
+
+    payloads = sorted(payloads, key=row_number)
+    row_keys = []
+    for payload in payloads:
+        keys = [(payload.doc.get(company_field), payload.doc.get(bank_field)) for company_field, bank_field in PARTITION_FIELDS[doctype]]
+        for key in keys[1:]:
+            union(keys[0], key)
+        row_keys.append(keys[0])
+
+    partitions = {}
+    for payload, key in zip(payloads, row_keys):
+        partitions.setdefault(find(key), []).append(payload)
+    return partitions
+
+def sort_key(key):
+    return tuple(str(part or "") for part in key)
+
+def assign_partitions(partitions, workers):
+    # Largest partitions first, each to the least loaded worker; ties broken
+    # by key so the same file always yields the same assignment.
+    loads = [[0, []] for _ in range(max(1, min(workers, len(partitions))))]
+    for key, rows in sorted(partitions.items(), key=lambda item: (-len(item[1]), str(item[0]))):
+        load = min(loads, key=lambda l: l[0])
+        load[0] += len(rows)
+        load[1].append(list(key))
+    return [keys for _, keys in loads if keys]
+
+def get_imported_rows(name):
+    imported = set()
+    for row_indexes in frappe.get_all(
+        "Data Import Log",
+        filters={"data_import": name, "success": 1},
+        pluck="row_indexes",
+    ):
+        imported.update(json.loads(row_indexes or "[]"))
+    return imported
+
+def get_imported_count(name):
+    return frappe.db.count("Data Import Log", {"data_import": name, "success": 1})
+
+def row_number(payload):
+    return payload.rows[0].row_number
+
+def publish_progress(doc, current):
+    frappe.publish_realtime(
+        "data_import_progress",
+        {
+            "current": current,
+            "total": cint(frappe.cache().get(get_key(doc.name, "total"))),
+            "data_import": doc.name,
+            "success": True,
+        },
+        doctype=doc.doctype,
+        docname=doc.name,
+    )
+
+def get_key(name, counter):
+    return frappe.cache().make_key(f"casino_navy:parallel_import:{name}:{counter}")
@@ -1,14 +1,44 @@
 # Copyright (c) 2025, Lewin Villar and contributors
 # For license information, please see license.txt
 
-import re
 import frappe
 from collections import defaultdict, OrderedDict
-from frappe.utils.nestedset import get_descendants_of
+from frappe.utils import cint
 from frappe.model.document import Document
+from casino_navy.casino_navy.doctype.accountant_mapper.formula import FormulaGraph, compile_formula
 
 class AccountantMapper(Document):
-	pass
+	def validate(self):
+		self.validate_formulas()
+		self.warn_sign_conflicts()
+
+	def validate_formulas(self):
+		labels = _get_report_labels(self.report, exclude=self.name) + [it.section_label for it in self.items]
+		formulas = {}
+		for it in self.items:
+			if it.row_type == "Formula":
+				compiled = compile_formula(it.formula, labels, it.sign, context=f"Row #{it.idx}")
+				formulas.setdefault(it.section_label, []).extend([compiled] if compiled else [])
+
+		FormulaGraph(formulas)
+
+	def warn_sign_conflicts(self):
+		items = sorted(self.items, key=lambda it: (cint(it.sort_order), it.section_label or ""))
+		conflicts = _find_sign_conflicts(_resolve_leaf_map(self.company, _build_sections(items)))
+		if not conflicts:
+			return
+
+		lines = "".join(
+			"<li>{}: {}</li>".format(
+				c["account"], ", ".join(f"{label} ({sign:+d})" for label, sign in c["sections"].items())
+			)
+			for c in conflicts
+		)
+		frappe.msgprint(
+			f"These accounts fall into several sections with different signs:<ul>{lines}</ul>",
+			title="Sign Conflicts",
+			indicator="orange",
+		)
 
 
 def _pick_mapper(report, company=None):
@@ -37,6 +67,23 @@ def _pick_mapper(report, company=None):
     return any_mapper[0].name if any_mapper else None
 
 
+def _get_report_labels(report, exclude=None):
+    """Section labels of every Accountant Mapper of `report`; formulas may reference any of them."""
+    return frappe.db.sql(
+        """
+        SELECT DISTINCT item.section_label
+        FROM `tabAccountant Mapper Item` item
+        JOIN `tabAccountant Mapper` am ON am.name = item.parent
+        WHERE am.report = %(report)s
+            AND am.name != %(exclude)s
+            AND item.parenttype = 'Accountant Mapper'
+            AND IFNULL(item.section_label, '') != ''
+        """,
+        {"report": report, "exclude": exclude or ""},
+        pluck=True,
+    )
+
+
 def _load_sections_from_mapper(report, company):
     mapper = _pick_mapper(report, company)
     if not mapper:
@@ -48,7 +95,10 @@ def _load_sections_from_mapper(report, company):
         fields=["section_label", "row_type", "account", "include_children", "sign", "formula", "sort_order"],
         order_by="sort_order asc, section_label asc"
     )
+    return _build_sections(items)
 
+
+def _build_sections(items):
     # sections: OrderedDict[str, dict]
     sections = OrderedDict()
     for it in items:
@@ -68,47 +118,64 @@ def _load_sections_from_mapper(report, company):
     return sections
 
 
-def _expand_to_leaf_accounts(company, account_name, include_children=True):
-    if not include_children:
-        return [account_name]
-    # If it's a group, expand to all leafs; else keep single
-    is_group = frappe.db.get_value("Account", {"company": company, "name": account_name}, "is_group")
-    if is_group:
-        leafs = get_descendants_of("Account", account_name)
-        return leafs or []
-    return [account_name]
-
-
-def _resolve_sections_leafs(company, sections):
-    """Return dict: {section_label: {"leafs": set(), "signs": {leaf: sign}, "formulas": [...]}}"""
-    out = OrderedDict()
+def _resolve_leaf_map(company, sections):
+    """
+    Return dict: {leaf: OrderedDict{section_label: sign}} for every bucket, in one query.
+    Buckets with include_children expand to the ledger accounts of their subtree
+    (the account itself when it is not a group); other buckets map as-is.
+    """
+    expand = {b["account"] for cfg in sections.values() for b in cfg["buckets"] if b["account"] and b["include_children"]}
+
+    leafs_of = defaultdict(list)
+    if expand:
+        company_condition = "AND leaf.company = %(company)s" if company else ""
+        for bucket, leaf in frappe.db.sql(
+            f"""
+            SELECT bucket.name, leaf.name
+            FROM `tabAccount` bucket
+            JOIN `tabAccount` leaf
+                ON leaf.lft >= bucket.lft AND leaf.rgt <= bucket.rgt
+            WHERE bucket.name IN %(accounts)s
+                AND leaf.is_group = 0
+                {company_condition}
+            ORDER BY leaf.lft
+            """,
+            {"accounts": tuple(expand), "company": company},
+        ):
+            leafs_of[bucket].append(leaf)
+
+    leaf_map = OrderedDict()
     for label, cfg in sections.items():
-        leafs = set()
-        signs = {}
         for b in cfg["buckets"]:
-            for leaf in _expand_to_leaf_accounts(company, b["account"], b["include_children"]):
-                leafs.add(leaf)
-                signs[leaf] = b["sign"]
-        out[label] = {"leafs": leafs, "signs": signs, "formulas": cfg.get("formulas", [])}
+            if not b["account"]:
+                continue
+            for leaf in leafs_of[b["account"]] if b["include_children"] else [b["account"]]:
+                # A later bucket of the same section overrides the sign
+                leaf_map.setdefault(leaf, OrderedDict())[label] = b["sign"]
+    return leaf_map
+
+
+def _find_sign_conflicts(leaf_map):
+    """Leafs mapped to several sections with different signs: [{"account", "sections": {label: sign}}]"""
+    return [
+        {"account": leaf, "sections": dict(signs)}
+        for leaf, signs in leaf_map.items()
+        if len(set(signs.values())) > 1
+    ]
+
+
+def _sections_from_leaf_map(sections, leaf_map):
+    out = OrderedDict(
+        (label, {"leafs": set(), "signs": {}, "formulas": cfg.get("formulas", [])})
+        for label, cfg in sections.items()
+    )
+    for leaf, signs in leaf_map.items():
+        for label, sign in signs.items():
+            out[label]["leafs"].add(leaf)
+            out[label]["signs"][leaf] = sign
     return out
 
 
-def _evaluate_formulas(section_totals, formulas):
-    """formulas: list of {"formula": "Revenue - Total Expenses", "sign": 1} -> float"""
-    values = []
-    for f in formulas:
-        expr = f.get("formula") or ""
-        # Very simple safe evaluation: only allow section labels, + - * / ( )
-        # Replace labels with numeric totals
-        safe = expr
-        for lbl, val in section_totals.items():
-            safe = re.sub(rf"\b{re.escape(lbl)}\b", str(val), safe)
-        # Remove unsafe chars (leave digits, operators, dots, spaces, parentheses)
-        if re.search(r"[^0-9\.\+\-\*\/\(\) ]", safe):
-            values.append(0.0)
-            continue
-        try:
-            values.append((eval(safe) if safe.strip() else 0.0) * float(f.get("sign", 1)))
-        except Exception:
-            values.append(0.0)
-    return sum(values) if values else 0.0
\ No newline at end of file
+def _resolve_sections_leafs(company, sections):
+    """Return dict: {section_label: {"leafs": set(), "signs": {leaf: sign}, "formulas": [...]}}"""
+    return _sections_from_leaf_map(sections, _resolve_leaf_map(company, sections))
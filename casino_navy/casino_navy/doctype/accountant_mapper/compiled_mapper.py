@@ -0,0 +1,142 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Compiled Accountant Mappers.
+
+A compiled mapper is the mapper picked for (report, company) with every
+bucket already expanded to its leaf accounts and every formula parsed, ready
+for the reports and the drill-downs. Compiled mappers are cached in Redis and per request, tagged
+with FORMAT_VERSION and two version counters: one bumped whenever an
+Accountant Mapper is saved or deleted, one whenever an Account is created,
+moved, renamed or deleted.
+A warm lookup reads the two counters and touches no table.
+"""
+
+import frappe
+from frappe.utils import cint
+from casino_navy.casino_navy.doctype.accountant_mapper.accountant_mapper import (
+    _find_sign_conflicts,
+    _get_report_labels,
+    _load_sections_from_mapper,
+    _pick_mapper,
+    _resolve_leaf_map,
+    _sections_from_leaf_map,
+)
+from casino_navy.casino_navy.doctype.accountant_mapper.formula import FormulaGraph, compile_formula
+
+CACHE_KEY = "casino_navy:compiled_mapper"
+MAPPER_VERSION_KEY = "casino_navy:accountant_mapper_version"
+ACCOUNT_TREE_VERSION_KEY = "casino_navy:account_tree_version"
+# Bump whenever CompiledMapper (or anything it holds) changes shape, so
+# pickles written by an older deploy are recompiled instead of served
+FORMAT_VERSION = 3
+
+
+class CompiledMapper:
+    def __init__(self, report, company, mapper, sections, leaf_map, formulas, roots):
+        self.report = report
+        self.company = company
+        self.mapper = mapper
+        # {section_label: {"leafs": set, "signs": {leaf: sign}, "formulas": [...]}}
+        self.sections = sections
+        # {leaf: {section_label: sign}}
+        self.leaf_map = leaf_map
+        self.conflicts = _find_sign_conflicts(leaf_map)
+        # {section_label: [CompiledFormula, ...]} for formula sections, in section order
+        self.formulas = formulas
+        self.graph = FormulaGraph(formulas, strict=False)
+        # Bucket accounts; their subtrees cover every leaf
+        self.roots = roots
+
+    @property
+    def labels(self):
+        return list(self.sections.keys())
+
+    @property
+    def accounts(self):
+        return sorted(self.leaf_map)
+
+
+def get_compiled_mapper(report, company):
+    """Return the compiled mapper for (report, company), compiling it on first use."""
+    versions = (FORMAT_VERSION, get_mapper_version(), get_account_tree_version())
+    field = f"{report}|{company or ''}"
+
+    compiled = getattr(frappe.local, "casino_navy_compiled_mappers", None)
+    if compiled is None:
+        compiled = frappe.local.casino_navy_compiled_mappers = {}
+    if (field, versions) in compiled:
+        return compiled[(field, versions)]
+
+    try:
+        cached = frappe.cache().hget(CACHE_KEY, field)
+    except Exception:
+        # A pickle of a class that no longer loads; recompile over it
+        cached = None
+    if cached and cached.get("versions") == versions:
+        mapper = cached["mapper"]
+    else:
+        mapper = compile_mapper(report, company)
+        frappe.cache().hset(CACHE_KEY, field, {"versions": versions, "mapper": mapper})
+
+    compiled[(field, versions)] = mapper
+    return mapper
+
+
+def compile_mapper(report, company):
+    sections = _load_sections_from_mapper(report, company)
+    leaf_map = _resolve_leaf_map(company, sections)
+
+    labels = _get_report_labels(report)
+    formulas = {}
+    for label, cfg in sections.items():
+        if cfg["formulas"]:
+            compiled = (compile_formula(f["formula"], labels, f["sign"], context=label, strict=False) for f in cfg["formulas"])
+            formulas[label] = [f for f in compiled if f]
+
+    return CompiledMapper(
+        report,
+        company,
+        _pick_mapper(report, company),
+        _sections_from_leaf_map(sections, leaf_map),
+        leaf_map,
+        formulas,
+        sorted({b["account"] for cfg in sections.values() for b in cfg["buckets"] if b["account"]}),
+    )
+
+
+def merge_mappers(mappers, normalize=None):
+    """
+    Combine the compiled mappers of several companies into the section
+    membership ({label: {leaf: sign}}) and formulas the reports evaluate.
+    Companies may share one default mapper, so a leaf's sign is set, never
+    summed, across mappers.
+    """
+    membership = {}
+    formulas = {}
+    for mapper in mappers:
+        for label, info in mapper.sections.items():
+            members = membership.setdefault(normalize(label) if normalize else label, {})
+            for acc in info["leafs"]:
+                members[acc] = info["signs"].get(acc, 1)
+        formulas.update(mapper.formulas)
+    return membership, formulas
+
+
+def get_mapper_version():
+    return cint(frappe.cache().get(frappe.cache().make_key(MAPPER_VERSION_KEY)))
+
+
+def get_account_tree_version():
+    return cint(frappe.cache().get(frappe.cache().make_key(ACCOUNT_TREE_VERSION_KEY)))
+
+
+def clear_mapper_cache(doc=None, method=None):
+    """doc_events hook for Accountant Mapper."""
+    frappe.cache().incr(frappe.cache().make_key(MAPPER_VERSION_KEY))
+
+
+def clear_account_tree_cache(doc=None, method=None):
+    """doc_events hook for Account: new, moved, renamed or deleted accounts change the leaf sets."""
+    frappe.cache().incr(frappe.cache().make_key(ACCOUNT_TREE_VERSION_KEY))
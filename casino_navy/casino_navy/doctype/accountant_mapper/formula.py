@@ -0,0 +1,243 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Accountant Mapper formula rows, e.g. "Revenue - Cost of Sales".
+
+A formula is parsed once into a small expression tree over section indices
+and then evaluated over whole period series at a time. Section labels match
+case-insensitively and regardless of repeated whitespace, longest label
+first, so "Total Expenses X2" wins over "Total Expenses". Only numbers,
+section labels, parentheses and + - * / are accepted; division by zero
+yields 0 for that period.
+
+Formula sections may reference other formula sections; FormulaGraph orders
+them so each is evaluated after the sections it depends on.
+
+Saving a mapper is strict and throws on any invalid formula or cycle. Reports
+compile with `strict=False`: a stale formula (e.g. one naming a section since
+removed from another mapper) is logged to the Error Log and counts as zero,
+so it does not break the report for everyone.
+"""
+
+import ast
+import re
+from collections import deque
+
+import frappe
+
+OPERATORS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+}
+
+PLACEHOLDER = "_s{}"
+
+
+class InvalidFormulaError(frappe.ValidationError):
+    pass
+
+
+def normalize_label(label):
+    return re.sub(r"\s+", " ", (label or "").strip())
+
+
+def label_key(label):
+    return normalize_label(label).lower()
+
+
+class CompiledFormula:
+    def __init__(self, expression, tree, labels, sign=1):
+        self.expression = expression
+        # Nested tuples: ("const", value), ("label", index), ("neg", node), ("op", symbol, left, right)
+        self.tree = tree
+        # Labels referenced by the formula; ("label", index) nodes point into this list
+        self.labels = labels
+        self.sign = sign
+
+    def evaluate(self, series, n):
+        """Evaluate over `n` periods; `series` is {section_label: [value per period]}."""
+        lookup = {label_key(label): values for label, values in series.items()}
+        zeros = [0.0] * n
+        columns = [lookup.get(label_key(label)) or zeros for label in self.labels]
+        return [float(v) * self.sign for v in _evaluate(self.tree, columns, n)]
+
+
+def compile_formula(expression, labels, sign=1, context=None, strict=True):
+    """
+    Parse `expression` against the section `labels` it may reference.
+    Returns None for a blank formula. Anything that is not plain arithmetic
+    over known sections throws a ValidationError, or with `strict=False` is
+    logged and returns None.
+    """
+    expression = (expression or "").strip()
+    if not expression:
+        return None
+
+    prefix = f"{context}: " if context else ""
+    try:
+        text, referenced = _substitute_labels(expression, labels)
+
+        unknown = [
+            token.strip()
+            for token in re.findall(r"[^0-9.+\-*/()\s][^+\-*/()]*", re.sub(r"\b_s\d+\b", " ", text))
+            if token.strip()
+        ]
+        if unknown:
+            raise InvalidFormulaError(f"{prefix}Formula '{expression}' refers to unknown sections: {', '.join(unknown)}")
+
+        try:
+            parsed = ast.parse(text, mode="eval")
+        except SyntaxError:
+            raise InvalidFormulaError(f"{prefix}Formula '{expression}' is not a valid expression")
+
+        return CompiledFormula(expression, _build(parsed.body, expression, prefix), referenced, int(sign or 1))
+    except InvalidFormulaError as e:
+        _report(str(e), strict)
+        return None
+
+
+def evaluate_formulas(formulas, series, n):
+    """Sum of the signed `formulas` (CompiledFormula list) over `n` periods."""
+    out = [0.0] * n
+    for formula in formulas:
+        out = [a + b for a, b in zip(out, formula.evaluate(series, n))]
+    return out
+
+
+class FormulaGraph:
+    def __init__(self, formulas, strict=True):
+        """
+        `formulas` is {section_label: [CompiledFormula, ...]}. Throws if formula
+        sections form a cycle; with `strict=False` the cycle is logged and its
+        sections are left out (they count as zero).
+        """
+        self.formulas = formulas
+        self.strict = strict
+        formula_keys = {label_key(label): label for label in formulas}
+
+        # Formula sections each formula section reads, and every section key -> formulas reading it
+        self.dependencies = {}
+        self.dependents = {}
+        for label, compiled in formulas.items():
+            refs = {label_key(ref) for formula in compiled for ref in formula.labels}
+            self.dependencies[label] = {formula_keys[ref] for ref in refs if ref in formula_keys}
+            for ref in refs:
+                self.dependents.setdefault(ref, set()).add(label)
+
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        pending = {label: len(deps) for label, deps in self.dependencies.items()}
+        queue = deque(label for label, count in pending.items() if not count)
+        order = []
+        while queue:
+            label = queue.popleft()
+            order.append(label)
+            for dependent in self.dependents.get(label_key(label), ()):
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    queue.append(dependent)
+
+        if len(order) < len(pending):
+            cycle = [label for label in self.formulas if label not in order]
+            _report(f"Formula sections reference each other in a cycle: {', '.join(cycle)}", self.strict)
+        return order
+
+    def affected(self, changed_labels):
+        """Formula sections depending, directly or not, on any of `changed_labels`, in evaluation order."""
+        seen = set()
+        queue = deque(label_key(label) for label in changed_labels)
+        while queue:
+            for dependent in self.dependents.get(queue.popleft(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    queue.append(label_key(dependent))
+        return [label for label in self.order if label in seen]
+
+    def evaluate(self, series, n, changed_labels=None):
+        """
+        Fill `series` ({section_label: [value per period]}) with every formula
+        section, in dependency order. With `changed_labels`, only the formulas
+        affected by those sections are recomputed.
+        """
+        labels = self.order if changed_labels is None else self.affected(changed_labels)
+        for label in labels:
+            series[label] = evaluate_formulas(self.formulas[label], series, n)
+        return series
+
+
+def _substitute_labels(expression, labels):
+    """Replace every label in `expression` with a placeholder; returns (text, referenced labels)."""
+    by_key = {}
+    for label in labels:
+        by_key.setdefault(label_key(label), normalize_label(label))
+    if not by_key:
+        return expression, []
+
+    patterns = [
+        r"\s+".join(re.escape(word) for word in key.split(" "))
+        for key in sorted(by_key, key=len, reverse=True)
+    ]
+    regex = re.compile(rf"(?<!\w)(?:{'|'.join(patterns)})(?!\w)", re.IGNORECASE)
+
+    referenced = []
+    index = {}
+
+    def replace(match):
+        key = label_key(match.group(0))
+        if key not in index:
+            index[key] = len(referenced)
+            referenced.append(by_key[key])
+        return PLACEHOLDER.format(index[key])
+
+    return regex.sub(replace, expression), referenced
+
+
+def _build(node, expression, prefix):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return ("const", float(node.value))
+    if isinstance(node, ast.Name) and re.fullmatch(r"_s\d+", node.id):
+        return ("label", int(node.id[2:]))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        operand = _build(node.operand, expression, prefix)
+        return ("neg", operand) if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        return (
+            "op",
+            OPERATORS[type(node.op)],
+            _build(node.left, expression, prefix),
+            _build(node.right, expression, prefix),
+        )
+
+    raise InvalidFormulaError(
+        f"{prefix}Formula '{expression}' may only use numbers, section labels, parentheses and + - * /"
+    )
+
+
+def _report(message, strict):
+    if strict:
+        frappe.throw(message, title="Invalid Formula")
+    frappe.log_error(title="Invalid Formula", message=message)
+
+
+def _evaluate(node, columns, n):
+    kind = node[0]
+    if kind == "const":
+        return [node[1]] * n
+    if kind == "label":
+        return columns[node[1]]
+    if kind == "neg":
+        return [-v for v in _evaluate(node[1], columns, n)]
+
+    left, right = _evaluate(node[2], columns, n), _evaluate(node[3], columns, n)
+    symbol = node[1]
+    if symbol == "+":
+        return [a + b for a, b in zip(left, right)]
+    if symbol == "-":
+        return [a - b for a, b in zip(left, right)]
+    if symbol == "*":
+        return [a * b for a, b in zip(left, right)]
+    return [a / b if b else 0.0 for a, b in zip(left, right)]
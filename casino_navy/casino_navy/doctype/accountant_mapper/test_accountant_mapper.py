@@ -4,6 +4,49 @@
 # import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper import CompiledMapper, merge_mappers
+
+
+def make_compiled_mapper(company, mapper, sections):
+	"""A CompiledMapper over {label: {leaf: sign}}, without touching the database."""
+	leaf_map = {}
+	for label, signs in sections.items():
+		for leaf, sign in signs.items():
+			leaf_map.setdefault(leaf, {})[label] = sign
+	return CompiledMapper(
+		"Profitability View",
+		company,
+		mapper,
+		{label: {"leafs": set(signs), "signs": dict(signs), "formulas": []} for label, signs in sections.items()},
+		leaf_map,
+		{},
+		[],
+	)
+
 
 class TestAccountantMapper(FrappeTestCase):
-	pass
+	def test_merge_mappers_shared_default_mapper(self):
+		# Two companies picked the same any-company default mapper; the second
+		# company's leaves, and the leaf both resolve to, must keep their sign
+		mappers = [
+			make_compiled_mapper("Company A", "Default Mapper", {"Income": {"Sales - A": 1, "Shared": 1}, "Costs": {"Rent - A": -1}}),
+			make_compiled_mapper("Company B", "Default Mapper", {"Income": {"Sales - B": 1, "Shared": 1}, "Costs": {"Rent - B": -1}}),
+		]
+
+		membership, formulas = merge_mappers(mappers)
+
+		self.assertEqual(
+			membership,
+			{
+				"Income": {"Sales - A": 1, "Sales - B": 1, "Shared": 1},
+				"Costs": {"Rent - A": -1, "Rent - B": -1},
+			},
+		)
+		self.assertEqual(formulas, {})
+
+	def test_merge_mappers_normalizes_labels(self):
+		mappers = [make_compiled_mapper("Company A", "Mapper A", {" Income ": {"Sales - A": 1}})]
+
+		membership, _ = merge_mappers(mappers, str.strip)
+
+		self.assertEqual(membership, {"Income": {"Sales - A": 1}})
@@ -0,0 +1,91 @@
+// Copyright (c) 2026, Lewin Villar and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Balance Sweep Rule', {
+	refresh(frm) {
+		$.map(["set_queries", "add_custom_buttons"], (field) => {
+			frm.trigger(field);
+		});
+	},
+	set_queries(frm) {
+		frm.set_query("source_account", () => {
+			return {
+				"filters": {
+					"company": frm.doc.company,
+					"is_group": 1
+				}
+			}
+		});
+		frm.set_query("target_account", () => {
+			return {
+				"filters": {
+					"company": frm.doc.company,
+					"is_group": 0
+				}
+			}
+		});
+		frm.set_query("cost_center", () => {
+			return {
+				"filters": {
+					"company": frm.doc.company,
+					"is_group": 0
+				}
+			}
+		});
+	},
+	add_custom_buttons(frm) {
+		if (frm.is_new())
+			return
+
+		frm.add_custom_button(__("Preview"), () => {
+			frm.call("preview").then(({ message }) => {
+				if (!message || !message.length) {
+					frappe.msgprint(__("Nothing to sweep"));
+					return;
+				}
+
+				const fmt = (value, currency) => format_currency(value || 0, currency);
+				const rows = message.map((row) => `
+					<tr>
+						<td>${frappe.utils.escape_html(row.account)}</td>
+						<td class="text-right">${fmt(row.debit_in_account_currency, row.account_currency)}</td>
+						<td class="text-right">${fmt(row.credit_in_account_currency, row.account_currency)}</td>
+						<td class="text-right">${fmt(row.debit)}</td>
+						<td class="text-right">${fmt(row.credit)}</td>
+					</tr>
+				`).join("");
+
+				frappe.msgprint({
+					title: __("Lines that would be posted"),
+					message: `
+						<table class="table table-bordered table-sm">
+							<thead>
+								<tr>
+									<th>${__("Account")}</th>
+									<th class="text-right">${__("Debit")}</th>
+									<th class="text-right">${__("Credit")}</th>
+									<th class="text-right">${__("Debit (Company Currency)")}</th>
+									<th class="text-right">${__("Credit (Company Currency)")}</th>
+								</tr>
+							</thead>
+							<tbody>${rows}</tbody>
+						</table>
+					`,
+					wide: true,
+				});
+			});
+		});
+
+		frm.add_custom_button(__("Run Now"), () => {
+			frappe.confirm(__("Post the sweep Journal Entry now?"), () => {
+				frm.call("run_now").then(({ message }) => {
+					frappe.show_alert({
+						message: message ? __("Posted {0}", [message]) : __("Nothing to sweep"),
+						indicator: message ? "green" : "orange",
+					});
+					frm.reload_doc();
+				});
+			});
+		});
+	},
+});
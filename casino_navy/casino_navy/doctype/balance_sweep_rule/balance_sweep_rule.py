@@ -0,0 +1,205 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import flt, getdate, now_datetime, today
+from frappe.model.document import Document
+from casino_navy.utils import get_exchange_rate
+from casino_navy.casino_navy.doctype.transaction_ledger.account_resolver import get_account_resolver
+
+
+class BalanceSweepRule(Document):
+	def validate(self):
+		self.validate_accounts()
+
+	def validate_accounts(self):
+		source = frappe.db.get_value("Account", self.source_account, ["company", "is_group"], as_dict=True)
+		target = frappe.db.get_value("Account", self.target_account, ["company", "is_group"], as_dict=True)
+
+		if source.company != self.company or target.company != self.company:
+			frappe.throw(f"Source and target accounts must belong to Company '{self.company}'")
+		if not source.is_group:
+			frappe.throw(f"Source Parent Account '{self.source_account}' must be a group account")
+		if target.is_group:
+			frappe.throw(f"Target Account '{self.target_account}' cannot be a group account")
+
+	@frappe.whitelist()
+	def preview(self, posting_date=None):
+		"""Dry run: the Journal Entry lines the rule would post, without saving anything."""
+		jv = build_sweep_entry(self, posting_date)
+		if not jv:
+			return []
+		return [
+			{
+				"account": row.account,
+				"account_currency": row.account_currency,
+				"debit_in_account_currency": row.debit_in_account_currency,
+				"credit_in_account_currency": row.credit_in_account_currency,
+				"debit": row.debit,
+				"credit": row.credit,
+			}
+			for row in jv.accounts
+		]
+
+	@frappe.whitelist()
+	def run_now(self):
+		return run_rule(self)
+
+
+def get_child_balances(rule, posting_date):
+	"""Account and company currency balances of every ledger account under the rule's source, in one query."""
+	return frappe.db.sql(
+		"""
+		SELECT
+			acc.name AS account,
+			acc.account_currency,
+			SUM(gle.debit_in_account_currency - gle.credit_in_account_currency) AS balance,
+			SUM(gle.debit - gle.credit) AS base_balance
+		FROM `tabAccount` parent
+		JOIN `tabAccount` acc
+			ON acc.lft > parent.lft AND acc.rgt < parent.rgt
+		JOIN `tabGL Entry` gle
+			ON gle.account = acc.name
+		WHERE parent.name = %(source_account)s
+			AND acc.company = %(company)s
+			AND acc.is_group = 0
+			AND acc.name != %(target_account)s
+			AND gle.company = %(company)s
+			AND gle.is_cancelled = 0
+			AND gle.posting_date <= %(posting_date)s
+		GROUP BY acc.name, acc.account_currency
+		ORDER BY acc.lft
+		""",
+		{
+			"source_account": rule.source_account,
+			"target_account": rule.target_account,
+			"company": rule.company,
+			"posting_date": posting_date,
+		},
+		as_dict=True,
+	)
+
+
+def build_sweep_entry(rule, posting_date=None):
+	"""Build (not save) the Journal Entry moving every positive child balance to the target, or None."""
+	posting_date = getdate(posting_date or today())
+	resolver = get_account_resolver(rule.company)
+	cost_center = rule.cost_center or resolver.defaults.cost_center
+	threshold = flt(rule.threshold)
+
+	jv = frappe.new_doc("Journal Entry")
+	jv.update({
+		"company": rule.company,
+		"voucher_type": "Bank Entry",
+		"posting_date": posting_date,
+		"multi_currency": 1,
+		"cheque_no": rule.rule_name,
+		"cheque_date": posting_date,
+		"user_remark": f"Balance Sweep Rule {rule.name}",
+	})
+
+	total = base_total = 0.0
+	for row in get_child_balances(rule, posting_date):
+		balance, base_balance = flt(row.balance, 6), flt(row.base_balance, 6)
+		if balance <= 0 or base_balance <= 0 or balance < threshold:
+			continue
+
+		jv.append("accounts", {
+			"account": row.account,
+			"account_currency": row.account_currency,
+			"exchange_rate": base_balance / balance,
+			"credit_in_account_currency": balance,
+			"credit": base_balance,
+			"cost_center": cost_center,
+		})
+		total += balance
+		base_total += base_balance
+
+	if not jv.accounts:
+		return None
+
+	target_currency = resolver.get_account_currency(rule.target_account)
+	if all(row.account_currency == target_currency for row in jv.accounts):
+		target_amount = total
+	else:
+		target_amount = base_total / flt(get_exchange_rate(
+			target_currency, resolver.defaults.default_currency, posting_date
+		) or 1)
+
+	jv.append("accounts", {
+		"account": rule.target_account,
+		"account_currency": target_currency,
+		"exchange_rate": base_total / target_amount if target_amount else 1,
+		"debit_in_account_currency": target_amount,
+		"debit": base_total,
+		"cost_center": cost_center,
+	})
+	jv.set_total_debit_credit()
+	return jv
+
+
+def run_rule(rule, posting_date=None):
+	if isinstance(rule, str):
+		rule = frappe.get_doc("Balance Sweep Rule", rule)
+
+	jv = build_sweep_entry(rule, posting_date)
+	name = None
+	if jv:
+		jv.save()
+		jv.submit()
+		name = jv.name
+
+	rule.db_set({"last_run": now_datetime(), "last_journal_entry": name or rule.last_journal_entry})
+	return name
+
+
+def run_company_rules(company, rules):
+	for name in rules:
+		try:
+			run_rule(name)
+			frappe.db.commit()
+		except Exception as e:
+			# Roll back first, the log would otherwise go down with the failed sweep
+			frappe.db.rollback()
+			frappe.log_error(
+				"Balance Sweep Rule",
+				f"Company: {company}\nRule: {name}\n\n{str(e)}\n\n{frappe.get_traceback()}",
+			)
+
+
+def run_scheduled_rules(schedule):
+	"""Run every enabled rule on `schedule`, one background job per company so companies sweep in parallel."""
+	rules = {}
+	for rule in frappe.get_all(
+		"Balance Sweep Rule",
+		filters={"enabled": 1, "schedule": schedule},
+		fields=["name", "company"],
+		order_by="name",
+	):
+		rules.setdefault(rule.company, []).append(rule.name)
+
+	for company, names in rules.items():
+		frappe.enqueue(
+			"casino_navy.casino_navy.doctype.balance_sweep_rule.balance_sweep_rule.run_company_rules",
+			queue="long",
+			job_id=f"balance_sweep::{company}::{schedule}",
+			deduplicate=True,
+			company=company,
+			rules=names,
+		)
+
+
+def run_hourly_rules():
+	run_scheduled_rules("Hourly")
+
+
+def run_daily_rules():
+	run_scheduled_rules("Daily")
+
+
+def run_weekly_rules():
+	run_scheduled_rules("Weekly")
+
+
+def run_monthly_rules():
+	run_scheduled_rules("Monthly")
@@ -5,6 +5,7 @@ import frappe
 from frappe.utils import flt
 from frappe.model.document import Document
 from casino_navy.utils import get_exchange_rate
+from casino_navy.casino_navy.doctype.transaction_ledger.account_resolver import get_account_resolver
 
 class BalanceTransfer(Document):
 
@@ -149,10 +150,10 @@ class BalanceTransfer(Document):
             jv.delete()
 
     def fetch_accounts_and_rates(self):
-        from_company_currency = frappe.get_value("Company", self.from_company, "default_currency")
-        to_company_currency = frappe.get_value("Company", self.to_company, "default_currency")
+        from_company_currency = get_account_resolver(self.from_company).defaults.default_currency
+        to_company_currency = get_account_resolver(self.to_company).defaults.default_currency
         
-        from_bank_details = self.get_bank_account_details(self.from_bank)
+        from_bank_details = self.get_bank_account_details(self.from_bank, self.from_company)
         self.from_bank_account = from_bank_details.bank_account
         self.from_bank_currency = from_bank_details.account_currency
         self.from_bank_exchange_rate = get_exchange_rate(
@@ -161,7 +162,7 @@ class BalanceTransfer(Document):
             self.date,
         )
 
-        to_bank_details = self.get_bank_account_details(self.to_bank)
+        to_bank_details = self.get_bank_account_details(self.to_bank, self.to_company)
         self.to_bank_account = to_bank_details.bank_account
         self.to_bank_currency = to_bank_details.account_currency
         self.to_bank_exchange_rate = get_exchange_rate(
@@ -209,22 +210,14 @@ class BalanceTransfer(Document):
         )
 
 
-    def get_bank_account_details(self, bank=None):
-        BA = frappe.qb.DocType("Bank Account")
-        A = frappe.qb.DocType("Account")
-        result = frappe.qb.from_(BA).join(A).on(
-            BA.account == A.name
-        ).select(
-            A.name.as_("bank_account"),
-            A.account_currency
-        ).where(
-            (BA.name == bank if bank else self.bank)
-        ).run(as_dict=True)
+    def get_bank_account_details(self, bank=None, company=None):
+        bank = bank or self.bank
+        result = get_account_resolver(company or self.from_company).get_bank(bank)
         
         if not result:
-            frappe.throw(f"Bank Account '{self.bank}' does not have an account")
+            frappe.throw(f"Bank Account '{bank}' does not have an account")
         
-        return result[0]
+        return result
 
     def validate_bank_account(self):
         # let's make sure the fee and the bank account currency are the same
@@ -244,23 +237,9 @@ def get_bank_account(bank):
 
 @frappe.whitelist()
 def get_charge_account_details(company, charge_type):
-    MOPA = frappe.qb.DocType("Mode of Payment Account")
-    CT = frappe.qb.DocType("Charge Type")
-    A = frappe.qb.DocType("Account")
+    result = get_account_resolver(company).get_charge(charge_type)
 
-    result  = frappe.qb.from_(MOPA).join(CT).on(
-        MOPA.parent == CT.name
-    ).join(A).on(
-        MOPA.default_account == A.name
-    ).select(
-        MOPA.default_account,
-        A.account_currency
-    ).where(
-        (MOPA.company == company)&
-        (CT.name == charge_type)
-    ).run(as_dict=True)
-
-    if not result:
+    if not result or not result.default_account:
         frappe.throw(f"Charge Type '{charge_type}' does not have a default account for company '{company}'")
     
-    return result[0]
+    return frappe._dict(default_account=result.default_account, account_currency=result.account_currency)
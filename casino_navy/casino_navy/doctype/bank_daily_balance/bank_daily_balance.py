@@ -0,0 +1,224 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Daily movement and closing balance per (company, account, date) for bank and
+cash accounts.
+
+Rows are maintained incrementally from GL Entry submissions: an entry adds its
+debit/credit to its day and shifts the closing balance of that day and every
+later day. Cancellations need no special handling because ERPNext books them as
+reversing GL Entries. A balance as of any date is then the closing balance of
+the nearest row on or before it. `rebuild` recomputes rows from the GL.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import flt, getdate
+from frappe.model.document import Document
+from casino_navy.casino_navy.doctype.transaction_ledger.account_resolver import get_account_resolver
+
+READY_KEY = "casino_navy_bank_daily_balance_ready"
+
+
+class BankDailyBalance(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique("Bank Daily Balance", ["company", "account", "date"], constraint_name="unique_company_account_date")
+
+
+def get_name(company, account, date):
+	raw = "\x1f".join([company, account, str(getdate(date))])
+	return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def update_from_gl_entry(doc, method=None):
+	"""GL Entry on_submit hook."""
+	if not get_account_resolver(doc.company).is_tracked(doc.account):
+		return
+
+	apply_deltas([doc])
+
+
+def apply_deltas(entries):
+	"""
+	Add the movements of `entries` (GL Entry docs or dicts) to their days.
+	Entries on untracked accounts are ignored; pass negated amounts to remove
+	movements, e.g. when GL Entries are deleted outright.
+	"""
+	deltas = {}
+	for entry in entries:
+		entry = frappe._dict(entry)
+		if not get_account_resolver(entry.company).is_tracked(entry.account):
+			continue
+		delta = deltas.setdefault((entry.company, entry.account, getdate(entry.posting_date)), [0.0, 0.0, 0.0, 0.0])
+		delta[0] += flt(entry.debit)
+		delta[1] += flt(entry.credit)
+		delta[2] += flt(entry.debit_in_account_currency)
+		delta[3] += flt(entry.credit_in_account_currency)
+
+	for (company, account, date), (debit, credit, debit_in_account_currency, credit_in_account_currency) in sorted(deltas.items()):
+		apply_delta(company, account, date, debit, credit, debit_in_account_currency, credit_in_account_currency)
+
+
+def apply_delta(company, account, date, debit, credit, debit_in_account_currency, credit_in_account_currency):
+	balance = debit - credit
+	balance_in_account_currency = debit_in_account_currency - credit_in_account_currency
+
+	# Lock the previous day so concurrent postings on the same account queue up
+	previous = frappe.db.sql(
+		"""
+		SELECT closing_balance, closing_balance_in_account_currency
+		FROM `tabBank Daily Balance`
+		WHERE company = %s AND account = %s AND date < %s
+		ORDER BY date DESC
+		LIMIT 1
+		FOR UPDATE
+		""",
+		(company, account, date),
+	)
+	opening, opening_in_account_currency = previous[0] if previous else (0, 0)
+
+	resolver = get_account_resolver(company)
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabBank Daily Balance` (
+			name, creation, modified, owner, modified_by, docstatus,
+			company, account, date, account_currency, company_currency,
+			debit, credit, closing_balance,
+			debit_in_account_currency, credit_in_account_currency, closing_balance_in_account_currency
+		)
+		VALUES (
+			%(name)s, NOW(6), NOW(6), %(user)s, %(user)s, 0,
+			%(company)s, %(account)s, %(date)s, %(account_currency)s, %(company_currency)s,
+			%(debit)s, %(credit)s, %(opening)s + %(balance)s,
+			%(debit_in_account_currency)s, %(credit_in_account_currency)s,
+			%(opening_in_account_currency)s + %(balance_in_account_currency)s
+		)
+		ON DUPLICATE KEY UPDATE
+			modified = NOW(6),
+			debit = debit + %(debit)s,
+			credit = credit + %(credit)s,
+			closing_balance = closing_balance + %(balance)s,
+			debit_in_account_currency = debit_in_account_currency + %(debit_in_account_currency)s,
+			credit_in_account_currency = credit_in_account_currency + %(credit_in_account_currency)s,
+			closing_balance_in_account_currency = closing_balance_in_account_currency + %(balance_in_account_currency)s
+		""",
+		{
+			"name": get_name(company, account, date),
+			"user": frappe.session.user,
+			"company": company,
+			"account": account,
+			"date": date,
+			"account_currency": resolver.get_account_currency(account),
+			"company_currency": resolver.defaults.default_currency,
+			"debit": debit,
+			"credit": credit,
+			"balance": balance,
+			"opening": flt(opening),
+			"debit_in_account_currency": debit_in_account_currency,
+			"credit_in_account_currency": credit_in_account_currency,
+			"balance_in_account_currency": balance_in_account_currency,
+			"opening_in_account_currency": flt(opening_in_account_currency),
+		},
+	)
+
+	frappe.db.sql(
+		"""
+		UPDATE `tabBank Daily Balance`
+		SET closing_balance = closing_balance + %s,
+			closing_balance_in_account_currency = closing_balance_in_account_currency + %s
+		WHERE company = %s AND account = %s AND date > %s
+		""",
+		(balance, balance_in_account_currency, company, account, date),
+	)
+
+
+def is_ready():
+	"""True once a full rebuild has run, i.e. the snapshot covers the whole GL."""
+	return bool(frappe.db.get_default(READY_KEY))
+
+
+def get_balance_as_of(company, account, date, in_account_currency=True):
+	"""Closing balance of `account` at the end of `date`, or None if the snapshot cannot answer."""
+	if not is_ready() or not get_account_resolver(company).is_tracked(account):
+		return None
+
+	field = "closing_balance_in_account_currency" if in_account_currency else "closing_balance"
+	result = frappe.db.sql(
+		f"""
+		SELECT {field}
+		FROM `tabBank Daily Balance`
+		WHERE company = %s AND account = %s AND date <= %s
+		ORDER BY date DESC
+		LIMIT 1
+		""",
+		(company, account, getdate(date)),
+	)
+	return flt(result[0][0]) if result else 0.0
+
+
+def rebuild(company=None, account=None):
+	"""
+	Recompute Bank Daily Balance rows from the GL for every tracked account,
+	or only those of `company` / `account`.
+
+		bench --site <site> execute \\
+			casino_navy.casino_navy.doctype.bank_daily_balance.bank_daily_balance.rebuild
+	"""
+	full_rebuild = not company and not account
+	companies = [company] if company else frappe.get_all("Company", pluck="name")
+	for name in companies:
+		resolver = get_account_resolver(name)
+		for tracked in [account] if account else sorted(resolver.tracked_accounts):
+			if resolver.is_tracked(tracked):
+				rebuild_account(name, tracked)
+			frappe.db.commit()
+
+	if full_rebuild:
+		frappe.db.set_default(READY_KEY, 1)
+		frappe.db.commit()
+
+
+def rebuild_account(company, account):
+	frappe.db.delete("Bank Daily Balance", {"company": company, "account": account})
+
+	resolver = get_account_resolver(company)
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabBank Daily Balance` (
+			name, creation, modified, owner, modified_by, docstatus,
+			company, account, date, account_currency, company_currency,
+			debit, credit, closing_balance,
+			debit_in_account_currency, credit_in_account_currency, closing_balance_in_account_currency
+		)
+		SELECT
+			LEFT(SHA1(CONCAT_WS(CHAR(31), company, account, posting_date)), 20), NOW(6), NOW(6), %(user)s, %(user)s, 0,
+			company, account, posting_date, %(account_currency)s, %(company_currency)s,
+			debit, credit, SUM(debit - credit) OVER w,
+			debit_in_account_currency, credit_in_account_currency,
+			SUM(debit_in_account_currency - credit_in_account_currency) OVER w
+		FROM (
+			SELECT
+				company, account, posting_date,
+				SUM(debit) AS debit,
+				SUM(credit) AS credit,
+				SUM(debit_in_account_currency) AS debit_in_account_currency,
+				SUM(credit_in_account_currency) AS credit_in_account_currency
+			FROM `tabGL Entry`
+			WHERE company = %(company)s AND account = %(account)s AND is_cancelled = 0
+			GROUP BY company, account, posting_date
+		) daily
+		WINDOW w AS (ORDER BY posting_date ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+		""",
+		{
+			"user": frappe.session.user,
+			"company": company,
+			"account": account,
+			"account_currency": resolver.get_account_currency(account),
+			"company_currency": resolver.defaults.default_currency,
+		},
+	)
@@ -0,0 +1,301 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Debit/credit per (company, account, month, account currency), for reports
+that would otherwise aggregate the raw GL on every run.
+
+Rows are maintained incrementally from GL Entry submissions, cancellations
+arriving as reversing GL Entries. The upsert does not run inside the posting
+transaction: the month rows are shared by every posting to the same account,
+so holding their locks until commit would serialize (or deadlock) concurrent
+imports. Movements are queued and applied in one short transaction after
+the posting commits, skipping those a savepoint rolled back. Anything that
+changes the GL behind those hooks (reposts, direct deletes, a failed flush) is
+caught by the daily `reconcile`, which recomputes every month whose GL Entries
+changed since its last run. `rebuild` recomputes everything.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import add_months, flt, get_last_day, getdate, now_datetime, today
+from frappe.model.document import Document
+from casino_navy.casino_navy.doctype.transaction_ledger.account_resolver import get_account_resolver
+
+READY_KEY = "casino_navy_gl_monthly_rollup_ready"
+RECONCILED_KEY = "casino_navy_gl_monthly_rollup_reconciled_at"
+MONTH_OF = "DATE_SUB(gle.posting_date, INTERVAL DAYOFMONTH(gle.posting_date) - 1 DAY)"
+PENDING_ATTR = "casino_navy_gl_rollup_pending"
+FLUSH_ATTEMPTS = 3
+
+
+class GLMonthlyRollup(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"GL Monthly Rollup",
+		["company", "account", "month", "account_currency"],
+		constraint_name="unique_company_account_month_currency",
+	)
+
+
+def get_month(date):
+	return getdate(date).replace(day=1)
+
+
+def get_name(company, account, month, account_currency):
+	raw = "\x1f".join([company, account, str(get_month(month)), account_currency or ""])
+	return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def update_from_gl_entry(doc, method=None):
+	"""GL Entry on_submit hook."""
+	queue_deltas([doc])
+
+
+def queue_deltas(entries, key_field="name"):
+	"""
+	Queue the movements of `entries` (GL Entry docs or dicts) for after commit.
+	`key_field` ("name" or "voucher_no") is checked against the GL at flush
+	time, so movements rolled back to a savepoint are dropped.
+	"""
+	pending = getattr(frappe.local, PENDING_ATTR, None)
+	if pending is None:
+		pending = {}
+		setattr(frappe.local, PENDING_ATTR, pending)
+		frappe.db.after_commit.add(flush_pending)
+		frappe.db.after_rollback.add(clear_pending)
+
+	for entry in entries:
+		entry = frappe._dict(entry)
+		pending.setdefault(key_field, []).append(frappe._dict({
+			"key": entry.get(key_field),
+			"company": entry.company,
+			"account": entry.account,
+			"posting_date": entry.posting_date,
+			"account_currency": entry.account_currency,
+			"debit": entry.debit,
+			"credit": entry.credit,
+			"debit_in_account_currency": entry.debit_in_account_currency,
+			"credit_in_account_currency": entry.credit_in_account_currency,
+		}))
+
+
+def clear_pending():
+	setattr(frappe.local, PENDING_ATTR, None)
+
+
+def flush_pending():
+	"""after_commit callback: apply the queued movements whose GL Entries were committed."""
+	pending = getattr(frappe.local, PENDING_ATTR, None)
+	clear_pending()
+	if not pending:
+		return
+
+	for attempt in range(1, FLUSH_ATTEMPTS + 1):
+		try:
+			entries = []
+			for key_field, rows in pending.items():
+				committed = get_committed_keys(key_field, {row.key for row in rows})
+				entries.extend(row for row in rows if row.key in committed)
+			apply_deltas(entries)
+			frappe.db.commit()
+			return
+		except Exception as e:
+			frappe.db.rollback()
+			if frappe.db.is_deadlocked(e) and attempt < FLUSH_ATTEMPTS:
+				continue
+			# The daily reconcile recomputes these months
+			frappe.log_error("GL Monthly Rollup", f"{str(e)}\n\n{frappe.get_traceback()}")
+			return
+
+
+def get_committed_keys(key_field, keys):
+	committed = set()
+	keys = sorted(key for key in keys if key)
+	for start in range(0, len(keys), 1000):
+		committed.update(frappe.db.sql_list(
+			f"""
+			SELECT DISTINCT `{key_field}`
+			FROM `tabGL Entry`
+			WHERE `{key_field}` IN %s
+			""",
+			(tuple(keys[start:start + 1000]),),
+		))
+	return committed
+
+
+def apply_deltas(entries):
+	"""
+	Add the movements of `entries` (GL Entry docs or dicts) to their months in
+	one statement. Pass negated amounts to remove movements, e.g. when GL
+	Entries are deleted outright.
+	"""
+	deltas = {}
+	for entry in entries:
+		entry = frappe._dict(entry)
+		key = (entry.company, entry.account, get_month(entry.posting_date), entry.account_currency or "")
+		delta = deltas.setdefault(key, [0.0, 0.0, 0.0, 0.0])
+		delta[0] += flt(entry.debit)
+		delta[1] += flt(entry.credit)
+		delta[2] += flt(entry.debit_in_account_currency)
+		delta[3] += flt(entry.credit_in_account_currency)
+
+	if not deltas:
+		return
+
+	values, params = [], []
+	user = frappe.session.user
+	for (company, account, month, account_currency), amounts in sorted(deltas.items()):
+		values.append("(%s, NOW(6), NOW(6), %s, %s, 0, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+		params.extend([
+			get_name(company, account, month, account_currency), user, user,
+			company, account, month, account_currency,
+			get_account_resolver(company).defaults.default_currency,
+			*amounts,
+		])
+
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabGL Monthly Rollup` (
+			name, creation, modified, owner, modified_by, docstatus,
+			company, account, month, account_currency, company_currency,
+			debit, credit, debit_in_account_currency, credit_in_account_currency
+		)
+		VALUES {", ".join(values)}
+		ON DUPLICATE KEY UPDATE
+			modified = NOW(6),
+			debit = debit + VALUES(debit),
+			credit = credit + VALUES(credit),
+			debit_in_account_currency = debit_in_account_currency + VALUES(debit_in_account_currency),
+			credit_in_account_currency = credit_in_account_currency + VALUES(credit_in_account_currency)
+		""",
+		params,
+	)
+
+
+def is_ready():
+	"""True once a full rebuild has run, i.e. the roll-up covers the whole GL."""
+	return bool(frappe.db.get_default(READY_KEY))
+
+
+def get_open_month():
+	"""First day of the current month; earlier months are closed and read from the roll-up."""
+	return get_month(today())
+
+
+def rebuild(company=None):
+	"""
+	Recompute GL Monthly Rollup rows from the GL, for every company or only `company`.
+
+		bench --site <site> execute \\
+			casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup.rebuild
+	"""
+	started = now_datetime()
+	for name in [company] if company else frappe.get_all("Company", pluck="name"):
+		first, last = frappe.db.sql(
+			"SELECT MIN(posting_date), MAX(posting_date) FROM `tabGL Entry` WHERE company = %s",
+			name,
+		)[0]
+		frappe.db.delete("GL Monthly Rollup", {"company": name})
+		if not first:
+			frappe.db.commit()
+			continue
+
+		# One year per statement keeps each transaction small
+		month = get_month(first)
+		while month <= getdate(last):
+			rebuild_months(name, month, add_months(month, 11))
+			frappe.db.commit()
+			month = add_months(month, 12)
+
+	if not company:
+		frappe.db.set_default(READY_KEY, 1)
+		frappe.db.set_default(RECONCILED_KEY, str(started))
+		frappe.db.commit()
+
+
+def rebuild_months(company, from_month, to_month):
+	"""Recompute the rows of `company` for the months from `from_month` to `to_month`."""
+	from_month, to_month = get_month(from_month), get_month(to_month)
+	frappe.db.sql(
+		"""
+		DELETE FROM `tabGL Monthly Rollup`
+		WHERE company = %s AND month >= %s AND month <= %s
+		""",
+		(company, from_month, to_month),
+	)
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabGL Monthly Rollup` (
+			name, creation, modified, owner, modified_by, docstatus,
+			company, account, month, account_currency, company_currency,
+			debit, credit, debit_in_account_currency, credit_in_account_currency
+		)
+		SELECT
+			LEFT(SHA1(CONCAT_WS(CHAR(31), company, account, month, account_currency)), 20),
+			NOW(6), NOW(6), %(user)s, %(user)s, 0,
+			company, account, month, account_currency, %(company_currency)s,
+			debit, credit, debit_in_account_currency, credit_in_account_currency
+		FROM (
+			SELECT
+				gle.company,
+				gle.account,
+				{MONTH_OF} AS month,
+				IFNULL(gle.account_currency, '') AS account_currency,
+				SUM(gle.debit) AS debit,
+				SUM(gle.credit) AS credit,
+				SUM(gle.debit_in_account_currency) AS debit_in_account_currency,
+				SUM(gle.credit_in_account_currency) AS credit_in_account_currency
+			FROM `tabGL Entry` gle
+			WHERE gle.company = %(company)s
+				AND gle.is_cancelled = 0
+				AND gle.posting_date >= %(from_date)s
+				AND gle.posting_date <= %(to_date)s
+			GROUP BY gle.company, gle.account, month, IFNULL(gle.account_currency, '')
+		) monthly
+		""",
+		{
+			"user": frappe.session.user,
+			"company": company,
+			"company_currency": get_account_resolver(company).defaults.default_currency,
+			"from_date": from_month,
+			"to_date": get_last_day(to_month),
+		},
+	)
+
+
+def reconcile():
+	"""
+	Daily scheduler job: recompute the months of every GL Entry created,
+	cancelled or reposted since the last run, plus the open month.
+	"""
+	if not is_ready():
+		return
+
+	started = now_datetime()
+	since = frappe.db.get_default(RECONCILED_KEY)
+
+	months = {(company, get_open_month()) for company in frappe.get_all("Company", pluck="name")}
+	if since:
+		months.update(
+			(company, getdate(month))
+			for company, month in frappe.db.sql(
+				f"""
+				SELECT DISTINCT gle.company, {MONTH_OF}
+				FROM `tabGL Entry` gle
+				WHERE gle.modified >= %s
+				""",
+				since,
+			)
+		)
+
+	for company, month in sorted(months):
+		rebuild_months(company, month, month)
+		frappe.db.commit()
+
+	frappe.db.set_default(RECONCILED_KEY, str(started))
+	frappe.db.commit()
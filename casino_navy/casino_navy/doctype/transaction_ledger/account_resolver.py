@@ -0,0 +1,163 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Per-company lookup tables for Transaction Ledger / Balance Transfer postings.
+
+One resolver loads, for a company, every Bank Account with its GL account,
+currency and reserve settings, every Charge Type with its type and the
+company's default account/currency, the company defaults used when
+posting, and the bank/cash accounts whose balances Bank Daily Balance keeps. Resolvers live in Redis (shared by all workers) and in `frappe.local`
+(per request or background job), and are dropped whenever a Bank Account,
+Charge Type, Mode of Payment, Account or Company is saved.
+"""
+
+import frappe
+
+CACHE_KEY = "casino_navy:account_resolver"
+TRACKED_ACCOUNT_TYPES = ("Bank", "Cash")
+
+
+class AccountResolver:
+	def __init__(self, company, data=None):
+		self.company = company
+		data = data or self.load(company)
+		self.defaults = data["defaults"]
+		self.banks = data["banks"]
+		self.charges = data["charges"]
+		self.account_currencies = data["account_currencies"]
+		self.tracked_accounts = set(data["tracked_accounts"])
+
+	@staticmethod
+	def load(company):
+		BA = frappe.qb.DocType("Bank Account")
+		A = frappe.qb.DocType("Account")
+		CT = frappe.qb.DocType("Charge Type")
+		MOPA = frappe.qb.DocType("Mode of Payment Account")
+
+		defaults = frappe.db.get_value(
+			"Company",
+			company,
+			["default_currency", "cost_center", "exchange_gain_loss_account", "transaction_posting_mode"],
+			as_dict=True,
+		) or frappe._dict()
+
+		banks = {}
+		for row in frappe.qb.from_(BA).join(A).on(
+			BA.account == A.name
+		).select(
+			BA.name,
+			BA.company,
+			A.name.as_("bank_account"),
+			A.account_currency,
+			BA.custom_collect_reserves,
+			BA.custom_reserves_rate,
+			BA.custom_reserves_account
+		).where(
+			(BA.company == company)
+		).run(as_dict=True):
+			banks[row.pop("name")] = row
+
+		charges = {}
+		for row in frappe.qb.from_(CT).left_join(MOPA).on(
+			(MOPA.parent == CT.name)&
+			(MOPA.parenttype == "Charge Type")&
+			(MOPA.company == company)
+		).left_join(A).on(
+			MOPA.default_account == A.name
+		).select(
+			CT.name,
+			CT.type,
+			MOPA.default_account,
+			A.account_currency
+		).run(as_dict=True):
+			# Keep the first account found for the company, like the old per-row lookup did
+			if row.name not in charges or not charges[row.name].default_account:
+				charges[row.pop("name")] = row
+
+		account_currencies = {}
+		tracked_accounts = {bank.bank_account for bank in banks.values()}
+		for name, account_currency, account_type in frappe.get_all(
+			"Account",
+			filters={"company": company, "is_group": 0},
+			fields=["name", "account_currency", "account_type"],
+			as_list=True,
+		):
+			account_currencies[name] = account_currency
+			if account_type in TRACKED_ACCOUNT_TYPES:
+				tracked_accounts.add(name)
+
+		return {
+			"defaults": defaults,
+			"banks": banks,
+			"charges": charges,
+			"account_currencies": account_currencies,
+			"tracked_accounts": sorted(tracked_accounts),
+		}
+
+	def get_bank(self, bank):
+		"""Bank Account details; falls back to a direct lookup for banks of other companies."""
+		if bank in self.banks:
+			return self.banks[bank]
+
+		BA = frappe.qb.DocType("Bank Account")
+		A = frappe.qb.DocType("Account")
+		result = frappe.qb.from_(BA).join(A).on(
+			BA.account == A.name
+		).select(
+			BA.company,
+			A.name.as_("bank_account"),
+			A.account_currency,
+			BA.custom_collect_reserves,
+			BA.custom_reserves_rate,
+			BA.custom_reserves_account
+		).where(
+			(BA.name == bank)
+		).run(as_dict=True)
+
+		return result[0] if result else None
+
+	def get_charge(self, charge_type):
+		"""Charge Type `type`, plus the company's default account and its currency (or None)."""
+		return self.charges.get(charge_type)
+
+	def is_tracked(self, account):
+		"""Whether `account` is a bank/cash account kept in Bank Daily Balance."""
+		return account in self.tracked_accounts
+
+	def get_account_currency(self, account):
+		if account in self.account_currencies:
+			return self.account_currencies[account]
+		return frappe.get_cached_value("Account", account, "account_currency")
+
+
+def get_account_resolver(company):
+	"""Return the resolver for `company`, shared across the current request or job."""
+	resolvers = getattr(frappe.local, "casino_navy_account_resolvers", None)
+	if resolvers is None:
+		resolvers = frappe.local.casino_navy_account_resolvers = {}
+	if company in resolvers:
+		return resolvers[company]
+
+	data = frappe.cache().hget(CACHE_KEY, company)
+	if data is not None and "tracked_accounts" not in data:
+		# Cached before tracked accounts were added
+		data = None
+	resolver = AccountResolver(company, data)
+	if data is None:
+		frappe.cache().hset(CACHE_KEY, company, {
+			"defaults": resolver.defaults,
+			"banks": resolver.banks,
+			"charges": resolver.charges,
+			"account_currencies": resolver.account_currencies,
+			"tracked_accounts": sorted(resolver.tracked_accounts),
+		})
+
+	resolvers[company] = resolver
+	return resolver
+
+
+def clear_account_resolver_cache(doc=None, method=None):
+	"""doc_events hook: drop every cached resolver after a relevant master changes."""
+	frappe.cache().delete_key(CACHE_KEY)
+	frappe.local.casino_navy_account_resolvers = {}
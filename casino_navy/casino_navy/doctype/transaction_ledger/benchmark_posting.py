@@ -0,0 +1,62 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Compare the Journal Entry posting path with the Direct GL poster.
+
+	bench --site <site> execute \
+		casino_navy.casino_navy.doctype.transaction_ledger.benchmark_posting.run \
+		--kwargs "{'count': 10000}"
+
+Both paths post `count` copies of an existing submitted Transaction Ledger
+inside a savepoint that is rolled back afterwards, so nothing is kept.
+"""
+
+import time
+
+import frappe
+from casino_navy.casino_navy.doctype.transaction_ledger.gl_poster import post_direct
+
+SAVEPOINT = "benchmark_posting"
+
+
+def run(count=10000, ledger=None, batch_size=500):
+	"""Return seconds taken and ledgers/second for each posting path."""
+	count, batch_size = int(count), int(batch_size)
+	template = get_template(ledger)
+	ledgers = [frappe.get_doc(template.as_dict()) for _ in range(count)]
+
+	results = {
+		"journal_entry": timed(lambda: [doc.make_entry() for doc in ledgers]),
+		"direct_gl": timed(lambda: [post_direct([doc]) for doc in ledgers]),
+		"direct_gl_batched": timed(lambda: [
+			post_direct(ledgers[start:start + batch_size])
+			for start in range(0, count, batch_size)
+		]),
+	}
+	for result in results.values():
+		result["per_second"] = round(count / result["seconds"], 1) if result["seconds"] else None
+
+	print(f"{count} ledgers based on {template.name}")
+	for path, result in results.items():
+		print(f"{path:<20}{result['seconds']:>10.2f}s{result['per_second']:>12}/s")
+	return results
+
+
+def get_template(ledger=None):
+	name = ledger or frappe.db.get_value(
+		"Transaction Ledger", {"docstatus": 1}, "name", order_by="creation desc"
+	)
+	if not name:
+		frappe.throw("A submitted Transaction Ledger is needed as the benchmark template")
+	return frappe.get_doc("Transaction Ledger", name)
+
+
+def timed(fn):
+	frappe.db.savepoint(SAVEPOINT)
+	start = time.perf_counter()
+	try:
+		fn()
+		return {"seconds": round(time.perf_counter() - start, 3)}
+	finally:
+		frappe.db.rollback(save_point=SAVEPOINT)
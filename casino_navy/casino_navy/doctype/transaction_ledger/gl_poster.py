@@ -0,0 +1,167 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Direct GL posting for Transaction Ledger.
+
+Companies whose `transaction_posting_mode` is "Direct GL" skip ERPNext's
+Journal Entry save/submit pipeline. The legs from `get_entry_legs()` already
+carry resolved accounts and rates, so the poster only settles the exchange
+difference, checks the entry balances and writes the Journal Entry (kept for
+audit and for cancellation through the standard JE cancel), its accounts and
+the GL Entries with one multi-row insert per table.
+"""
+
+import frappe
+from frappe.utils import flt, now
+from frappe.model.naming import make_autoname
+from erpnext.accounts.utils import get_fiscal_year
+from casino_navy.casino_navy.doctype.bank_daily_balance.bank_daily_balance import apply_deltas
+from casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup import queue_deltas as queue_rollup_deltas
+from casino_navy.balance_cache import invalidate_accounts
+from casino_navy.reporting.result_cache import invalidate_companies
+
+POSTING_MODE_DIRECT_GL = "Direct GL"
+
+
+def post_direct(ledgers):
+	"""Post `ledgers` (submitted Transaction Ledger docs) and return their Journal Entry names."""
+	from casino_navy.casino_navy.doctype.transaction_ledger.transaction_ledger import settle_exchange_difference
+
+	entries, accounts, gl_entries = [], [], []
+	timestamp = now()
+	fiscal_years = {}
+
+	for ledger in ledgers:
+		jv = frappe.new_doc("Journal Entry")
+		jv.update({
+			"company": ledger.company,
+			"voucher_type": "Bank Entry",
+			"posting_date": ledger.date,
+			"cheque_no": f"Transaction Ledger {ledger.name}",
+			"reference_type": ledger.doctype,
+			"reference_name": ledger.name,
+			"custom_transaction_type": ledger.transaction_type,
+			"cheque_date": ledger.date,
+			"multi_currency": 1,
+		})
+		for leg in ledger.get_entry_legs():
+			jv.append("accounts", leg)
+
+		jv.set_total_debit_credit()
+		settle_exchange_difference(jv)
+		jv.set_total_debit_credit()
+		validate_balanced(jv, ledger)
+
+		key = (ledger.company, str(ledger.date))
+		if key not in fiscal_years:
+			fiscal_years[key] = get_fiscal_year(ledger.date, company=ledger.company)[0]
+
+		jv.naming_series = jv.naming_series or frappe.get_meta("Journal Entry").get_field("naming_series").options.split("\n")[0]
+		jv.name = make_autoname(jv.naming_series, "Journal Entry", jv)
+		jv.title = jv.title or jv.accounts[0].account
+		jv.docstatus = 1
+		jv.owner = jv.modified_by = frappe.session.user
+		jv.creation = jv.modified = timestamp
+		jv.set_parent_in_children()
+		for idx, row in enumerate(jv.accounts, start=1):
+			row.update({
+				"name": frappe.generate_hash(length=10),
+				"idx": idx,
+				"docstatus": 1,
+				"owner": jv.owner,
+				"modified_by": jv.owner,
+				"creation": timestamp,
+				"modified": timestamp,
+			})
+
+		entries.append(jv)
+		accounts.extend(jv.accounts)
+		gl_entries.extend(build_gl_entries(jv, fiscal_years[key], timestamp))
+
+	bulk_insert_docs("Journal Entry", entries)
+	bulk_insert_docs("Journal Entry Account", accounts)
+	bulk_insert_rows("GL Entry", gl_entries)
+	# Bulk inserts skip the GL Entry on_submit hook
+	apply_deltas(gl_entries)
+	# GL Entry names may be autoincrement and unknown here; the new vouchers
+	# tell the roll-up whether the entries were committed
+	queue_rollup_deltas(gl_entries, key_field="voucher_no")
+	invalidate_accounts([row["account"] for row in gl_entries])
+	invalidate_companies([row["company"] for row in gl_entries])
+
+	return [jv.name for jv in entries]
+
+
+def validate_balanced(jv, ledger):
+	"""Fail closed: never write an entry whose base debits and credits differ."""
+	precision = jv.precision("total_debit") or 2
+	debit = flt(sum(flt(row.debit) for row in jv.accounts), precision)
+	credit = flt(sum(flt(row.credit) for row in jv.accounts), precision)
+	if debit != credit:
+		frappe.throw(
+			f"Transaction Ledger '{ledger.name}' does not balance: debit {debit} != credit {credit}"
+		)
+	for row in jv.accounts:
+		if flt(row.debit) and flt(row.credit):
+			frappe.throw(f"Transaction Ledger '{ledger.name}' debits and credits '{row.account}' in one row")
+
+
+def build_gl_entries(jv, fiscal_year, timestamp):
+	debit_accounts = sorted({row.account for row in jv.accounts if flt(row.debit) > 0})
+	credit_accounts = sorted({row.account for row in jv.accounts if flt(row.credit) > 0})
+	rows = []
+	for row in jv.accounts:
+		if not flt(row.debit) and not flt(row.credit):
+			continue
+		against = credit_accounts if flt(row.debit) > 0 else debit_accounts
+		rows.append({
+			"posting_date": jv.posting_date,
+			"transaction_date": jv.posting_date,
+			"account": row.account,
+			"account_currency": row.account_currency,
+			"cost_center": row.cost_center,
+			"debit": flt(row.debit),
+			"credit": flt(row.credit),
+			"debit_in_account_currency": flt(row.debit_in_account_currency),
+			"credit_in_account_currency": flt(row.credit_in_account_currency),
+			"against": ", ".join(against),
+			"voucher_type": "Journal Entry",
+			"voucher_no": jv.name,
+			"voucher_detail_no": row.name,
+			"remarks": jv.cheque_no,
+			"is_opening": "No",
+			"is_advance": "No",
+			"fiscal_year": fiscal_year,
+			"company": jv.company,
+			"is_cancelled": 0,
+			"docstatus": 1,
+			"owner": jv.owner,
+			"modified_by": jv.owner,
+			"creation": timestamp,
+			"modified": timestamp,
+		})
+	return rows
+
+
+def bulk_insert_docs(doctype, docs):
+	bulk_insert_rows(doctype, [doc.get_valid_dict(convert_dates_to_str=True) for doc in docs])
+
+
+def bulk_insert_rows(doctype, rows):
+	if not rows:
+		return
+
+	if frappe.get_meta(doctype).autoname == "autoincrement":
+		for row in rows:
+			row.pop("name", None)
+	else:
+		for row in rows:
+			row.setdefault("name", frappe.generate_hash(length=10))
+
+	fields = sorted({field for row in rows for field in row})
+	frappe.db.bulk_insert(
+		doctype,
+		fields=fields,
+		values=[[row.get(field) for field in fields] for row in rows],
+	)
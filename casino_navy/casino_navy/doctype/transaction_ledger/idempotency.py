@@ -0,0 +1,154 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Idempotency layer for Transaction Ledger ingestion.
+
+Every submitted ledger that carries a `transaction_id` (or, failing that, a
+`third_party_reference`) stores a hash of (company, bank, reference) in the
+unique `idempotency_key` column. Drafts never hold the key, so a ledger that
+failed to submit cannot be replayed as if it had been posted. A Redis bloom filter sits in front of that
+index so the common "never seen" case is answered without touching the
+database; a "maybe seen" answer falls back to a point lookup on the index.
+"""
+
+import hashlib
+
+import frappe
+
+BLOOM_KEY = "casino_navy:transaction_ledger_idempotency_bloom"
+BLOOM_READY_KEY = "casino_navy:transaction_ledger_idempotency_bloom_ready"
+BLOOM_BITS = 1 << 24  # 2 MiB bitmap, ~1% false positives at 1.7M keys
+BLOOM_HASHES = 7
+REBUILD_CHUNK_SIZE = 5000
+
+
+def get_idempotency_key(company, bank, transaction_id=None, third_party_reference=None):
+	"""Return the idempotency key for a transaction or None when it carries no reference."""
+	if transaction_id:
+		reference = f"tid:{transaction_id}"
+	elif third_party_reference:
+		reference = f"ref:{third_party_reference}"
+	else:
+		return None
+
+	raw = "\x1f".join([company or "", bank or "", reference])
+	return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def get_idempotency_key_for(data):
+	return get_idempotency_key(
+		data.get("company"),
+		data.get("bank"),
+		data.get("transaction_id"),
+		data.get("third_party_reference"),
+	)
+
+
+def find_existing(key, use_bloom=True):
+	"""
+	Return the Transaction Ledger name that owns `key`, or None. Pass
+	`use_bloom=False` after a UniqueValidationError: the bloom filter can miss
+	keys (a ledger submitted by a concurrent request, an evicted bitmap).
+	"""
+	if not key:
+		return None
+	return find_existing_many([key], use_bloom=use_bloom).get(key)
+
+
+def find_existing_many(keys, use_bloom=True):
+	"""Return {key: ledger name} for every key in `keys` that is already taken."""
+	keys = [key for key in set(keys) if key]
+	if not keys:
+		return {}
+
+	if use_bloom and _bloom_ready():
+		keys = [key for key, maybe in zip(keys, _bloom_contains(keys)) if maybe]
+		if not keys:
+			return {}
+
+	TL = frappe.qb.DocType("Transaction Ledger")
+	existing = {}
+	for start in range(0, len(keys), REBUILD_CHUNK_SIZE):
+		chunk = keys[start:start + REBUILD_CHUNK_SIZE]
+		for row in (
+			frappe.qb.from_(TL)
+			.select(TL.name, TL.idempotency_key)
+			.where(TL.idempotency_key.isin(chunk) & (TL.docstatus == 1))
+			.run(as_dict=True)
+		):
+			existing[row.idempotency_key] = row.name
+
+	return existing
+
+
+def remember(key):
+	"""Record `key` in the bloom filter once its ledger has been submitted."""
+	if not key:
+		return
+	pipe = frappe.cache().pipeline()
+	bloom_key = frappe.cache().make_key(BLOOM_KEY)
+	for offset in _bloom_offsets(key):
+		pipe.setbit(bloom_key, offset, 1)
+	pipe.execute()
+
+
+def rebuild_bloom_filter():
+	"""
+	Rebuild the bloom filter from the `idempotency_key` index.
+	Run after restoring a backup or from `bench execute`.
+	"""
+	cache = frappe.cache()
+	cache.delete(cache.make_key(BLOOM_READY_KEY))
+	cache.delete(cache.make_key(BLOOM_KEY))
+
+	bloom_key = cache.make_key(BLOOM_KEY)
+	last_name = 0
+	while True:
+		rows = frappe.db.sql(
+			"""
+			SELECT name, idempotency_key
+			FROM `tabTransaction Ledger`
+			WHERE idempotency_key IS NOT NULL AND name > %s
+			ORDER BY name
+			LIMIT %s
+			""",
+			(last_name, REBUILD_CHUNK_SIZE),
+			as_dict=True,
+		)
+		if not rows:
+			break
+
+		pipe = cache.pipeline()
+		for row in rows:
+			for offset in _bloom_offsets(row.idempotency_key):
+				pipe.setbit(bloom_key, offset, 1)
+		pipe.execute()
+		last_name = rows[-1].name
+
+	cache.set(cache.make_key(BLOOM_READY_KEY), 1)
+
+
+def _bloom_ready():
+	return bool(frappe.cache().get(frappe.cache().make_key(BLOOM_READY_KEY)))
+
+
+def _bloom_contains(keys):
+	pipe = frappe.cache().pipeline()
+	bloom_key = frappe.cache().make_key(BLOOM_KEY)
+	for key in keys:
+		for offset in _bloom_offsets(key):
+			pipe.getbit(bloom_key, offset)
+	bits = pipe.execute()
+
+	return [
+		all(bits[idx * BLOOM_HASHES:(idx + 1) * BLOOM_HASHES])
+		for idx in range(len(keys))
+	]
+
+
+def _bloom_offsets(key):
+	digest = hashlib.sha256(key.encode("utf-8")).digest()
+	h1 = int.from_bytes(digest[:8], "big")
+	h2 = int.from_bytes(digest[8:16], "big") | 1
+	return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
@@ -0,0 +1,175 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+"""
+Daily roll-up posting for Transaction Ledger.
+
+Companies whose `transaction_posting_mode` is "Daily Roll-up" leave ledgers
+unposted at submit. A nightly job books one Journal Entry per (bank, charge
+type, fee type, transaction type, date, bank currency) out of the summed legs
+of every ledger in the group and stamps the ledgers with it. Cancelling a
+rolled-up ledger books an incremental reversal of just that ledger's legs.
+"""
+
+import frappe
+from frappe.utils import add_days, flt, getdate, today
+from casino_navy.casino_navy.doctype.transaction_ledger.account_resolver import get_account_resolver
+
+POSTING_MODE_PER_TRANSACTION = "Per Transaction"
+POSTING_MODE_ROLLUP = "Daily Roll-up"
+
+GROUP_FIELDS = ("bank", "charge_type", "fee_type", "transaction_type", "date", "bank_currency")
+
+
+def get_posting_mode(company):
+	return get_account_resolver(company).defaults.transaction_posting_mode or POSTING_MODE_PER_TRANSACTION
+
+
+def post_daily_rollups():
+	"""Scheduler: roll up every closed day for companies in Daily Roll-up mode."""
+	companies = frappe.get_all(
+		"Company",
+		filters={"transaction_posting_mode": POSTING_MODE_ROLLUP},
+		pluck="name",
+	)
+	for company in companies:
+		post_company_rollups(company)
+
+
+def post_company_rollups(company, up_to=None):
+	"""Post roll-up entries for every unposted ledger of `company` dated up to `up_to` (default: yesterday)."""
+	up_to = getdate(up_to or add_days(today(), -1))
+
+	ledgers = frappe.get_all(
+		"Transaction Ledger",
+		filters={
+			"company": company,
+			"docstatus": 1,
+			"rollup_entry": ["is", "not set"],
+			"date": ["<=", up_to],
+		},
+		fields=["*"],
+		order_by="date asc, name asc",
+	)
+
+	groups = {}
+	for ledger in ledgers:
+		groups.setdefault(tuple(ledger.get(f) for f in GROUP_FIELDS), []).append(ledger)
+
+	posted = []
+	for key, rows in groups.items():
+		try:
+			posted.append(post_rollup(company, dict(zip(GROUP_FIELDS, key)), rows))
+			frappe.db.commit()
+		except Exception as e:
+			frappe.db.rollback()
+			frappe.log_error(
+				"Transaction Ledger Roll-up",
+				f"Company: {company}\nGroup: {key}\n\n{str(e)}\n\n{frappe.get_traceback()}",
+			)
+	return posted
+
+
+def post_rollup(company, group, rows):
+	"""Book one Journal Entry for `rows` (ledger dicts sharing `group`) and link them to it."""
+	legs = []
+	for row in rows:
+		ledger = frappe.get_doc({**row, "doctype": "Transaction Ledger"})
+		legs.extend(ledger.get_entry_legs())
+
+	jv = frappe.new_doc("Journal Entry")
+	jv.update({
+		"company": company,
+		"voucher_type": "Bank Entry",
+		"posting_date": group["date"],
+		"cheque_no": f"Transaction Ledger Roll-up {group['bank']} {group['date']}",
+		"cheque_date": group["date"],
+		"custom_transaction_type": group["transaction_type"],
+		"multi_currency": 1,
+		"user_remark": f"Daily roll-up of {len(rows)} Transaction Ledger(s) for {group['charge_type']}"
+			+ (f" / {group['fee_type']}" if group["fee_type"] else ""),
+	})
+	for leg in merge_legs(legs):
+		jv.append("accounts", leg)
+
+	submit_entry(jv)
+
+	TL = frappe.qb.DocType("Transaction Ledger")
+	frappe.qb.update(TL).set(
+		TL.rollup_entry, jv.name
+	).where(
+		TL.name.isin([row.name for row in rows])
+	).run()
+
+	return jv.name
+
+
+def reverse_rollup_entry(ledger):
+	"""Book the reversal of a single rolled-up ledger's legs and record it on the ledger."""
+	jv = frappe.new_doc("Journal Entry")
+	jv.update({
+		"company": ledger.company,
+		"voucher_type": "Bank Entry",
+		"posting_date": ledger.date,
+		"cheque_no": f"Transaction Ledger Reversal {ledger.name}",
+		"cheque_date": ledger.date,
+		"custom_transaction_type": ledger.transaction_type,
+		"multi_currency": 1,
+		"user_remark": f"Reverses Transaction Ledger {ledger.name} from roll-up {ledger.rollup_entry}",
+	})
+	for leg in merge_legs(swap_sides(leg) for leg in ledger.get_entry_legs()):
+		jv.append("accounts", leg)
+
+	submit_entry(jv)
+	ledger.db_set("rollup_reversal_entry", jv.name)
+	return jv.name
+
+
+def merge_legs(legs):
+	"""
+	Sum legs per (account, currency, bank account, cost center) and net them into a
+	single debit or credit row, since an entry cannot debit and credit one account.
+	"""
+	merged = {}
+	for leg in legs:
+		key = (leg["account"], leg.get("account_currency"), leg.get("bank_account"), leg.get("cost_center"))
+		acc = merged.setdefault(key, [0.0, 0.0])
+		acc[0] += flt(leg.get("debit_in_account_currency")) - flt(leg.get("credit_in_account_currency"))
+		acc[1] += flt(leg.get("debit")) - flt(leg.get("credit"))
+
+	out = []
+	for (account, account_currency, bank_account, cost_center), (amount, base_amount) in merged.items():
+		amount, base_amount = flt(amount, 6), flt(base_amount, 6)
+		if not amount and not base_amount:
+			continue
+		side = "debit" if (amount or base_amount) > 0 else "credit"
+		row = {
+			"account": account,
+			"account_currency": account_currency,
+			"exchange_rate": abs(base_amount / amount) if amount else 1.0,
+			f"{side}_in_account_currency": abs(amount),
+			side: abs(base_amount),
+			"cost_center": cost_center,
+		}
+		if bank_account:
+			row["bank_account"] = bank_account
+		out.append(row)
+	return out
+
+
+def swap_sides(leg):
+	leg = dict(leg)
+	leg["debit_in_account_currency"], leg["credit_in_account_currency"] = (
+		leg.pop("credit_in_account_currency", 0), leg.pop("debit_in_account_currency", 0)
+	)
+	leg["debit"], leg["credit"] = leg.pop("credit", 0), leg.pop("debit", 0)
+	return leg
+
+
+def submit_entry(jv):
+	from casino_navy.casino_navy.doctype.transaction_ledger.transaction_ledger import settle_exchange_difference
+
+	jv.set_total_debit_credit()
+	settle_exchange_difference(jv)
+	jv.save()
+	jv.submit()
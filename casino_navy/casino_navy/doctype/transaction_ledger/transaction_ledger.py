@@ -5,18 +5,38 @@ import frappe
 from frappe.utils import flt
 from frappe.model.document import Document
 from casino_navy.utils import get_exchange_rate
+from casino_navy.casino_navy.doctype.transaction_ledger import idempotency
+from casino_navy.casino_navy.doctype.transaction_ledger.account_resolver import get_account_resolver
+from casino_navy.casino_navy.doctype.transaction_ledger.rollup import (
+	POSTING_MODE_ROLLUP,
+	get_posting_mode,
+	reverse_rollup_entry,
+)
+from casino_navy.casino_navy.doctype.transaction_ledger.gl_poster import POSTING_MODE_DIRECT_GL, post_direct
 
 class TransactionLedger(Document):
 	def validate(self):
 		self.fetch_accounts()
 		self.validate_bank_account()
 		self.validate_types()	
+		self.set_idempotency_key()
 
 	def on_submit(self):
-		self.make_entry()
+		posting_mode = get_posting_mode(self.company)
+		# In Daily Roll-up mode the nightly job posts the entry
+		if posting_mode == POSTING_MODE_DIRECT_GL:
+			post_direct([self])
+		elif posting_mode != POSTING_MODE_ROLLUP:
+			self.make_entry()
+		idempotency.remember(self.idempotency_key)
 	
 	def on_cancel(self):
-		self.cancel_entry()
+		if self.rollup_entry:
+			reverse_rollup_entry(self)
+		else:
+			self.cancel_entry()
+		# Release the key so an amendment can reuse the same reference
+		self.db_set("idempotency_key", None)
 	
 	def on_trash(self):
 		self.delete_entry()
@@ -35,7 +55,33 @@ class TransactionLedger(Document):
 			"multi_currency": 1,
 		})
 
-		company = frappe.get_doc("Company", self.company)
+		for leg in self.get_entry_legs():
+			jv.append("accounts", leg)
+
+		try: 
+			jv.set_total_debit_credit()
+			print(f"Account|Debit|Debit in Account Currency|Credit|Credit in Account Currency")
+			for account in jv.accounts:
+				print(f"{account.account}|{account.debit or 0.00}|{account.debit_in_account_currency or 0.00}|{account.credit or 0.00}|{account.credit_in_account_currency or 0.00}")
+			print(f"Total Debit: \t\t\t\t{jv.total_debit}\t\t\t\tTotal Credit: {jv.total_credit}")
+			
+			settle_exchange_difference(jv)
+			jv.save()
+			jv.submit()
+			return jv.name
+		except Exception as e:
+			content = f"Journal Entry: {jv.as_json()}\n\n{str(e)}\n\n{frappe.get_traceback()}"
+			print(content)
+			frappe.log_error("Transaction Ledger", content)   
+
+	def get_entry_legs(self):
+		"""
+		Journal Entry Account rows for this ledger, before any exchange
+		difference is settled. Shared by the per-transaction entry and the
+		daily roll-up, which sums legs across ledgers.
+		"""
+		legs = []
+		company = get_account_resolver(self.company).defaults
 		
 		default_cost_center = company.cost_center
 		default_currency = company.default_currency
@@ -76,7 +122,7 @@ class TransactionLedger(Document):
 				)
 				base_reserve_amount = flt(reserve_amount * bank_exchange_rate, 6)
 
-				row = jv.append("accounts", {
+				legs.append({
 					"account": bank_details.bank_account,
 					"account_currency": bank_details.account_currency,
 					"exchange_rate": bank_exchange_rate,
@@ -86,7 +132,7 @@ class TransactionLedger(Document):
 					"cost_center": default_cost_center,
 				})
 
-				row = jv.append("accounts", {
+				legs.append({
 					"account": bank_details.custom_reserves_account,
 					"account_currency": bank_details.account_currency,
 					"exchange_rate": bank_exchange_rate,
@@ -97,7 +143,7 @@ class TransactionLedger(Document):
 
 
 			else:
-				row = jv.append("accounts", {
+				legs.append({
 					"account": bank_details.bank_account,
 					"account_currency": bank_details.account_currency,
 					"exchange_rate": bank_exchange_rate,
@@ -110,7 +156,7 @@ class TransactionLedger(Document):
 			if self.fee:
 	
 				base_fee_amount = flt(self.fee * fee_exchange_rate, 6)
-				row = jv.append("accounts", {
+				legs.append({
 					"account": self.fee_account,
 					"account_currency": self.fee_currency,
 					"exchange_rate": fee_exchange_rate,
@@ -119,7 +165,7 @@ class TransactionLedger(Document):
 					"cost_center": default_cost_center,
 				})
 
-			row = jv.append("accounts", {
+			legs.append({
 				"account": self.charge_account,
 				"account_currency": self.charge_currency,
 				"exchange_rate": charge_exchange_rate,
@@ -133,7 +179,7 @@ class TransactionLedger(Document):
 			fee_amount = abs(flt(self.fee, 6))
 			base_fee_amount = .00
 			
-			row = jv.append("accounts", {
+			legs.append({
 				"account": bank_details.bank_account,
 				"account_currency": bank_details.account_currency,
 				"exchange_rate": bank_exchange_rate,
@@ -145,7 +191,7 @@ class TransactionLedger(Document):
 
 			if self.fee:
 				base_fee_amount = flt(self.fee * fee_exchange_rate, 6)
-				row = jv.append("accounts", {
+				legs.append({
 					"account": self.fee_account,
 					"account_currency": self.fee_currency,
 					"exchange_rate": fee_exchange_rate,
@@ -154,7 +200,7 @@ class TransactionLedger(Document):
 					"cost_center": default_cost_center,
 				})
 
-			row = jv.append("accounts", {
+			legs.append({
 				"account": self.charge_account,
 				"account_currency": self.charge_currency,
 				"exchange_rate": charge_exchange_rate,
@@ -162,37 +208,8 @@ class TransactionLedger(Document):
 				"debit": base_amount,
 				"cost_center": default_cost_center,
 			})
-			
-		try: 
-			jv.set_total_debit_credit()
-			print(f"Account|Debit|Debit in Account Currency|Credit|Credit in Account Currency")
-			for account in jv.accounts:
-				print(f"{account.account}|{account.debit or 0.00}|{account.debit_in_account_currency or 0.00}|{account.credit or 0.00}|{account.credit_in_account_currency or 0.00}")
-			print(f"Total Debit: \t\t\t\t{jv.total_debit}\t\t\t\tTotal Credit: {jv.total_credit}")
-			
-			if jv.difference:
-				exchange_account = frappe.get_cached_value(
-					"Company", 
-					self.company, 
-					"exchange_gain_loss_account"
-				)
-				if not exchange_account:
-					frappe.throw(f"Company '{self.company}' does not have an Exchange Gain/Loss Account set")
-				jv.append("accounts", {
-					"account": exchange_account,
-					"account_currency": default_currency,
-					"exchange_rate": 1.0,
-					"debit_in_account_currency": jv.difference * -1,
-					"debit": jv.difference * -1,
-					"cost_center": default_cost_center,
-				})
-			jv.save()
-			jv.submit()
-			return jv.name
-		except Exception as e:
-			content = f"Journal Entry: {jv.as_json()}\n\n{str(e)}\n\n{frappe.get_traceback()}"
-			print(content)
-			frappe.log_error("Transaction Ledger", content)   
+
+		return legs
 
 	def cancel_entry(self):
 		filters = {
@@ -214,6 +231,19 @@ class TransactionLedger(Document):
 			jv = frappe.get_doc("Journal Entry", name)
 			jv.delete()
 		
+	def set_idempotency_key(self):
+		# Only a submitted ledger owns its reference; validate runs again on submit
+		if self.docstatus != 1:
+			self.idempotency_key = None
+			return
+
+		self.idempotency_key = idempotency.get_idempotency_key(
+			self.company,
+			self.bank,
+			self.transaction_id,
+			self.third_party_reference,
+		)
+
 	@frappe.whitelist()
 	def fetch_accounts(self):
 		bank_details = self.get_bank_account_details()
@@ -231,36 +261,22 @@ class TransactionLedger(Document):
 		""")
 
 	def get_bank_account_details(self):
-		BA = frappe.qb.DocType("Bank Account")
-		A = frappe.qb.DocType("Account")
-		
-		result = frappe.qb.from_(BA).join(A).on(
-			BA.account == A.name
-		).select(
-			A.name.as_("bank_account"),
-			A.account_currency,
-			BA.custom_collect_reserves,
-			BA.custom_reserves_rate,
-			BA.custom_reserves_account
-		).where(
-			(BA.name == self.bank)
-		).run(as_dict=True)
+		result = get_account_resolver(self.company).get_bank(self.bank)
 		
 		if not result:
 			frappe.throw(f"Bank Account '{self.bank}' does not have an account")
 		
-		return result[0]
+		return result
 
 	def validate_bank_account(self):
-		bank_account_company = frappe.get_value("Bank Account", self.bank, "company")
-		if bank_account_company != self.company:
+		bank_details = self.get_bank_account_details()
+		if bank_details.company != self.company:
 			frappe.throw(f"Bank Account '{self.bank}' does not belong to Company '{self.company}'")
 		
 		# let's make sure the fee and the bank account currency are the same
 		if self.fee and self.fee > 0:
-			bank_details = self.get_bank_account_details()
 			bank_currency = bank_details.account_currency
-			account_currency = frappe.get_value("Account", self.fee_account, "account_currency")
+			account_currency = get_account_resolver(self.company).get_account_currency(self.fee_account)
 			if account_currency != bank_currency:
 				frappe.throw(f"Fee currency '{account_currency}' does not match bank account currency '{bank_currency}'")
 		
@@ -268,22 +284,19 @@ class TransactionLedger(Document):
 		if not self.charge_type:
 			return
 
-		charge  = frappe.get_doc("Charge Type", self.charge_type)
+		resolver = get_account_resolver(self.company)
+		charge = resolver.get_charge(self.charge_type) or frappe._dict()
 		if self.transaction_type == "Deposit" and charge.type != "Income":
 			frappe.throw(f"Charge Type '{self.charge_type}' is not an income type")
 		elif self.transaction_type == "Withdraw" and charge.type != "Expense":
 			frappe.throw(f"Charge Type '{self.charge_type}' is not an expense type")
 		
 		if self.fee_type:
-			fee_type = frappe.get_value("Charge Type", self.fee_type, "type")
+			fee_type = (resolver.get_charge(self.fee_type) or frappe._dict()).type
 			if fee_type != "Fee":
 				frappe.throw(f"Charge Type '{self.fee_type}' is not a fee type")
 			
 	def get_charge_details(self, charge_type):
-		MOPA = frappe.qb.DocType("Mode of Payment Account")
-		CT = frappe.qb.DocType("Charge Type")
-		A = frappe.qb.DocType("Account")
-
 		charge = ''
 		
 		if charge_type == "charge":
@@ -294,25 +307,37 @@ class TransactionLedger(Document):
 		if not charge:
 			return
 
-		result  = frappe.qb.from_(MOPA).join(CT).on(
-			MOPA.parent == CT.name
-		).join(A).on(
-			MOPA.default_account == A.name
-		).select(
-			MOPA.default_account,
-			A.account_currency
-		).where(
-			(MOPA.company == self.company)&
-			(CT.name == charge)
-		).run(as_dict=True)
+		result = get_account_resolver(self.company).get_charge(charge)
 
-		if not result:
+		if not result or not result.default_account:
 			frappe.throw(f"Charge Type '{charge}' does not have a default account")
 		
 		if charge_type == "charge":
-			self.charge_account = result[0].default_account
-			self.charge_currency = result[0].account_currency
+			self.charge_account = result.default_account
+			self.charge_currency = result.account_currency
 		
 		if charge_type == "fee":
-			self.fee_account = result[0].default_account
-			self.fee_currency = result[0].account_currency
+			self.fee_account = result.default_account
+			self.fee_currency = result.account_currency
+
+
+def settle_exchange_difference(jv):
+	"""
+	Book the base-currency difference left on `jv` (totals already set) on the
+	company's Exchange Gain/Loss Account.
+	"""
+	if not jv.difference:
+		return
+
+	company = get_account_resolver(jv.company).defaults
+	if not company.exchange_gain_loss_account:
+		frappe.throw(f"Company '{jv.company}' does not have an Exchange Gain/Loss Account set")
+
+	jv.append("accounts", {
+		"account": company.exchange_gain_loss_account,
+		"account_currency": company.default_currency,
+		"exchange_rate": 1.0,
+		"debit_in_account_currency": jv.difference * -1,
+		"debit": jv.difference * -1,
+		"cost_center": company.cost_center,
+	})
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Lewin Villar and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Transaction Ledger Queue', {
+	// refresh(frm) {
+
+	// }
+});
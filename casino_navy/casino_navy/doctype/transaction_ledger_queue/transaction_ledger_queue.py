@@ -0,0 +1,172 @@
+# Copyright (c) 2026, Lewin Villar and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+from frappe.model.document import Document
+from casino_navy.casino_navy.doctype.transaction_ledger import idempotency
+
+MAX_ATTEMPTS = 3
+WORKERS_PER_COMPANY = 2
+CLAIM_SIZE = 100
+STALE_AFTER_MINUTES = 30
+RETRY_AFTER_MINUTES = 5
+
+class TransactionLedgerQueue(Document):
+	pass
+
+
+def enqueue_transaction(transaction_data):
+	"""
+	Stage a validated payload and return its ticket.
+	A replay of a payload that is already staged returns the original ticket.
+	"""
+	key = idempotency.get_idempotency_key_for(transaction_data)
+	if key and (ticket := frappe.db.get_value(
+		"Transaction Ledger Queue",
+		{"idempotency_key": key, "status": ["!=", "Dead Letter"]},
+		"name",
+	)):
+		return ticket
+
+	entry = frappe.get_doc({
+		"doctype": "Transaction Ledger Queue",
+		"company": transaction_data.get("company"),
+		"status": "Queued",
+		"idempotency_key": key,
+		"payload": frappe.as_json(transaction_data),
+	})
+	entry.insert(ignore_permissions=True)
+
+	start_workers(entry.company)
+	return entry.name
+
+
+def start_workers(company):
+	"""Start up to WORKERS_PER_COMPANY drain jobs for a company; running slots are skipped."""
+	for slot in range(WORKERS_PER_COMPANY):
+		frappe.enqueue(
+			"casino_navy.casino_navy.doctype.transaction_ledger_queue.transaction_ledger_queue.drain_queue",
+			queue="long",
+			job_id=f"transaction_ledger_queue::{company}::{slot}",
+			deduplicate=True,
+			enqueue_after_commit=True,
+			company=company,
+		)
+
+
+def drain_queue(company):
+	"""Claim and process queued rows for `company` until none are left."""
+	while names := claim_entries(company):
+		for name in names:
+			process_entry(name)
+
+
+def claim_entries(company, limit=CLAIM_SIZE):
+	names = frappe.db.sql(
+		"""
+		SELECT name
+		FROM `tabTransaction Ledger Queue`
+		WHERE company = %s
+			AND (status = 'Queued' OR (status = 'Failed' AND modified < %s))
+		ORDER BY creation
+		LIMIT %s
+		FOR UPDATE SKIP LOCKED
+		""",
+		(company, add_to_date(now_datetime(), minutes=-RETRY_AFTER_MINUTES), limit),
+		pluck=True,
+	)
+	if names:
+		TLQ = frappe.qb.DocType("Transaction Ledger Queue")
+		frappe.qb.update(TLQ).set(
+			TLQ.status, "Processing"
+		).set(
+			TLQ.modified, now_datetime()
+		).where(
+			TLQ.name.isin(names)
+		).run()
+	frappe.db.commit()
+	return names
+
+
+def process_entry(name):
+	from casino_navy.api import build_transaction
+
+	entry = frappe.get_doc("Transaction Ledger Queue", name)
+	transaction_data = frappe.parse_json(entry.payload)
+
+	frappe.db.savepoint("transaction_ledger_queue")
+	try:
+		ledger = idempotency.find_existing(entry.idempotency_key)
+		if not ledger:
+			transaction = build_transaction(transaction_data)
+			transaction.save(ignore_permissions=True)
+			transaction.submit()
+			ledger = transaction.name
+		entry.update({"status": "Completed", "transaction_ledger": ledger, "error": None})
+	except frappe.UniqueValidationError:
+		frappe.db.rollback(save_point="transaction_ledger_queue")
+		ledger = idempotency.find_existing(entry.idempotency_key, use_bloom=False)
+		entry.update({"status": "Completed", "transaction_ledger": ledger, "error": None})
+	except Exception as e:
+		frappe.db.rollback(save_point="transaction_ledger_queue")
+		attempts = (entry.attempts or 0) + 1
+		entry.update({
+			"attempts": attempts,
+			"status": "Dead Letter" if attempts >= MAX_ATTEMPTS else "Failed",
+			"error": f"{str(e)}\n{frappe.get_traceback()}",
+		})
+
+	frappe.clear_messages()
+	entry.processed_on = entry.modified = now_datetime()
+	entry.db_update()
+	frappe.db.commit()
+
+
+def requeue_stale_entries():
+	"""Scheduler: hand rows left in Processing by a dead worker back to the queue and restart idle drains."""
+	TLQ = frappe.qb.DocType("Transaction Ledger Queue")
+	frappe.qb.update(TLQ).set(
+		TLQ.status, "Queued"
+	).where(
+		(TLQ.status == "Processing")&
+		(TLQ.modified < add_to_date(now_datetime(), minutes=-STALE_AFTER_MINUTES))
+	).run()
+	frappe.db.commit()
+
+	companies = frappe.get_all(
+		"Transaction Ledger Queue",
+		filters={"status": ["in", ["Queued", "Failed"]]},
+		pluck="company",
+		distinct=True,
+	)
+	for company in companies:
+		start_workers(company)
+
+
+@frappe.whitelist()
+def requeue_dead_letters(names=None, company=None):
+	"""Send Dead Letter rows back to the queue with a fresh attempt budget."""
+	frappe.only_for(("System Manager", "Accounts Manager"))
+
+	filters = {"status": "Dead Letter"}
+	if names:
+		filters["name"] = ["in", frappe.parse_json(names)]
+	if company:
+		filters["company"] = company
+
+	entries = frappe.get_all("Transaction Ledger Queue", filters=filters, fields=["name", "company"])
+	TLQ = frappe.qb.DocType("Transaction Ledger Queue")
+	for entry in entries:
+		frappe.qb.update(TLQ).set(
+			TLQ.status, "Queued"
+		).set(
+			TLQ.attempts, 0
+		).where(
+			TLQ.name == entry.name
+		).run()
+
+	for company in {entry.company for entry in entries}:
+		start_workers(company)
+
+	return len(entries)
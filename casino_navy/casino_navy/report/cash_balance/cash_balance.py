@@ -1,26 +1,28 @@
 # Copyright (c) 2025, Lewin Villar and contributors
 # For license information, please see license.txt
 
-import calendar
 import json
-from datetime import date, timedelta
-from dateutil.relativedelta import relativedelta
 
 import frappe
 from frappe import _
 from frappe.utils import cint
 from functools import lru_cache
 from frappe.utils.nestedset import get_descendants_of
-from casino_navy.casino_navy.doctype.accountant_mapper.accountant_mapper import (
-    _load_sections_from_mapper,
-    _resolve_sections_leafs,
-)
+from casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper import get_compiled_mapper
+from casino_navy.reporting.result_cache import cached_execute
+from casino_navy.reporting.engine import get_opening_balances, get_period_matrix
+from casino_navy.reporting.periods import build_periods
+from casino_navy.reporting.series import PeriodSeries
 
 # ---- Configure the GROUP accounts here (exact account names) ----
 REPORT_NAME = "Cash Balance"
 
 
 def execute(filters=None):
+    return cached_execute(REPORT_NAME, _execute, filters)
+
+
+def _execute(filters):
     filters = filters or {}
     company = filters.get("company")
     fiscal_year = filters.get("fiscal_year")
@@ -31,12 +33,11 @@ def execute(filters=None):
 
     currency = _get_company_currency(company)
     fy_start, fy_end = _get_fiscal_year_dates(fiscal_year)
-    periods = _build_month_periods(fy_start, fy_end)
-    n = len(periods)
+    periods = build_periods(fy_start, fy_end, filters.get("periodicity"))
 
     # Load sections from Accountant Mapper
-    sections = _load_sections_from_mapper(REPORT_NAME, company)
-    resolved = _resolve_sections_leafs(company, sections)
+    mapper = get_compiled_mapper(REPORT_NAME, company)
+    resolved = mapper.sections
 
     section_labels = list(resolved.keys())
 
@@ -46,24 +47,16 @@ def execute(filters=None):
         return _build_columns(periods), [], None, None
 
     # Opening and monthly movements
-    day_before = fy_start - timedelta(days=1)
-    opening = _get_opening_balances(company, day_before, allowed_leafs)
-    monthly_mov = _get_monthly_movements(company, fy_start, fy_end, allowed_leafs)
+    opening = get_opening_balances([company], allowed_leafs, fy_start, roots=mapper.roots)
+    monthly_mov = get_period_matrix(
+        [company], allowed_leafs, periods, roots=mapper.roots, from_date=fy_start, to_date=fy_end
+    )
 
     # Monthly balances per account (cumulative)
-    account_balances = {}
-    for acc in allowed_leafs:
-        start_bal = float(opening.get(acc, 0.0))
-        series = []
-        running = start_bal
-        for p in periods:
-            mov = float((monthly_mov.get(acc, {}) or {}).get(p["key"], 0.0))
-            running += mov
-            series.append(running)
-        account_balances[acc] = series
+    account_balances = PeriodSeries.from_matrix(monthly_mov).cumsum(opening)
 
     columns = _build_columns(periods)
-    rows = []
+    row_fields = dict(currency=currency, year_start=fy_start, year_end=fy_end)
 
     # Drill-down view for a selected account/group (kept as-is; no subtotals)
     if selected_account:
@@ -75,102 +68,71 @@ def execute(filters=None):
             target_leafs = [selected_account]
 
         if target_leafs:
-            header_series = [0.0] * n
-            for acc in sorted(target_leafs):
-                series = account_balances.get(acc, [0.0] * n)
-                for i in range(n):
-                    header_series[i] += series[i]
-
-            rows.append(_make_row_payload(
-                account="",  # keep header non-clickable
-                display_label=selected_account,
-                periods=periods,
-                values=header_series,
-                currency=currency,
-                year_start=fy_start,
-                year_end=fy_end,
-                bold=1
-            ))
-
-            for acc in sorted(target_leafs):
-                series = account_balances.get(acc, [0.0] * n)
-                rows.append(_make_row_payload(
-                    account=acc,
-                    display_label=_get_account_meta(acc)["account_name"] or acc,
-                    periods=periods,
-                    values=series,
-                    currency=currency,
-                    year_start=fy_start,
-                    year_end=fy_end,
-                    parent_account=_get_account_meta(acc)["parent_account"],
-                    account_type=_get_account_meta(acc)["account_type"],
-                    bold=0
-                ))
-
+            target_leafs = sorted(target_leafs)
+            header = account_balances.rollup({selected_account: {acc: 1 for acc in target_leafs}})
+
+            rows = [header.to_row(
+                selected_account,
+                periods,
+                **_row_fields(
+                    account="",  # keep header non-clickable
+                    display_label=selected_account,
+                    bold=1,
+                    **row_fields,
+                ),
+            )]
+            rows.extend(account_balances.rows(target_leafs, periods, lambda acc: _row_fields(
+                account=acc,
+                display_label=_get_account_meta(acc)["account_name"] or acc,
+                parent_account=_get_account_meta(acc)["parent_account"],
+                account_type=_get_account_meta(acc)["account_type"],
+                **row_fields,
+            )))
             return columns, rows, None, None
         # else fall through
 
     # SUMMARY MODE → groups only + CHART (rows clickable to GL via group account)
     if summary:
-        group_series = {}
-        for label in section_labels:
-            info = resolved[label]
+        group_series = account_balances.rollup({
+            label: {acc: info["signs"].get(acc, 1) for acc in info["leafs"]}
+            for label, info in resolved.items()
+        })
 
+        def section_fields(label):
             # find a real group account to link
             group_account = _resolve_group_account_for_section(
-                company, label, sorted(info["leafs"])
+                company, label, sorted(resolved[label]["leafs"])
             )
             meta = _get_account_meta(group_account) if group_account else {"account_name": None, "parent_account": None, "account_type": None}
 
-            # roll-up series
-            header_series = [0.0] * n
-            for acc in sorted(info["leafs"]):
-                sign = info["signs"].get(acc, 1)
-                series = account_balances.get(acc, [0.0] * n)
-                for i in range(n):
-                    header_series[i] += sign * series[i]
-
-            group_series[label] = header_series
-
             # IMPORTANT: set account=group_account to make it clickable;
             # keep display_label = mapper label so UI shows your section name
-            rows.append(_make_row_payload(
+            return _row_fields(
                 account=group_account or "",          # clickable if resolved
                 display_label=label,                  # show your section label
-                periods=periods,
-                values=header_series,
-                currency=currency,
-                year_start=fy_start,
-                year_end=fy_end,
                 parent_account=meta.get("parent_account"),
                 account_type=meta.get("account_type"),
-                bold=1
-            ))
+                bold=1,
+                **row_fields,
+            )
 
+        rows = list(group_series.rows(section_labels, periods, section_fields))
         chart = _build_summary_chart(periods, currency, group_series, section_labels)
         return columns, rows, None, chart
 
     # DETAIL MODE → leaf accounts only, no chart
+    rows = []
     for label in section_labels:
         info = resolved[label]
-        for acc in sorted(info["leafs"]):
-            meta = _get_account_meta(acc)
-            sign = info["signs"].get(acc, 1)
-            series = account_balances.get(acc, [0.0] * n)
-            signed = [sign * v for v in series]
-
-            rows.append(_make_row_payload(
-                account=acc,                                # real account → clickable
-                display_label=meta["account_name"] or acc,
-                periods=periods,
-                values=signed,
-                currency=currency,
-                year_start=fy_start,
-                year_end=fy_end,
-                parent_account=meta["parent_account"],
-                account_type=meta["account_type"],
-                bold=0
-            ))
+        leafs = sorted(info["leafs"])
+        signed = account_balances.signed(info["signs"])
+        rows.extend(signed.rows(leafs, periods, lambda acc: _row_fields(
+            account=acc,                                # real account → clickable
+            display_label=_get_account_meta(acc)["account_name"] or acc,
+            parent_account=_get_account_meta(acc)["parent_account"],
+            account_type=_get_account_meta(acc)["account_type"],
+            **row_fields,
+        )))
     return columns, rows, None, None
 
 
@@ -200,19 +162,6 @@ def _get_fiscal_year_dates(fiscal_year_name: str):
     return doc.year_start_date, doc.year_end_date
 
 
-def _build_month_periods(start_date: date, end_date: date):
-    periods = []
-    cur = date(start_date.year, start_date.month, 1)
-    last = date(end_date.year, end_date.month, 1)
-    while cur <= last:
-        last_day = calendar.monthrange(cur.year, cur.month)[1]
-        label = f"{cur.strftime('%b')} {str(cur.year)[-2:]}"
-        key = cur.strftime("%Y-%m")
-        periods.append({"key": key, "label": label, "from": cur, "to": date(cur.year, cur.month, last_day)})
-        cur = (cur + relativedelta(months=1)).replace(day=1)
-    return periods
-
-
 def _build_columns(periods):
     cols = [
         # clickable like financial statements
@@ -265,56 +214,9 @@ def _is_group_account(account_name: str) -> bool:
         return False
 
 
-def _get_opening_balances(company: str, as_of_date: date, accounts: list[str]):
-    if not accounts:
-        return {}
-    placeholders = ", ".join(["%s"] * len(accounts))
-    sql = f"""
-        SELECT gle.account, SUM(gle.debit - gle.credit) AS bal
-        FROM `tabGL Entry` gle
-        WHERE gle.company = %s
-          AND gle.is_cancelled = 0
-          AND gle.posting_date <= %s
-          AND gle.account IN ({placeholders})
-          AND gle.posting_date >= '2025-06-01'
-        GROUP BY gle.account
-    """
-    params = [company, as_of_date] + accounts
-    rows = frappe.db.sql(sql, params, as_dict=True)
-    return {r["account"]: float(r.get("bal") or 0.0) for r in rows}
-
-
-def _get_monthly_movements(company: str, from_date: date, to_date: date, accounts: list[str]):
-    if not accounts:
-        return {}
-    placeholders = ", ".join(["%s"] * len(accounts))
-    sql = f"""
-        SELECT
-            gle.account,
-            DATE_FORMAT(gle.posting_date, '%%Y-%%m-01') AS period_start,
-            SUM(gle.debit - gle.credit) AS movement
-        FROM `tabGL Entry` gle
-        WHERE gle.company = %s
-          AND gle.is_cancelled = 0
-          AND gle.posting_date BETWEEN %s AND %s
-          AND gle.account IN ({placeholders})
-          
-        GROUP BY gle.account, period_start
-    """
-    params = [company, from_date, to_date] + accounts
-    rows = frappe.db.sql(sql, params, as_dict=True)
-    out = {}
-    for r in rows:
-        acc = r["account"]
-        key = r["period_start"][:7]
-        out.setdefault(acc, {})[key] = float(r.get("movement") or 0.0)
-    return out
-
-
-def _make_row_payload(
+def _row_fields(
     account: str,                 # real Account name, or ""/None for group rows
     display_label: str,           # what to show in the Account column
-    periods, values: list[float],
     currency: str,
     year_start, year_end,
     parent_account: str | None = None,
@@ -332,12 +234,6 @@ def _make_row_payload(
         "to_date": year_end,
         "currency": currency,
     }
-    total = 0.0
-    for i, p in enumerate(periods):
-        v = float(values[i] if i < len(values) else 0)
-        row[p["key"]] = v
-        total += v
-    row["total"] = total
     if bold:
         row["bold"] = 1
     return row
@@ -5,6 +5,7 @@ import frappe
 from frappe import _
 from erpnext import get_company_currency
 from erpnext.accounts.report.utils import convert_to_presentation_currency, get_currency
+from casino_navy.reporting.engine import get_opening_balances
 
 
 def execute(filters=None):
@@ -162,13 +163,7 @@ def get_detailed_data(filters):
 
 
 def get_opening_balance(account, filters):
-	opening = frappe.db.sql("""
-		SELECT SUM(debit - credit)
-		FROM `tabGL Entry`
-		WHERE company = 'X2 - JMS Investment Group N.V' AND account = '13005 - Papara - King - X2' AND posting_date < '2025-05-04'
-	""", {**filters, "account": account})
-
-	return opening[0][0] or 0.0
+	return get_opening_balances([filters["company"]], [account], filters["from_date"]).get(account, 0.0)
 
 def get_chart(data, filters):
 	if not filters.get("summary") or not data:
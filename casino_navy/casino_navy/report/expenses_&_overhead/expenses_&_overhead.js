@@ -26,6 +26,14 @@ frappe.require("assets/erpnext/js/financial_statements.js", function () {
         reqd: 1,
         default: frappe.defaults.get_user_default("fiscal_year"),
       },
+      {
+        fieldname: "periodicity",
+        label: __("Periodicity"),
+        fieldtype: "Select",
+        options: ["Daily", "Weekly", "Monthly", "Quarterly"],
+        default: "Monthly",
+        reqd: 1,
+      },
     ],
 
     formatter(value, row, column, data, default_formatter) {
@@ -5,21 +5,22 @@
 
 import json
 import frappe
-import calendar
-import re
-from frappe import _
-from datetime import date
 from functools import lru_cache
-from dateutil.relativedelta import relativedelta
-from casino_navy.casino_navy.doctype.accountant_mapper.accountant_mapper import (
-    _load_sections_from_mapper,
-    _resolve_sections_leafs,
-)
+from casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper import get_compiled_mapper, merge_mappers
+from casino_navy.casino_navy.doctype.accountant_mapper.formula import FormulaGraph
+from casino_navy.reporting.result_cache import cached_execute
+from casino_navy.reporting.engine import get_period_matrix
+from casino_navy.reporting.periods import build_periods
+from casino_navy.reporting.series import PeriodSeries
 
 REPORT_NAME = "Expenses & Overhead"
 
 
 def execute(filters=None):
+    return cached_execute(REPORT_NAME, _execute, filters)
+
+
+def _execute(filters):
     filters = filters or {}
     fiscal_year = filters.get("fiscal_year")
     companies = filters.get("company")
@@ -36,84 +37,37 @@ def execute(filters=None):
     currency = frappe.db.get_value("Company", first_company, "default_currency") or "USD"
 
     fy_start, fy_end = _get_fiscal_year_dates(fiscal_year)
-    periods = _build_month_periods(fy_start, fy_end)
-    key_index = {p["key"]: idx for idx, p in enumerate(periods)}
+    periods = build_periods(fy_start, fy_end, filters.get("periodicity"))
     n = len(periods)
 
-    section_series = {}
-    all_section_labels = set()
-    all_formulas = {}
-
-    for company in companies:
-        sections = _load_sections_from_mapper(REPORT_NAME, company)
-        resolved = _resolve_sections_leafs(company, sections)
-
-        all_section_labels.update(resolved.keys())
-
-        all_leafs = sorted({
-            leaf
-            for info in resolved.values()
-            for leaf in (info.get("leafs") or [])
-            if leaf
-        })
-
-        if not all_leafs:
-            continue
-
-        month_sums = _get_monthly_debit_credit(company, fy_start, fy_end, all_leafs)
-
-        for label, info in resolved.items():
-            if label not in section_series:
-                section_series[label] = [0.0] * n
-
-            for acc in sorted([a for a in (info.get("leafs") or []) if a]):
-                sign = info["signs"].get(acc, 1)
-
-                for k, sums in (month_sums.get(acc) or {}).items():
-                    if k not in key_index:
-                        continue
-
-                    i = key_index[k]
-                    debit = float(sums.get("debit") or 0)
-                    credit = float(sums.get("credit") or 0)
-                    net = credit - debit
-
-                    section_series[label][i] += sign * net
-
-        for label, info in resolved.items():
-            formulas = info.get("formulas") or []
-            if formulas:
-                all_formulas[label] = formulas
-                all_section_labels.add(label)
-
-    for label, formulas in all_formulas.items():
-        out = [0.0] * n
-
-        for i in range(n):
-            ctx = {k: section_series.get(k, [0] * n)[i] for k in all_section_labels}
-            out[i] = _evaluate_formulas(ctx, formulas)
-
-        section_series[label] = out
+    # Compile every company's mapper once and fetch the GL of all companies
+    # in one pass; account names are unique per company
+    mappers = [get_compiled_mapper(REPORT_NAME, company) for company in companies]
+    month_sums = get_period_matrix(
+        companies,
+        sorted({leaf for mapper in mappers for leaf in mapper.accounts}),
+        periods,
+        roots=sorted({root for mapper in mappers for root in mapper.roots}),
+        from_date=fy_start,
+        to_date=fy_end,
+    )
 
-    data = []
+    membership, all_formulas = merge_mappers(mappers)
+    section_series = PeriodSeries.from_matrix(month_sums, credit_positive=True).rollup(membership)
 
-    for label in sorted(all_section_labels, key=lambda lbl: sort_order_map.get(lbl, 9999)):
-        values = section_series.get(label, [0] * n)
-        total = sum(values)
-        is_formula = label in all_formulas
+    FormulaGraph(all_formulas, strict=False).evaluate(section_series, n)
+    all_section_labels = set(section_series)
 
-        row = {
+    data = list(section_series.rows(
+        sorted(all_section_labels, key=lambda lbl: sort_order_map.get(lbl, 9999)),
+        periods,
+        lambda label: {
             "account": label,
             "account_name": label,
             "currency": currency,
-            "total": total,
-            "bold": 1 if is_formula else 0,
-        }
-
-        for p, v in zip(periods, values):
-            row[p["key"]] = v
-
-        data.append(row)
+            "bold": 1 if label in all_formulas else 0,
+        },
+    ))
 
     columns = _build_columns(periods)
     chart = _build_chart(data, periods, currency)
@@ -121,39 +75,6 @@ def execute(filters=None):
     return columns, data, None, chart
 
 
-def _get_monthly_debit_credit(company, from_date, to_date, accounts):
-    if not accounts:
-        return {}
-    placeholders = ", ".join(["%s"] * len(accounts))
-    sql = f"""
-        SELECT
-            gle.account,
-            DATE_FORMAT(gle.posting_date, '%%Y-%%m-01') AS period_start,
-            SUM(gle.debit)  AS s_debit,
-            SUM(gle.credit) AS s_credit
-        FROM `tabGL Entry` gle
-        WHERE
-            gle.company = %s
-            AND gle.is_cancelled = 0
-            AND gle.posting_date BETWEEN %s AND %s
-            AND gle.account IN ({placeholders})
-            AND gle.posting_date >= '2025-06-01'
-        GROUP BY gle.account, period_start
-    """
-    params = [company, from_date, to_date] + list(accounts)
-    rows = frappe.db.sql(sql, params, as_dict=True)
-
-    out = {}
-    for r in rows:
-        acc = r["account"]
-        key = r["period_start"][:7]
-        out.setdefault(acc, {})[key] = {
-            "debit": float(r["s_debit"] or 0),
-            "credit": float(r["s_credit"] or 0),
-        }
-    return out
-
-
 def _get_global_section_order(report_name):
     result = frappe.db.sql(
         """
@@ -174,36 +95,6 @@ def _get_global_section_order(report_name):
     return order_map
 
 
-def _normalize_label(label: str) -> str:
-    return re.sub(r"\s+", " ", (label or "").strip())
-
-
-def _evaluate_formulas(section_totals_for_period, formulas):
-    normalized = {_normalize_label(k): v for k, v in section_totals_for_period.items()}
-    total = 0.0
-
-    for f in formulas or []:
-        expr = (f.get("formula") or "").strip()
-        if not expr:
-            continue
-
-        safe = expr
-        for lbl, val in normalized.items():
-            safe = re.sub(rf"(?i)\b{re.escape(lbl)}\b", str(val), safe)
-
-        if re.search(r"[^0-9\.\+\-\*\/\(\) ]", safe):
-            continue
-
-        try:
-            val = eval(safe) if safe.strip() else 0.0
-        except Exception:
-            val = 0.0
-
-        total += float(val) * float(f.get("sign", 1))
-
-    return total
-
-
 @lru_cache(maxsize=None)
 def _get_account_meta(account_name: str):
     if not account_name:
@@ -275,21 +166,6 @@ def _get_fiscal_year_dates(fy_name: str):
     return doc.year_start_date, doc.year_end_date
 
 
-def _build_month_periods(start_date: date, end_date: date):
-    periods = []
-    cur = date(start_date.year, start_date.month, 1)
-    last = date(end_date.year, end_date.month, 1)
-    while cur <= last:
-        last_day = calendar.monthrange(cur.year, cur.month)[1]
-        key = cur.strftime("%Y-%m")
-        label = f"{cur.strftime('%b')} {str(cur.year)[-2:]}"
-        periods.append(
-            {"key": key, "label": label, "from": cur, "to": date(cur.year, cur.month, last_day)}
-        )
-        cur = (cur + relativedelta(months=1)).replace(day=1)
-    return periods
-
-
 def _build_columns(periods):
     cols = [
         {
@@ -359,8 +235,7 @@ def get_accounts_for_section(companies, section_label, report_name="Expenses & O
     accounts = set()
 
     for company in companies:
-        sections = _load_sections_from_mapper(report_name, company)
-        resolved = _resolve_sections_leafs(company, sections)
+        resolved = get_compiled_mapper(report_name, company).sections
 
         if section_label in resolved:
             for acc in resolved[section_label]["leafs"]:
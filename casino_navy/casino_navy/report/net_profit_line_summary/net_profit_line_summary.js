@@ -23,6 +23,14 @@ frappe.require("assets/erpnext/js/financial_statements.js", function () {
         default: "2025",
         reqd: 1,
       },
+      {
+        fieldname: "periodicity",
+        label: __("Periodicity"),
+        fieldtype: "Select",
+        options: ["Daily", "Weekly", "Monthly", "Quarterly"],
+        default: "Monthly",
+        reqd: 1,
+      },
     ],
 
     formatter(value, row, column, data, default_formatter) {
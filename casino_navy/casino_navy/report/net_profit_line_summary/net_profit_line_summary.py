@@ -2,23 +2,24 @@
 # Copyright (c) 2025
 # For license information, please see license.txt
 
-import calendar
 import json
-import re
-from datetime import date
-from dateutil.relativedelta import relativedelta
 
 import frappe
 from frappe import _
-from casino_navy.casino_navy.doctype.accountant_mapper.accountant_mapper import (
-    _load_sections_from_mapper,
-    _resolve_sections_leafs,
-)
+from casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper import get_compiled_mapper
+from casino_navy.reporting.result_cache import cached_execute
+from casino_navy.reporting.engine import get_period_matrix
+from casino_navy.reporting.periods import build_periods
+from casino_navy.reporting.series import PeriodSeries
 
 REPORT_NAME = "Net Profit Line Summary"
 
 
 def execute(filters=None):
+    return cached_execute(REPORT_NAME, _execute, filters)
+
+
+def _execute(filters):
     filters = filters or {}
     company = filters.get("company")
     fiscal_year = filters.get("fiscal_year")
@@ -26,16 +27,12 @@ def execute(filters=None):
 
     company_currency = _get_company_currency(company)
     fy_start, fy_end = _get_fiscal_year_dates(fiscal_year)
-    start_limit = date(2025, 6, 1)
-    if fy_start < start_limit:
-        fy_start = start_limit
 
-    periods = _build_month_periods(fy_start, fy_end)
-    p_index = {p["key"]: idx for idx, p in enumerate(periods)}
+    periods = build_periods(fy_start, fy_end, filters.get("periodicity"))
     n = len(periods)
 
-    sections = _load_sections_from_mapper(REPORT_NAME, company)
-    resolved = _resolve_sections_leafs(company, sections)
+    mapper = get_compiled_mapper(REPORT_NAME, company)
+    resolved = mapper.sections
     section_labels = list(resolved.keys())
 
     if not any(lbl.lower().startswith("rev") for lbl in section_labels):
@@ -43,33 +40,20 @@ def execute(filters=None):
     if not any("cost of sales" in lbl.lower() or "cogs" in lbl.lower() for lbl in section_labels):
         frappe.throw(_("Accountant Mapper for this report must have a 'Cost of Sales' section."))
 
-    all_accounts = sorted({leaf for info in resolved.values() for leaf in info["leafs"]})
-    month_dc = _get_monthly_debit_credit(company, fy_start, fy_end, all_accounts)
-
-    section_series = {lbl: [0.0] * n for lbl in section_labels}
-    for label, info in resolved.items():
-        for acc in sorted(info["leafs"]):
-            sign = info["signs"].get(acc, 1)
-            for key, sums in (month_dc.get(acc) or {}).items():
-                i = p_index.get(key)
-                if i is None:
-                    continue
-                debit = float(sums.get("debit") or 0.0)
-                credit = float(sums.get("credit") or 0.0)
-                net = credit - debit
-                section_series[label][i] += sign * net
-
-    for label, info in resolved.items():
-        formulas = info.get("formulas") or []
-        if not formulas:
-            continue
-        out = [0.0] * n
-        for i in range(n):
-            ctx = {k: section_series[k][i] for k in section_series}
-            out[i] = _evaluate_formulas(ctx, formulas)
-        section_series[label] = out
-
-    rows = [_make_row(label, company_currency, periods, section_series[label]) for label in section_labels]
+    matrix = get_period_matrix(
+        [company], mapper.accounts, periods, roots=mapper.roots, from_date=fy_start, to_date=fy_end
+    )
+
+    section_series = PeriodSeries.from_matrix(matrix, credit_positive=True).rollup({
+        label: {acc: info["signs"].get(acc, 1) for acc in info["leafs"]}
+        for label, info in resolved.items()
+    })
+
+    mapper.graph.evaluate(section_series, n)
+
+    rows = list(section_series.rows(
+        section_labels, periods, lambda label: {"account": label, "currency": company_currency}
+    ))
     columns = _build_columns(periods)
     chart = _build_chart(periods, company_currency, section_series, section_labels)
 
@@ -109,21 +93,6 @@ def _get_fiscal_year_dates(fiscal_year_name: str):
     return doc.year_start_date, doc.year_end_date
 
 
-def _build_month_periods(start_date: date, end_date: date):
-    periods = []
-    cur = date(start_date.year, start_date.month, 1)
-    last = date(end_date.year, end_date.month, 1)
-    while cur <= last:
-        last_day = calendar.monthrange(cur.year, cur.month)[1]
-        from_dt = cur
-        to_dt = date(cur.year, cur.month, last_day)
-        label = f"{cur.strftime('%b')} {str(cur.year)[-2:]}"
-        key = cur.strftime("%Y-%m")
-        periods.append({"key": key, "label": label, "from": from_dt, "to": to_dt})
-        cur = (cur + relativedelta(months=1)).replace(day=1)
-    return periods
-
-
 def _build_columns(periods):
     cols = [{"label": _("Account"), "fieldname": "account", "fieldtype": "Data", "width": 260}]
     for p in periods:
@@ -144,69 +113,6 @@ def _build_columns(periods):
     return cols
 
 
-def _get_monthly_debit_credit(company: str, from_date: date, to_date: date, accounts: list[str]):
-    if not accounts:
-        return {}
-
-    placeholders = ", ".join(["%s"] * len(accounts))
-    sql = f"""
-        SELECT
-            gle.account,
-            DATE_FORMAT(gle.posting_date, '%%Y-%%m-01') AS period_start,
-            SUM(gle.debit)  AS debit,
-            SUM(gle.credit) AS credit
-        FROM `tabGL Entry` gle
-        WHERE
-            gle.company = %s
-            AND gle.is_cancelled = 0
-            AND gle.posting_date BETWEEN %s AND %s
-            AND gle.account IN ({placeholders})
-        GROUP BY gle.account, period_start
-    """
-    params = [company, from_date, to_date] + accounts
-    rows = frappe.db.sql(sql, params, as_dict=True)
-
-    out = {}
-    for r in rows:
-        acc = r["account"]
-        key = r["period_start"][:7]
-        out.setdefault(acc, {})[key] = {
-            "debit": float(r.get("debit") or 0),
-            "credit": float(r.get("credit") or 0),
-        }
-    return out
-
-
-def _make_row(label: str, currency: str, periods, values: list[float]):
-    row = {"account": label, "currency": currency}
-    total = 0.0
-    for i, p in enumerate(periods):
-        val = float(values[i] if i < len(values) else 0)
-        row[p["key"]] = val
-        total += val
-    row["total"] = total
-    return row
-
-
-def _evaluate_formulas(section_totals_for_period, formulas):
-    total = 0.0
-    for f in formulas or []:
-        expr = (f.get("formula") or "").strip()
-        if not expr:
-            continue
-        safe = expr
-        for lbl, val in section_totals_for_period.items():
-            safe = re.sub(rf"\b{re.escape(lbl)}\b", str(val), safe)
-        if re.search(r"[^0-9\.\+\-\*\/\(\) ]", safe):
-            continue
-        try:
-            val = eval(safe) if safe.strip() else 0.0
-        except Exception:
-            val = 0.0
-        total += float(val) * float(f.get("sign", 1))
-    return total
-
-
 def _build_chart(periods, currency: str, section_series: dict, section_labels: list[str]):
     labels = [p["label"] for p in periods]
     datasets = [{"name": lbl, "values": section_series.get(lbl, [])} for lbl in section_labels]
@@ -3,12 +3,12 @@
 
 import json
 import frappe
-import calendar
 from frappe import _
 from datetime import date
 from functools import lru_cache
-from dateutil.relativedelta import relativedelta
 from frappe.utils.nestedset import get_descendants_of
+from casino_navy.reporting.engine import get_period_matrix
+from casino_navy.reporting.periods import build_periods
 
 def execute(filters=None):
 	if not filters:
@@ -22,8 +22,7 @@ def execute(filters=None):
 	_validate_required(company, fiscal_year, account)
 
 	fy_start, fy_end = _get_fiscal_year_dates(fiscal_year)
-	periods = _build_month_periods(fy_start, fy_end)  # [{key,label,from,to}, ...]
-	period_index_by_key = {p["key"]: idx for idx, p in enumerate(periods)}
+	periods = build_periods(fy_start, fy_end)  # [{key,label,from,to}, ...]
 
 	# Company currency
 	currency = frappe.db.get_value("Company", company, "default_currency") or "USD"
@@ -36,15 +35,10 @@ def execute(filters=None):
 	if group_flag and is_group:
 		# ---- GROUP MODE: roll-up all descendants into the parent row ----
 		leaf_accounts = _resolve_accounts(company, account)  # leafs under the parent
-		amounts = _get_monthly_amounts(company, fy_start, fy_end, leaf_accounts)
+		matrix = _get_period_matrix(company, account, leaf_accounts, periods, fy_start, fy_end)
 
 		# aggregate per month across all leaf accounts
-		agg_per_month = _aggregate_amounts_by_period(amounts)
-
-		month_vals = [0.0] * len(periods)
-		for k, amt in agg_per_month.items():
-			if k in period_index_by_key:
-				month_vals[period_index_by_key[k]] = amt
+		month_vals = matrix.total(leaf_accounts, credit_positive=True)
 
 		row_total = sum(month_vals)
 		if row_total != 0:
@@ -72,14 +66,10 @@ def execute(filters=None):
 	else:
 		# ---- DETAIL MODE: show each leaf account as a row/dataset ----
 		rows_accounts = _resolve_accounts(company, account)  # if parent, returns leafs; else [account]
-		amounts = _get_monthly_amounts(company, fy_start, fy_end, rows_accounts)
+		matrix = _get_period_matrix(company, account, rows_accounts, periods, fy_start, fy_end)
 
 		for acc in rows_accounts:
-			month_vals = [0.0] * len(periods)
-			if acc in amounts:
-				for k, amt in amounts[acc].items():
-					if k in period_index_by_key:
-						month_vals[period_index_by_key[k]] = amt
+			month_vals = matrix.net(acc, credit_positive=True)
 
 			row_total = sum(month_vals)
 			if row_total == 0:
@@ -134,16 +124,6 @@ def _as_bool(v):
 	return str(v).lower() in {"1", "true", "yes", "y", "on"}
 
 
-def _aggregate_amounts_by_period(amounts_by_account):
-	"""Input: {account: {'YYYY-MM': amount, ...}, ...}
-	   Output: {'YYYY-MM': summed_amount}"""
-	out = {}
-	for acc_map in (amounts_by_account or {}).values():
-		for period_key, amt in (acc_map or {}).items():
-			out[period_key] = out.get(period_key, 0.0) + float(amt or 0)
-	return out
-
-
 def _build_chart(data_rows, periods, currency="USD", top_n=10, display_map=None):
 	"""Return a Frappe report chart: grouped bars with months on X, one dataset per account."""
 	if not data_rows:
@@ -248,23 +228,6 @@ def _get_fiscal_year_dates(fiscal_year_name: str):
 	return doc.year_start_date, doc.year_end_date
 
 
-def _build_month_periods(start_date: date, end_date: date):
-	"""Return a list of monthly periods covering the fiscal year:
-	   [{key:'2025-01', label:'Jan 25', from: date, to: date}, ...]"""
-	periods = []
-	cur = date(start_date.year, start_date.month, 1)
-	last = date(end_date.year, end_date.month, 1)
-	while cur <= last:
-		month_last_day = calendar.monthrange(cur.year, cur.month)[1]
-		from_dt = cur
-		to_dt = date(cur.year, cur.month, month_last_day)
-		label = f"{cur.strftime('%b')} {str(cur.year)[-2:]}"
-		key = cur.strftime("%Y-%m")
-		periods.append({"key": key, "label": label, "from": from_dt, "to": to_dt})
-		cur = (cur + relativedelta(months=1)).replace(day=1)
-	return periods
-
-
 def _build_columns(periods):
     cols = [
         {
@@ -327,35 +290,10 @@ def _resolve_accounts(company: str, chosen_account: str):
 	return sorted(leafs, key=lambda n: (frappe.db.get_value("Account", n, "account_number") or "", n))
 
 
-def _get_monthly_amounts(company: str, from_date: date, to_date: date, accounts):
-	"""Return dict: {account: {'YYYY-MM': amount, ...}, ...}
-	   Amount uses (credit - debit) so income is positive."""
-	if not accounts:
-		return {}
-
-	# Single SQL for performance: group by account + month bucket
-	placeholders = ", ".join(["%s"] * len(accounts))
-	sql = f"""
-		SELECT
-			gle.account,
-			DATE_FORMAT(gle.posting_date, '%%Y-%%m-01') AS period_start,
-			SUM(gle.credit - gle.debit) AS amount
-		FROM `tabGL Entry` gle
-		WHERE
-			gle.company = %s
-			AND gle.is_cancelled = 0
-			AND gle.posting_date BETWEEN %s AND %s
-			AND gle.account IN ({placeholders})
-			AND gle.posting_date >= '2025-06-01'
-		GROUP BY gle.account, period_start
-	"""
-	params = [company, from_date, to_date] + list(accounts)
-	rows = frappe.db.sql(sql, params, as_dict=True)
-
-	result = {}
-	for r in rows:
-		acc = r["account"]
-		# Convert 'YYYY-mm-01' to 'YYYY-mm'
-		key = r["period_start"][:7]
-		result.setdefault(acc, {})[key] = float(r["amount"] or 0)
-	return result
\ No newline at end of file
+def _get_period_matrix(company: str, chosen_account: str, accounts, periods, from_date: date, to_date: date):
+	"""Monthly GL sums of `accounts`, all under `chosen_account`; amounts use
+	   (credit - debit) so income is positive."""
+	return get_period_matrix(
+		[company], accounts, periods, roots=[chosen_account],
+		from_date=from_date, to_date=to_date,
+	)
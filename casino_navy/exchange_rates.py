@@ -0,0 +1,146 @@
+import frappe
+from bisect import bisect_right
+from datetime import timedelta
+from frappe.utils import cint, flt, getdate
+from erpnext.setup.utils import get_exchange_rate as get_conversion_rate
+
+VERSION_KEY = "casino_navy:exchange_rate_index_version"
+
+class ExchangeRateIndex:
+    """
+    In-memory index of Currency Exchange rows for a date window.
+
+    Rates are kept per (from_currency, to_currency, conversion_type) as parallel,
+    date-sorted lists so a lookup is a bisect: the latest rate on or before the
+    requested date, the same rule ERPNext applies. Every pair also keeps its last
+    rate before the window so lookups at the start of the window still resolve.
+    Anything the index cannot answer falls back to ERPNext's get_exchange_rate
+    and the answer is memoised for the rest of the batch.
+    """
+
+    def __init__(self, from_date=None, to_date=None):
+        self.version = get_index_version()
+        self.currencies = set()
+        self.window = None
+        self._dates = {}
+        self._rates = {}
+        self._fallback = {}
+        settings = frappe.get_cached_doc("Accounts Settings")
+        self.allow_stale = settings.allow_stale
+        self.stale_days = settings.stale_days or 0
+        self.load_currencies()
+        if from_date or to_date:
+            self.preload(from_date or to_date, to_date or from_date)
+
+    def load_currencies(self):
+        self.currencies = set(frappe.get_all("Currency", pluck="name"))
+
+    def preload(self, from_date, to_date):
+        """Load (or widen the index to) every rate needed for dates in [from_date, to_date]."""
+        from_date, to_date = getdate(from_date), getdate(to_date)
+        if self.window:
+            from_date = min(from_date, self.window[0])
+            to_date = max(to_date, self.window[1])
+
+        rows = frappe.db.sql("""
+            SELECT from_currency, to_currency, date, exchange_rate, for_buying, for_selling
+            FROM `tabCurrency Exchange`
+            WHERE date BETWEEN %(from_date)s AND %(to_date)s
+            UNION ALL
+            SELECT ce.from_currency, ce.to_currency, ce.date, ce.exchange_rate, ce.for_buying, ce.for_selling
+            FROM `tabCurrency Exchange` ce
+            JOIN (
+                SELECT from_currency, to_currency, for_buying, for_selling, MAX(date) AS date
+                FROM `tabCurrency Exchange`
+                WHERE date < %(from_date)s
+                GROUP BY from_currency, to_currency, for_buying, for_selling
+            ) prev
+                ON prev.from_currency = ce.from_currency
+                AND prev.to_currency = ce.to_currency
+                AND prev.for_buying = ce.for_buying
+                AND prev.for_selling = ce.for_selling
+                AND prev.date = ce.date
+        """, {"from_date": from_date, "to_date": to_date}, as_dict=True)
+
+        series = {}
+        for row in sorted(rows, key=lambda r: getdate(r.date)):
+            conversion_types = [""]
+            if row.for_selling:
+                conversion_types.append("for_selling")
+            if row.for_buying:
+                conversion_types.append("for_buying")
+            for conversion_type in conversion_types:
+                series.setdefault((row.from_currency, row.to_currency, conversion_type), []).append(
+                    (getdate(row.date), flt(row.exchange_rate))
+                )
+
+        self._dates = {key: [d for d, _ in values] for key, values in series.items()}
+        self._rates = {key: [r for _, r in values] for key, values in series.items()}
+        self._fallback = {}
+        self.window = (from_date, to_date)
+
+    def get_rate(self, from_currency, to_currency, date=None, conversion_type="for_selling"):
+        if from_currency == to_currency:
+            return 1
+
+        date = getdate(date or frappe.utils.today())
+        self.validate_currency(from_currency)
+        self.validate_currency(to_currency)
+
+        if not self.window or not (self.window[0] <= date <= self.window[1]):
+            self.preload(date, date)
+
+        rate = self.get_indexed_rate(from_currency, to_currency, date, conversion_type)
+        if rate is not None:
+            return rate
+
+        fallback_key = (from_currency, to_currency, date, conversion_type)
+        if fallback_key not in self._fallback:
+            self._fallback[fallback_key] = get_conversion_rate(from_currency, to_currency, date, conversion_type)
+        return self._fallback[fallback_key]
+
+    def get_indexed_rate(self, from_currency, to_currency, date, conversion_type="for_selling"):
+        """Rate from the loaded Currency Exchange rows only, or None; never calls the fallback."""
+        key = (from_currency, to_currency, conversion_type or "")
+        dates = self._dates.get(key)
+        if dates:
+            idx = bisect_right(dates, date) - 1
+            if idx >= 0 and (self.allow_stale or dates[idx] > date - timedelta(days=self.stale_days)):
+                return self._rates[key][idx]
+        return None
+
+    def validate_currency(self, currency):
+        if currency in self.currencies:
+            return
+        self.load_currencies()
+        if currency not in self.currencies:
+            frappe.throw(f"Currency {currency} not found")
+
+
+def get_exchange_rate_index(from_date=None, to_date=None):
+    """
+    Return the index shared by the current request or background job, rebuilt
+    when a Currency Exchange or Currency has changed since it was loaded.
+    Pass a date range to preload a whole batch in one query.
+    """
+    index = getattr(frappe.local, "casino_navy_exchange_rate_index", None)
+    if index is None or index.version != get_index_version():
+        index = ExchangeRateIndex()
+        frappe.local.casino_navy_exchange_rate_index = index
+
+    if from_date or to_date:
+        from_date, to_date = getdate(from_date or to_date), getdate(to_date or from_date)
+        if not index.window or from_date < index.window[0] or to_date > index.window[1]:
+            index.preload(from_date, to_date)
+
+    return index
+
+
+def get_index_version():
+    return cint(frappe.cache().get(frappe.cache().make_key(VERSION_KEY)))
+
+
+def clear_exchange_rate_index(doc=None, method=None):
+    """doc_events hook for Currency Exchange / Currency."""
+    frappe.cache().incr(frappe.cache().make_key(VERSION_KEY))
+    frappe.local.casino_navy_exchange_rate_index = None
@@ -135,7 +135,8 @@ fixtures = [
 # Override standard doctype classes
 
 override_doctype_class = {
-	"Journal Entry": "casino_navy.casino_navy.controllers.journal_entry.JournalEntry"
+	"Journal Entry": "casino_navy.casino_navy.controllers.journal_entry.JournalEntry",
+	"Data Import": "casino_navy.casino_navy.controllers.data_import.DataImport",
 }
 
 # Document Events
@@ -150,25 +151,77 @@ override_doctype_class = {
 #	}
 # }
 
+doc_events = {
+	"Bank Account": {
+		"on_update": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+		"on_trash": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+	},
+	"Charge Type": {
+		"on_update": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+		"on_trash": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+	},
+	"Mode of Payment": {
+		"on_update": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+		"on_trash": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+	},
+	"Account": {
+		"after_insert": "casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper.clear_account_tree_cache",
+		"on_update": [
+			"casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+			"casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper.clear_account_tree_cache",
+		],
+		"on_trash": [
+			"casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+			"casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper.clear_account_tree_cache",
+		],
+		"after_rename": "casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper.clear_account_tree_cache",
+	},
+	"Accountant Mapper": {
+		"on_update": "casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper.clear_mapper_cache",
+		"on_trash": "casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper.clear_mapper_cache",
+	},
+	"Company": {
+		"on_update": "casino_navy.casino_navy.doctype.transaction_ledger.account_resolver.clear_account_resolver_cache",
+	},
+	"Currency Exchange": {
+		"on_update": "casino_navy.exchange_rates.clear_exchange_rate_index",
+		"on_trash": "casino_navy.exchange_rates.clear_exchange_rate_index",
+	},
+	"Currency": {
+		"on_update": "casino_navy.exchange_rates.clear_exchange_rate_index",
+		"on_trash": "casino_navy.exchange_rates.clear_exchange_rate_index",
+	},
+	"GL Entry": {
+		"on_submit": [
+			"casino_navy.casino_navy.doctype.bank_daily_balance.bank_daily_balance.update_from_gl_entry",
+			"casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup.update_from_gl_entry",
+			"casino_navy.balance_cache.invalidate_gl_entry",
+			"casino_navy.reporting.result_cache.invalidate_gl_entry",
+		],
+	},
+}
+
 # Scheduled Tasks
 # ---------------
 
 scheduler_events = {
-#	"all": [
-#		"casino_navy.tasks.all"
-#	],
-#	"daily": [
-#		"casino_navy.tasks.daily"
-#	],
-#	"hourly": [
-#		"casino_navy.tasks.hourly"
-#	],
+	"all": [
+		"casino_navy.casino_navy.doctype.transaction_ledger_queue.transaction_ledger_queue.requeue_stale_entries"
+	],
+	"daily": [
+		"casino_navy.casino_navy.doctype.transaction_ledger.rollup.post_daily_rollups",
+		"casino_navy.casino_navy.doctype.balance_sweep_rule.balance_sweep_rule.run_daily_rules",
+		"casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup.reconcile"
+	],
+	"hourly": [
+		"casino_navy.casino_navy.doctype.balance_sweep_rule.balance_sweep_rule.run_hourly_rules"
+	],
 	"weekly": [
-		"casino_navy.utils.move_luqapay_balance"
+		"casino_navy.casino_navy.doctype.balance_sweep_rule.balance_sweep_rule.run_weekly_rules"
+	],
+	"monthly": [
+		"casino_navy.casino_navy.doctype.balance_sweep_rule.balance_sweep_rule.run_monthly_rules"
 	],
-#	"monthly": [
-#		"casino_navy.tasks.monthly"
-#	],
 }
 
 # Testing
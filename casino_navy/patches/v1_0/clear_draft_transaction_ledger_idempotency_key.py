@@ -0,0 +1,13 @@
+import frappe
+
+def execute():
+    # Drafts no longer own their reference; free the keys they took so the
+    # reference can be submitted again.
+    TL = frappe.qb.DocType('Transaction Ledger')
+
+    frappe.qb.update(TL).set(
+        TL.idempotency_key, None
+    ).where(
+        (TL.docstatus == 0)&
+        (TL.idempotency_key.isnotnull())
+    ).run()
@@ -0,0 +1,28 @@
+import frappe
+
+def execute():
+    # Replaces the hard-coded weekly utils.move_luqapay_balance job
+    company = 'X2 - JMS Investment Group N.V'
+    source_account = '13500 - LuqaPay/Jeton - X2'
+    target_account = '13506 - Luqapay - X2'
+
+    if frappe.db.exists("Balance Sweep Rule", "Luqapay Auto Balance Transfer"):
+        return
+
+    if not (
+        frappe.db.exists("Company", company)
+        and frappe.db.exists("Account", source_account)
+        and frappe.db.exists("Account", target_account)
+    ):
+        return
+
+    frappe.get_doc({
+        "doctype": "Balance Sweep Rule",
+        "rule_name": "Luqapay Auto Balance Transfer",
+        "company": company,
+        "enabled": 1,
+        "schedule": "Weekly",
+        "threshold": 0,
+        "source_account": source_account,
+        "target_account": target_account,
+    }).insert(ignore_permissions=True)
@@ -0,0 +1,13 @@
+import frappe
+
+def execute():
+    # The first build scans the whole GL, so it runs in the background.
+    # Balance lookups keep using the GL until it has finished.
+    frappe.enqueue(
+        "casino_navy.casino_navy.doctype.bank_daily_balance.bank_daily_balance.rebuild",
+        queue="long",
+        timeout=60 * 60 * 6,
+        job_id="rebuild_bank_daily_balance",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
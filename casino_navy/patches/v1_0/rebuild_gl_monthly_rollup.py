@@ -0,0 +1,13 @@
+import frappe
+
+def execute():
+    # The first build scans the whole GL, so it runs in the background.
+    # Reports keep reading the GL until it has finished.
+    frappe.enqueue(
+        "casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup.rebuild",
+        queue="long",
+        timeout=60 * 60 * 6,
+        job_id="rebuild_gl_monthly_rollup",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
@@ -0,0 +1,35 @@
+import frappe
+from casino_navy.casino_navy.doctype.transaction_ledger.idempotency import (
+    get_idempotency_key,
+    rebuild_bloom_filter,
+)
+
+def execute():
+    # Only the oldest submitted ledger of each reference keeps the key,
+    # later duplicates stay unkeyed so the unique index can be enforced.
+    TL = frappe.qb.DocType('Transaction Ledger')
+
+    rows = frappe.qb.from_(TL).select(
+        TL.name,
+        TL.company,
+        TL.bank,
+        TL.transaction_id,
+        TL.third_party_reference,
+    ).where(
+        (TL.docstatus == 1)&
+        (TL.idempotency_key.isnull())
+    ).orderby(TL.name).run(as_dict=True)
+
+    seen = set()
+    for row in rows:
+        key = get_idempotency_key(row.company, row.bank, row.transaction_id, row.third_party_reference)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        frappe.qb.update(TL).set(
+            TL.idempotency_key, key
+        ).where(
+            TL.name == row.name
+        ).run()
+
+    rebuild_bloom_filter()
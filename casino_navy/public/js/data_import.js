@@ -9,6 +9,20 @@ frappe.ui.form.on("Data Import", {
         if (frm.is_new()) 
             return;
 
+        if (["Transaction Ledger", "Balance Transfer"].includes(frm.doc.reference_doctype) && frm.doc.import_file) {
+            frm.add_custom_button(__("Pre-flight Check"), () => {
+                frm.trigger('run_preflight');
+            });
+        }
+
+        if (["Transaction Ledger", "Balance Transfer"].includes(frm.doc.reference_doctype)
+            && frm.doc.import_file && frm.doc.import_type === "Insert New Records"
+            && frm.doc.status !== "Success") {
+            frm.add_custom_button(__("Parallel Import"), () => {
+                frm.trigger('start_parallel_import');
+            });
+        }
+
         frm.add_custom_button(__("Delete"), () => {
             // Let's prompt the user to confirm the deletion
             frappe.confirm(
@@ -16,17 +30,15 @@ frappe.ui.form.on("Data Import", {
                 () => {
                     frappe.call({
                         method: 'casino_navy.casino_navy.controllers.data_import.delete_all_data_imports',
-                        freeze: true,
-                        freeze_message: __('Deleting...'),
                         args: {
                             name: frm.docname
                         },
                         callback: (r) => {
                             if (r.message) {
-                                frappe.msgprint(r.message);
+                                frappe.show_alert({ message: r.message, indicator: 'orange' });
                             }
-                            // Let's return the user to the list view
-                            frappe.set_route('List', 'Data Import');
+                            // The deletion runs in the background, progress comes over realtime
+                            frm.page.set_indicator("Deleting", "orange");
                         }
                     });
                 }
@@ -34,13 +46,105 @@ frappe.ui.form.on("Data Import", {
 
         }).addClass('btn-danger');
     },
-    set_realtime_events(frm) {
+    start_parallel_import(frm) {
+        frappe.prompt([
+            {
+                fieldname: 'workers',
+                fieldtype: 'Int',
+                label: __('Workers'),
+                default: 4,
+                reqd: 1,
+            },
+            {
+                fieldname: 'chunk_size',
+                fieldtype: 'Int',
+                label: __('Rows per Commit'),
+                default: 200,
+                reqd: 1,
+            },
+        ], (values) => {
+            frappe.call({
+                method: 'casino_navy.casino_navy.controllers.import_runner.start_parallel_import',
+                args: {
+                    name: frm.docname,
+                    ...values
+                },
+                callback: ({ message }) => {
+                    if (message) {
+                        frappe.show_alert({
+                            message: __('Importing {0} rows in {1} partitions on {2} workers', [message.rows, message.partitions, message.workers]),
+                            indicator: 'blue',
+                        });
+                    }
+                }
+            });
+        }, __('Parallel Import'), __('Start'));
+    },
+    run_preflight(frm) {
+        frappe.call({
+            method: 'casino_navy.casino_navy.controllers.data_import.preflight_data_import',
+            freeze: true,
+            freeze_message: __('Checking rows...'),
+            args: {
+                name: frm.docname
+            },
+            callback: ({ message }) => {
+                if (!message) {
+                    return;
+                }
+
+                let { rows, errors, warnings } = message;
+                if (!errors.length && !warnings.length) {
+                    frappe.msgprint({
+                        title: __('Pre-flight Check'),
+                        message: __('All {0} rows passed the pre-flight check.', [rows]),
+                        indicator: 'green',
+                    });
+                    return;
+                }
+
+                let table_rows = [
+                    ...errors.map(e => ({ ...e, level: __('Error') })),
+                    ...warnings.map(w => ({ ...w, level: __('Warning') })),
+                ].map(e => `
+                    <tr>
+                        <td>${e.row}</td>
+                        <td>${e.level}</td>
+                        <td>${frappe.utils.escape_html(e.field || '')}</td>
+                        <td>${frappe.utils.escape_html(String(e.value ?? ''))}</td>
+                        <td>${frappe.utils.escape_html(e.message)}</td>
+                    </tr>
+                `).join('');
+
+                frappe.msgprint({
+                    title: __('Pre-flight Check: {0} errors, {1} warnings in {2} rows', [errors.length, warnings.length, rows]),
+                    message: `
+                        <table class="table table-bordered table-sm">
+                            <thead>
+                                <tr>
+                                    <th>${__('Row')}</th>
+                                    <th>${__('Level')}</th>
+                                    <th>${__('Field')}</th>
+                                    <th>${__('Value')}</th>
+                                    <th>${__('Message')}</th>
+                                </tr>
+                            </thead>
+                            <tbody>${table_rows}</tbody>
+                        </table>
+                    `,
+                    indicator: errors.length ? 'red' : 'orange',
+                    wide: true,
+                });
+            }
+        });
+    },
+    setup_realtime_events(frm) {
         frappe.realtime.on("delete_data_import", (data) => {
             if (data.mapping_name !== frm.doc.name) {
                 return;
             }
             
-            let percent = Math.floor((data.current * 100) / data.total);
+            let percent = data.total ? Math.floor((data.current * 100) / data.total) : 100;
             let message = `Deleting ${data.current} of ${data.total} records`;
 
             frm.dashboard.show_progress(`Deleting ${frm.doc.reference_doctype}`, percent, message);
@@ -49,7 +153,6 @@ frappe.ui.form.on("Data Import", {
             if (data.current === data.total) {
                 setTimeout(() => {
                     frm.dashboard.hide_progress();
-                    frm.reload_doc();
                 }, 2000);
             }
         });
@@ -63,6 +166,8 @@ frappe.ui.form.on("Data Import", {
         frappe.realtime.on("delete_data_import_complete", ({ mapping }) => {
             if (mapping === frm.doc.name) {
                 frm.dashboard.hide_progress();
+                // The Data Import itself is gone, return the user to the list view
+                frappe.set_route('List', 'Data Import');
             }
         });
     },
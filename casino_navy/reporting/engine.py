@@ -0,0 +1,230 @@
+"""
+Shared GL aggregation for the mapper-driven reports.
+
+One pass per (company set, date range, account set) returns debit and credit
+sums grouped by account and posting date: plain range predicates on
+posting_date and no date expression in the GROUP BY, so the GL Entry indexes
+stay usable. The daily sums are bucketed into the report periods in Python.
+
+Whole months before the open one are read from the GL Monthly Rollup once it
+has been built; only the open month and partial months hit the raw GL.
+
+Large account sets are not sent as one huge IN list: when the caller knows the
+accounts the set was expanded from (e.g. the buckets of an Accountant Mapper),
+the GL is joined to those roots through the Account nested set; otherwise the
+IN list is sent in chunks.
+
+Opening balances start from the last Period Closing Voucher's Account Closing
+Balance snapshot when there is one, so only the GL after it is summed.
+"""
+
+from bisect import bisect_right
+
+import frappe
+from frappe.utils import add_days, add_months, flt, get_last_day, getdate
+from casino_navy.casino_navy.doctype.gl_monthly_rollup.gl_monthly_rollup import (
+    get_month,
+    get_open_month,
+    is_ready,
+)
+
+IN_CHUNK_SIZE = 500
+
+
+class PeriodMatrix:
+    """Dense debit/credit sums: one row per account, one column per period."""
+
+    def __init__(self, accounts, periods):
+        self.accounts = list(accounts)
+        self.index = {account: i for i, account in enumerate(self.accounts)}
+        self.periods = periods
+        self.debit = [[0.0] * len(periods) for _ in self.accounts]
+        self.credit = [[0.0] * len(periods) for _ in self.accounts]
+
+    def add(self, account, period, debit, credit):
+        i = self.index.get(account)
+        if i is not None:
+            self.debit[i][period] += flt(debit)
+            self.credit[i][period] += flt(credit)
+
+    def net(self, account, credit_positive=False):
+        """debit - credit per period, or credit - debit with `credit_positive`."""
+        i = self.index.get(account)
+        if i is None:
+            return [0.0] * len(self.periods)
+        if credit_positive:
+            return [c - d for d, c in zip(self.debit[i], self.credit[i])]
+        return [d - c for d, c in zip(self.debit[i], self.credit[i])]
+
+    def total(self, accounts, signs=None, credit_positive=False):
+        """Signed sum of `net` over `accounts`; `signs` is {account: sign}, default 1."""
+        out = [0.0] * len(self.periods)
+        for account in sorted(accounts):
+            if account not in self.index:
+                continue
+            sign = (signs or {}).get(account, 1)
+            for j, value in enumerate(self.net(account, credit_positive)):
+                out[j] += sign * value
+        return out
+
+
+def get_period_matrix(companies, accounts, periods, roots=None, from_date=None, to_date=None):
+    """
+    Debit/credit sums of `accounts` for each of `periods` ([{"from", "to", ...}],
+    ascending). `roots` are accounts whose subtrees cover `accounts`.
+    `from_date`/`to_date` narrow the range the periods span, e.g. to a fiscal
+    year that does not start on the first of a month.
+    """
+    matrix = PeriodMatrix(accounts, periods)
+    if not matrix.accounts or not periods:
+        return matrix
+
+    start, end = periods[0]["from"], periods[-1]["to"]
+    if from_date and from_date > start:
+        start = from_date
+    if to_date and to_date < end:
+        end = to_date
+
+    # A monthly roll-up row can only be bucketed when no period splits a month
+    use_rollup = all(p["from"].day == 1 and p["to"] == get_last_day(p["to"]) for p in periods)
+
+    starts = [p["from"] for p in periods]
+    for account, posting_date, debit, credit in _get_sums(
+        companies, matrix.accounts, start, end, roots, by_date=True, use_rollup=use_rollup
+    ):
+        posting_date = getdate(posting_date)
+        j = bisect_right(starts, posting_date) - 1
+        if j >= 0 and posting_date <= periods[j]["to"]:
+            matrix.add(account, j, debit, credit)
+    return matrix
+
+
+def get_opening_balances(companies, accounts, as_of, roots=None):
+    """
+    {account: debit - credit} of the GL before `as_of`: the Account Closing
+    Balance of each company's last Period Closing Voucher before `as_of`, plus
+    the GL after it (closed months from the GL Monthly Rollup).
+    """
+    if not accounts:
+        return {}
+
+    as_of = getdate(as_of)
+    day_before = add_days(as_of, -1)
+    balances = {account: 0.0 for account in accounts}
+
+    # Companies by their last closing snapshot; those without one are read together
+    by_snapshot = {}
+    for company in companies:
+        by_snapshot.setdefault(_get_last_closing_voucher(company, as_of), []).append(company)
+
+    for snapshot, group in by_snapshot.items():
+        from_date = None
+        if snapshot:
+            name, closing_date = snapshot
+            condition = f"AND src.period_closing_voucher = {frappe.db.escape(name)}"
+            for account, debit, credit in _query(
+                "`tabAccount Closing Balance`", "closing_date", condition,
+                group, list(accounts), None, day_before, roots, False,
+            ):
+                if account in balances:
+                    balances[account] += flt(debit) - flt(credit)
+            from_date = add_days(closing_date, 1)
+
+        if from_date is None or from_date <= day_before:
+            for account, debit, credit in _get_sums(group, list(accounts), from_date, day_before, roots):
+                if account in balances:
+                    balances[account] += flt(debit) - flt(credit)
+    return balances
+
+
+def _get_last_closing_voucher(company, as_of):
+    """(name, posting date) of the last Period Closing Voucher of `company` before `as_of`, or None."""
+    if frappe.db.get_single_value("Accounts Settings", "ignore_account_closing_balance"):
+        return None
+
+    last = frappe.db.get_all(
+        "Period Closing Voucher",
+        filters={"docstatus": 1, "company": company, "posting_date": ("<", as_of)},
+        fields=["name", "posting_date"],
+        order_by="posting_date desc",
+        limit=1,
+    )
+    return (last[0].name, getdate(last[0].posting_date)) if last else None
+
+
+def split_range(from_date, to_date):
+    """
+    Split `from_date`..`to_date` into the whole closed months the GL Monthly
+    Rollup can answer, as (first month, last month) or None, and the GL date
+    ranges left over around them. `from_date` None means from the beginning.
+    """
+    if not is_ready():
+        return None, [(from_date, to_date)]
+
+    first = None
+    if from_date:
+        first = from_date if from_date.day == 1 else add_days(get_last_day(from_date), 1)
+    last = get_month(to_date) if to_date == get_last_day(to_date) else add_months(get_month(to_date), -1)
+    last = min(last, add_months(get_open_month(), -1))
+    if first and first > last:
+        return None, [(from_date, to_date)]
+
+    gl_ranges = []
+    if first and from_date < first:
+        gl_ranges.append((from_date, add_days(first, -1)))
+    if get_last_day(last) < to_date:
+        gl_ranges.append((add_days(get_last_day(last), 1), to_date))
+    return (first, last), gl_ranges
+
+
+def _get_sums(companies, accounts, from_date, to_date, roots=None, by_date=False, use_rollup=True):
+    """Rows of (account, [date,] debit, credit); an account/date may appear once per source."""
+    months, gl_ranges = split_range(from_date, to_date) if use_rollup else (None, [(from_date, to_date)])
+
+    rows = []
+    if months:
+        rows.extend(_query("`tabGL Monthly Rollup`", "month", "", companies, accounts, *months, roots, by_date))
+    for start, end in gl_ranges:
+        rows.extend(_query("`tabGL Entry`", "posting_date", "AND src.is_cancelled = 0", companies, accounts, start, end, roots, by_date))
+    return rows
+
+
+def _query(table, date_column, condition, companies, accounts, from_date, to_date, roots, by_date):
+    params = {
+        "companies": tuple(companies),
+        "from_date": from_date,
+        "to_date": to_date,
+    }
+    date_field = f", src.{date_column}" if by_date else ""
+    from_condition = f"AND src.{date_column} >= %(from_date)s" if from_date else ""
+
+    def run(join, account_condition, extra):
+        return frappe.db.sql(
+            f"""
+            SELECT src.account{date_field}, SUM(src.debit), SUM(src.credit)
+            FROM {table} src
+            {join}
+            WHERE src.company IN %(companies)s
+                {condition}
+                {from_condition}
+                AND src.{date_column} <= %(to_date)s
+                AND {account_condition}
+            GROUP BY src.account{date_field}
+            """,
+            {**params, **extra},
+        )
+
+    if roots and len(roots) < len(accounts):
+        return run(
+            "JOIN `tabAccount` acc ON acc.name = src.account",
+            """EXISTS (
+                SELECT 1 FROM `tabAccount` root
+                WHERE root.name IN %(roots)s AND acc.lft >= root.lft AND acc.rgt <= root.rgt
+            )""",
+            {"roots": tuple(roots)},
+        )
+
+    rows = []
+    for start in range(0, len(accounts), IN_CHUNK_SIZE):
+        rows.extend(run("", "src.account IN %(accounts)s", {"accounts": tuple(accounts[start:start + IN_CHUNK_SIZE])}))
+    return rows
@@ -0,0 +1,79 @@
+"""
+Report periods for the mapper-driven reports.
+
+`build_periods` splits a date range into Daily, Weekly (Monday to Sunday),
+Monthly or Quarterly buckets, each {"key", "label", "from", "to"}; the key is
+the column fieldname. Months and quarters start on the first of the month of
+`from_date`, as the monthly reports always did, so they stay aligned with the
+GL Monthly Rollup; days and weeks are clipped to the range.
+
+Whatever the periodicity, reporting.engine reads the GL once, summed per
+account and posting date, and buckets those daily sums into the periods.
+"""
+
+from datetime import timedelta
+
+import frappe
+from frappe.utils import add_months, get_last_day, getdate
+
+PERIODICITIES = ("Daily", "Weekly", "Monthly", "Quarterly")
+DEFAULT_PERIODICITY = "Monthly"
+
+
+def build_periods(from_date, to_date, periodicity=None):
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    periodicity = periodicity or DEFAULT_PERIODICITY
+    if periodicity not in PERIODICITIES:
+        frappe.throw(f"Periodicity must be one of {', '.join(PERIODICITIES)}, not {periodicity}")
+
+    if periodicity == "Daily":
+        return _build_days(from_date, to_date)
+    if periodicity == "Weekly":
+        return _build_weeks(from_date, to_date)
+    return _build_months(from_date, to_date, 3 if periodicity == "Quarterly" else 1)
+
+
+def _build_days(from_date, to_date):
+    periods = []
+    cur = from_date
+    while cur <= to_date:
+        periods.append({
+            "key": cur.strftime("%Y-%m-%d"),
+            "label": cur.strftime("%d %b %y"),
+            "from": cur,
+            "to": cur,
+        })
+        cur += timedelta(days=1)
+    return periods
+
+
+def _build_weeks(from_date, to_date):
+    periods = []
+    cur = from_date
+    while cur <= to_date:
+        end = min(cur + timedelta(days=6 - cur.weekday()), to_date)
+        periods.append({
+            "key": "w" + cur.strftime("%Y-%m-%d"),
+            "label": f"{cur.strftime('%d %b')} - {end.strftime('%d %b %y')}",
+            "from": cur,
+            "to": end,
+        })
+        cur = end + timedelta(days=1)
+    return periods
+
+
+def _build_months(from_date, to_date, months):
+    periods = []
+    cur = from_date.replace(day=1)
+    last = to_date.replace(day=1)
+    while cur <= last:
+        end = min(add_months(cur, months - 1), last)
+        if months == 1:
+            key = cur.strftime("%Y-%m")
+            label = f"{cur.strftime('%b')} {str(cur.year)[-2:]}"
+        else:
+            key = "q" + cur.strftime("%Y-%m")
+            label = f"{cur.strftime('%b')} - {end.strftime('%b')} {str(end.year)[-2:]}"
+        periods.append({"key": key, "label": label, "from": cur, "to": get_last_day(end)})
+        cur = add_months(cur, months)
+    return periods
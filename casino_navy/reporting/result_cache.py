@@ -0,0 +1,214 @@
+"""
+Server-side cache for the output of the mapper-driven reports.
+
+An entry is keyed by the report, its normalized filters, the Accountant
+Mapper and account tree versions and the GL version of each company in the
+filters: a Redis counter bumped from the GL Entry on_submit hook, by the
+direct GL poster and when GL Entries are deleted outright, the same way
+balance_cache keeps its account watermarks. Any posting, cancellation (a
+reversing GL Entry) or mapper change therefore yields a new key without a
+query against the GL; stale entries are never served, they just age out.
+
+Entries are pickled and zlib-compressed. A sorted set tracks when each entry
+was last read and the cache evicts least recently used entries once their
+total size exceeds the byte budget (`casino_navy_report_cache_bytes` in site
+config).
+"""
+
+import hashlib
+import json
+import pickle
+import time
+import zlib
+
+import frappe
+from frappe.utils import cint, now_datetime, pretty_date
+from casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper import (
+    get_account_tree_version,
+    get_mapper_version,
+)
+
+ENTRY_KEY = "casino_navy:report_cache:{}"
+LRU_KEY = "casino_navy:report_cache:lru"
+SIZES_KEY = "casino_navy:report_cache:sizes"
+TOTAL_KEY = "casino_navy:report_cache:total"
+GL_VERSION_KEY = "casino_navy:gl_version:{}"
+ENTRY_TTL = 60 * 60 * 24 * 7
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+# Swap an entry's recorded size (0 drops it) and move the running total by
+# the difference, atomically, so concurrent stores of one entry count it once
+RESIZE_SCRIPT = """
+local old = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or 0)
+local size = tonumber(ARGV[2])
+if size > 0 then
+    redis.call("HSET", KEYS[1], ARGV[1], size)
+else
+    redis.call("HDEL", KEYS[1], ARGV[1])
+end
+return redis.call("INCRBY", KEYS[2], size - old)
+"""
+
+
+def cached_execute(report, execute, filters):
+    """
+    Return `execute(filters)` through the cache, with a report summary card
+    appended that says whether the result was served from cache and how old it is.
+    """
+    filters = frappe._dict(filters or {})
+    companies = get_companies(filters)
+    if not companies:
+        return execute(filters)
+
+    cache = frappe.cache()
+    entry_id = get_entry_id(report, filters, companies)
+    key = cache.make_key(ENTRY_KEY.format(entry_id))
+
+    raw = cache.get(key)
+    if raw:
+        computed_at, result = pickle.loads(zlib.decompress(raw))
+        cache.zadd(cache.make_key(LRU_KEY), {entry_id: time.time()})
+        return with_summary(result, computed_at, cached=True)
+
+    result = execute(filters)
+    computed_at = now_datetime()
+    store(entry_id, zlib.compress(pickle.dumps((computed_at, result), protocol=pickle.HIGHEST_PROTOCOL)))
+    return with_summary(result, computed_at, cached=False)
+
+
+def get_companies(filters):
+    companies = filters.get("company") or []
+    if isinstance(companies, str):
+        companies = [c.strip() for c in companies.split(",") if c.strip()]
+    return sorted(set(companies))
+
+
+def normalize_filters(filters):
+    normalized = {}
+    for field, value in filters.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if field == "company":
+            value = get_companies(filters)
+        elif isinstance(value, (list, tuple)):
+            value = sorted(str(v).strip() for v in value)
+        if value in (None, "", []):
+            continue
+        normalized[field] = value
+    return normalized
+
+
+def get_gl_watermark(companies):
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for company in companies:
+        pipe.get(cache.make_key(GL_VERSION_KEY.format(company)))
+    return {company: cint(version) for company, version in zip(companies, pipe.execute())}
+
+
+def get_entry_id(report, filters, companies):
+    raw = json.dumps(
+        [
+            report,
+            normalize_filters(filters),
+            get_mapper_version(),
+            get_account_tree_version(),
+            get_gl_watermark(companies),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def store(entry_id, value):
+    cache = frappe.cache()
+    size = len(value)
+    budget = cint(frappe.conf.get("casino_navy_report_cache_bytes")) or DEFAULT_BUDGET
+    if size > budget:
+        return
+
+    pipe = cache.pipeline()
+    pipe.set(cache.make_key(ENTRY_KEY.format(entry_id)), value, ex=ENTRY_TTL)
+    pipe.zadd(cache.make_key(LRU_KEY), {entry_id: time.time()})
+    pipe.execute()
+    total = resize(entry_id, size)
+
+    while total > budget:
+        oldest = cache.zpopmin(cache.make_key(LRU_KEY))
+        if not oldest:
+            break
+        total = evict(oldest[0][0])
+
+
+def evict(entry_id):
+    """Drop one entry; returns the new total size."""
+    cache = frappe.cache()
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    cache.delete(cache.make_key(ENTRY_KEY.format(entry_id)))
+    return resize(entry_id, 0)
+
+
+def resize(entry_id, size):
+    cache = frappe.cache()
+    return cint(
+        cache.eval(RESIZE_SCRIPT, 2, cache.make_key(SIZES_KEY), cache.make_key(TOTAL_KEY), entry_id, size)
+    )
+
+
+def with_summary(result, computed_at, cached):
+    result = list(result) + [None] * (4 - len(result))
+    if cached:
+        value = f"From cache, computed {pretty_date(computed_at)}"
+    else:
+        value = "Computed just now"
+    summary = [
+        {
+            "value": value,
+            "label": "Result",
+            "datatype": "Data",
+            "indicator": "Green" if cached else "Blue",
+        }
+    ]
+    return result[:4] + [summary]
+
+
+def bump_gl_version(companies):
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for company in set(companies):
+        pipe.incr(cache.make_key(GL_VERSION_KEY.format(company)))
+    pipe.execute()
+
+
+def invalidate_companies(companies):
+    """
+    Make every cached result of `companies` stale. Bumps now and again after
+    commit, so a result computed from the pre-commit state cannot be cached
+    under the new version.
+    """
+    companies = list(set(companies))
+    if not companies:
+        return
+    bump_gl_version(companies)
+    frappe.db.after_commit.add(lambda: bump_gl_version(companies))
+
+
+def invalidate_gl_entry(doc, method=None):
+    """GL Entry on_submit hook; cancellations arrive as reversing GL Entries."""
+    invalidate_companies([doc.company])
+
+
+@frappe.whitelist()
+def clear_report_cache():
+    frappe.only_for("System Manager")
+    cache = frappe.cache()
+    entries = cache.zrange(cache.make_key(LRU_KEY), 0, -1)
+    pipe = cache.pipeline()
+    for entry_id in entries:
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        pipe.delete(cache.make_key(ENTRY_KEY.format(entry_id)))
+    pipe.delete(cache.make_key(LRU_KEY), cache.make_key(SIZES_KEY), cache.make_key(TOTAL_KEY))
+    pipe.execute()
@@ -0,0 +1,115 @@
+"""
+Per-period value series for the mapper-driven reports.
+
+A PeriodSeries holds one row of floats per key (an account or a section
+label) over the report periods, in flat lists addressed through a key index,
+so a report over thousands of accounts carries one list per account instead
+of a dict per account per period. Signing, running balances and section
+roll-ups work on whole rows; report row dicts are only built at the output
+boundary by `to_row` / `rows`.
+
+It also behaves as a {key: [value per period]} mapping, which is what
+FormulaGraph.evaluate reads and fills.
+"""
+
+
+class PeriodSeries:
+    def __init__(self, keys, n, values=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.n = n
+        self.values = values if values is not None else [[0.0] * n for _ in self.keys]
+
+    @classmethod
+    def from_matrix(cls, matrix, credit_positive=False):
+        """Net movement per account of a reporting.engine.PeriodMatrix."""
+        if credit_positive:
+            values = [[c - d for d, c in zip(dr, cr)] for dr, cr in zip(matrix.debit, matrix.credit)]
+        else:
+            values = [[d - c for d, c in zip(dr, cr)] for dr, cr in zip(matrix.debit, matrix.credit)]
+        return cls(matrix.accounts, len(matrix.periods), values)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, key):
+        return self.values[self.index[key]]
+
+    def __setitem__(self, key, values):
+        i = self.index.get(key)
+        if i is None:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.values.append(list(values))
+        else:
+            self.values[i] = list(values)
+
+    def get(self, key, default=None):
+        i = self.index.get(key)
+        if i is None:
+            return [0.0] * self.n if default is None else default
+        return self.values[i]
+
+    def items(self):
+        return zip(self.keys, self.values)
+
+    def total(self, key):
+        return sum(self.get(key))
+
+    def signed(self, signs):
+        """Rows multiplied by `signs` ({key: sign}, default 1)."""
+        return PeriodSeries(
+            self.keys,
+            self.n,
+            [row if signs.get(key, 1) == 1 else [signs[key] * v for v in row] for key, row in self.items()],
+        )
+
+    def cumsum(self, opening=None):
+        """Running totals per row, starting from `opening` ({key: value}, default 0)."""
+        opening = opening or {}
+        values = []
+        for key, row in self.items():
+            running = float(opening.get(key, 0.0))
+            out = []
+            for v in row:
+                running += v
+                out.append(running)
+            values.append(out)
+        return PeriodSeries(self.keys, self.n, values)
+
+    def rollup(self, membership):
+        """
+        One row per group of `membership` ({group: {key: sign}}), the signed sum
+        of its member rows; members missing from the series count as zero.
+        """
+        groups = PeriodSeries(membership, self.n)
+        for group, members in membership.items():
+            out = groups[group]
+            for key in sorted(members):
+                i = self.index.get(key)
+                if i is None:
+                    continue
+                sign = members[key]
+                for j, v in enumerate(self.values[i]):
+                    out[j] += sign * v
+        return groups
+
+    def to_row(self, key, periods, **fields):
+        """Report row for `key`: `fields` plus one column per period and the total."""
+        values = self.get(key)
+        row = dict(fields)
+        for p, v in zip(periods, values):
+            row[p["key"]] = v
+        row["total"] = sum(values)
+        return row
+
+    def rows(self, keys, periods, fields):
+        """Lazily build `to_row` for each of `keys`; `fields(key)` returns the extra row fields."""
+        for key in keys:
+            yield self.to_row(key, periods, **fields(key))
@@ -1,27 +1,15 @@
 import frappe
 from frappe import qb
-from frappe.utils import today
 from functools import lru_cache
-from frappe.query_builder import Criterion
-from erpnext.accounts.utils import get_balance_on
-from frappe.utils.nestedset import get_descendants_of
-from erpnext.setup.utils import get_exchange_rate as get_conversion_rate
-from casino_navy.casino_navy.doctype.accountant_mapper.accountant_mapper import (
-    _load_sections_from_mapper,
-    _resolve_sections_leafs,
-)
+from casino_navy.exchange_rates import get_exchange_rate_index
+from casino_navy.casino_navy.doctype.accountant_mapper.compiled_mapper import get_compiled_mapper
 
 def get_exchange_rate(from_currency, to_currency, date=None, conversion_type="for_selling"):
     if from_currency == to_currency:
         return 1
     if not date:
         date = frappe.utils.today()
-    if not frappe.db.exists("Currency", from_currency):
-        frappe.throw(f"Currency {from_currency} not found")
-    if not frappe.db.exists("Currency", to_currency):
-        frappe.throw(f"Currency {to_currency} not found")
-    exchange = get_conversion_rate(from_currency, to_currency, date, conversion_type)
-    return exchange
+    return get_exchange_rate_index().get_rate(from_currency, to_currency, date, conversion_type)
 
 
 @frappe.whitelist()
@@ -103,84 +91,9 @@ def _make_row_payload(
         row["bold"] = 1
     return row
 
-def move_luqapay_balance():
-    # This function is intended to move 
-    # All deposites from Luqapay mode of payments
-    # to the main bank account
-    A = qb.DocType('Account')
-    parent_account = '13500 - LuqaPay/Jeton - X2'
-    target_account = '13506 - Luqapay - X2'
-    company = 'X2 - JMS Investment Group N.V'
-    valid_accounts = get_descendants_of('Account', parent_account)
-    conditions = [
-        A.company == company,
-        A.is_group == 0,
-        A.name.isin(valid_accounts),
-        A.name != target_account
-    ]
-
-    accounts = frappe.qb.from_(A).select(A.name).where(
-        Criterion.all(conditions)
-    ).run(as_dict=True)
-
-    jv = frappe.new_doc('Journal Entry')
-    jv.update({
-        'company': company,
-        'voucher_type': 'Bank Entry',
-        'posting_date': today(),
-        "multi_currency": 1,
-        "cheque_no": "Luqapay Auto Balance Transfer",
-        "cheque_date": today(),
-    })
-    acum_balance = base_acum_balance = .00
-    for row in accounts:
-        account = row.name
-        balance = get_balance_on(account, today(), company=company, in_account_currency=True)
-        base_balance = get_balance_on(account, today(), company=company, in_account_currency=False)
-        acum_balance += balance
-        base_acum_balance += base_balance
-        if balance and base_balance > 0:
-            jv.append('accounts', {
-                'account': account,
-                'credit_in_account_currency': balance,
-                'credit': base_balance,
-                'cost_center': frappe.get_value('Company', company, 'cost_center'),
-            })
-        
-        if balance and base_balance < 0:
-            jv.append('accounts', {
-                'account': target_account,
-                'debit_in_account_currency': abs(balance),
-                'debit': abs(base_balance),
-                'cost_center': frappe.get_value('Company', company, 'cost_center'),
-            })
-    if base_acum_balance > 0:
-        jv.append('accounts', {
-            'account': target_account,
-            'debit_in_account_currency': acum_balance,
-            'debit': base_acum_balance,
-            'cost_center': frappe.get_value('Company', company, 'cost_center'),
-        })
-    elif base_acum_balance < 0:
-        jv.append('accounts', {
-            'account': target_account,
-            'credit_in_account_currency': abs(acum_balance),
-            'credit': abs(base_acum_balance),
-            'cost_center': frappe.get_value('Company', company, 'cost_center'),
-        })
-    
-    try:
-        jv.save()
-        return jv.submit()
-    except Exception as e:
-        content = f"Journal Entry: {jv.as_json()}\n\n{str(e)}\n\n{frappe.get_traceback()}"
-        frappe.log_error("Luqapay Balance Transfer", content)
-        
-
 @frappe.whitelist()
 def get_accounts_for_section(company: str, section_label: str, report_name: str = "Net Profit Line Summary"):
-    sections = _load_sections_from_mapper(report_name, company)
-    resolved = _resolve_sections_leafs(company, sections)
+    resolved = get_compiled_mapper(report_name, company).sections
 
     if section_label not in resolved:
         frappe.throw(f"Section '{section_label}' not found in Accountant Mapper for {company}.")